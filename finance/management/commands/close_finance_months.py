@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.snapshots import close_month, close_pending_months, is_closable
+
+
+class Command(BaseCommand):
+    help = "Freeze P&L snapshots for closed months (all pending, or one --year/--month)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='Close only this year (with --month).')
+        parser.add_argument('--month', type=int, help='Close only this month (with --year).')
+
+    def handle(self, *args, **options):
+        year, month = options['year'], options['month']
+
+        if year or month:
+            if not (year and month and 1 <= month <= 12):
+                raise CommandError("--year and --month must be given together, month 1–12.")
+            if not is_closable(year, month):
+                raise CommandError(f"{year}-{month:02d} is still inside its grace period.")
+            snapshot = close_month(year, month)
+            if snapshot is None:
+                self.stdout.write(f"{year}-{month:02d} was already closed.")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Closed {snapshot}: net profit KSH {snapshot.net_profit}"))
+            return
+
+        created = close_pending_months()
+        for snapshot in created:
+            self.stdout.write(f"Closed {snapshot}: net profit KSH {snapshot.net_profit}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} month(s) closed."))
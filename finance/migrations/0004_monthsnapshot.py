@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:00
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0003_alter_budgetallocation_id_alter_budgetcategory_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('month', models.PositiveIntegerField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('cogs', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('gross_profit', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('expenses', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('net_profit', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('capital_in', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('capital_out', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('closed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Month Snapshot',
+                'verbose_name_plural': 'Month Snapshots',
+                'ordering': ['-year', '-month'],
+                'unique_together': {('year', 'month')},
+            },
+        ),
+    ]
@@ -212,4 +212,38 @@ class RestockAlert(models.Model):
     def dismiss(self):
         self.is_dismissed = True
         self.dismissed_at = timezone.now()
-        self.save(update_fields=['is_dismissed', 'dismissed_at'])
\ No newline at end of file
+        self.save(update_fields=['is_dismissed', 'dismissed_at'])
+
+class MonthSnapshot(models.Model):
+    """
+    Frozen P&L figures for a closed month. Written once by the month-close
+    job and never updated — later changes to orders or expenses don't
+    rewrite closed books.
+    """
+    year  = models.PositiveIntegerField()
+    month = models.PositiveIntegerField()  # 1–12
+
+    revenue      = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    cogs         = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    gross_profit = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    expenses     = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    net_profit   = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    capital_in   = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    capital_out  = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    closed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('year', 'month')
+        ordering = ['-year', '-month']
+        verbose_name = 'Month Snapshot'
+        verbose_name_plural = 'Month Snapshots'
+
+    def __str__(self):
+        import calendar
+        return f"{calendar.month_name[self.month]} {self.year} (closed)"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Month snapshots are immutable once closed.")
+        super().save(*args, **kwargs)
@@ -0,0 +1,174 @@
+import calendar
+import logging
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Q, Sum, When
+from django.utils import timezone
+
+from parlour.models import OrderItem, Product
+from .models import BudgetAllocation, CapitalEntry, MonthlyBudget, MonthSnapshot, RestockAlert
+
+logger = logging.getLogger(__name__)
+
+MONEY = models.DecimalField(max_digits=12, decimal_places=2)
+ZERO = Decimal('0.00')
+
+# Days after month end before the books for that month are frozen
+CLOSE_GRACE_DAYS = getattr(settings, 'FINANCE_MONTH_CLOSE_GRACE_DAYS', 7)
+
+FIGURE_FIELDS = (
+    'revenue', 'cogs', 'gross_profit', 'expenses', 'net_profit', 'capital_in', 'capital_out',
+)
+
+# Restock thresholds — same numbers the dashboard used to apply on every view
+RESTOCK_ALERT_AT = 3
+RESTOCK_TARGET_QTY = 10
+RESTOCK_MIN_QTY = 5
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Month figures
+# ─────────────────────────────────────────────────────────────────────────────
+
+def month_bounds(year, month):
+    """[start, end) of a calendar month as aware datetimes in the local timezone."""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(date(year, month, 1), time.min), tz)
+    last_day = calendar.monthrange(year, month)[1]
+    end = timezone.make_aware(datetime.combine(date(year, month, last_day) + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def compute_month_figures(year, month):
+    """Live P&L for a month: three aggregate queries, no per-order loops."""
+    start, end = month_bounds(year, month)
+
+    # Revenue and COGS from delivered orders placed this month. Unit cost
+    # follows Product.get_cost(); lines without a cost add nothing to COGS.
+    unit_cost = Case(
+        When(product__intended_stock_type='ready', then=F('product__purchase_cost')),
+        default=F('product__supplier_cost'),
+        output_field=MONEY,
+    )
+    sales = OrderItem.objects.filter(
+        order__order_status='delivered',
+        order__created_at__gte=start,
+        order__created_at__lt=end,
+    ).aggregate(
+        revenue=Sum(F('price') * F('quantity'), output_field=MONEY),
+        cogs=Sum(unit_cost * F('quantity'), output_field=MONEY),
+    )
+
+    budget_filter = {'budget__year': year, 'budget__month': month}
+    expenses = BudgetAllocation.objects.filter(**budget_filter).aggregate(
+        total=Sum('spent_amount')
+    )['total']
+    capital = CapitalEntry.objects.filter(**budget_filter).aggregate(
+        capital_in=Sum('amount', filter=Q(entry_type='in')),
+        capital_out=Sum('amount', filter=Q(entry_type='out')),
+    )
+
+    revenue = sales['revenue'] or ZERO
+    cogs = sales['cogs'] or ZERO
+    expenses = expenses or ZERO
+    gross_profit = revenue - cogs
+
+    return {
+        'revenue': revenue,
+        'cogs': cogs,
+        'gross_profit': gross_profit,
+        'expenses': expenses,
+        'net_profit': gross_profit - expenses,
+        'capital_in': capital['capital_in'] or ZERO,
+        'capital_out': capital['capital_out'] or ZERO,
+    }
+
+
+def get_month_figures(year, month):
+    """
+    Return (figures, snapshot). Closed months come straight from their
+    snapshot row; open months (or ones not closed yet) are computed live.
+    """
+    snapshot = MonthSnapshot.objects.filter(year=year, month=month).first()
+    if snapshot:
+        return {field: getattr(snapshot, field) for field in FIGURE_FIELDS}, snapshot
+    return compute_month_figures(year, month), None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Month close
+# ─────────────────────────────────────────────────────────────────────────────
+
+def is_closable(year, month, today=None):
+    today = today or timezone.localdate()
+    last_day = date(year, month, calendar.monthrange(year, month)[1])
+    return today > last_day + timedelta(days=CLOSE_GRACE_DAYS)
+
+
+def close_month(year, month):
+    """Freeze one month. Returns the snapshot, or None if it was already closed."""
+    figures = compute_month_figures(year, month)
+    try:
+        with transaction.atomic():
+            return MonthSnapshot.objects.create(year=year, month=month, **figures)
+    except IntegrityError:
+        return None
+
+
+def close_pending_months(today=None):
+    """
+    Snapshot every closable month that has activity (a budget or orders)
+    and no snapshot yet. Returns the snapshots created.
+    """
+    today = today or timezone.localdate()
+    closed = set(MonthSnapshot.objects.values_list('year', 'month'))
+
+    candidates = set(MonthlyBudget.objects.values_list('year', 'month'))
+    for order_month in OrderItem.objects.dates('order__created_at', 'month'):
+        candidates.add((order_month.year, order_month.month))
+
+    created = []
+    for year, month in sorted(candidates - closed):
+        if not is_closable(year, month, today):
+            continue
+        snapshot = close_month(year, month)
+        if snapshot:
+            created.append(snapshot)
+            logger.info(f"Finance month closed: {snapshot} — net profit KSH {snapshot.net_profit}")
+    return created
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Restock alerts — run by the scheduler, not on page views
+# ─────────────────────────────────────────────────────────────────────────────
+
+def refresh_restock_alerts():
+    """
+    Create one alert per low ready-stock product that doesn't have an active
+    one, and dismiss active alerts whose product has been restocked.
+    Returns (created, dismissed).
+    """
+    alerted = RestockAlert.objects.filter(is_dismissed=False).values('product_id')
+    low_products = (
+        Product.objects.filter(stock_type='ready', stock_quantity__lte=RESTOCK_ALERT_AT)
+        .exclude(pk__in=alerted)
+        .values_list('pk', 'stock_quantity', 'purchase_cost')
+    )
+
+    new_alerts = []
+    for product_id, qty, purchase_cost in low_products:
+        cost = None
+        if purchase_cost:
+            cost = purchase_cost * max(RESTOCK_TARGET_QTY - qty, RESTOCK_MIN_QTY)
+        new_alerts.append(RestockAlert(product_id=product_id, qty_at_alert=qty, estimated_restock_cost=cost))
+
+    with transaction.atomic():
+        RestockAlert.objects.bulk_create(new_alerts)
+        dismissed = RestockAlert.objects.filter(
+            is_dismissed=False, product__stock_quantity__gt=RESTOCK_ALERT_AT
+        ).update(is_dismissed=True, dismissed_at=timezone.now())
+
+    return len(new_alerts), dismissed
@@ -2,71 +2,22 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Sum
-from parlour.models import Product, Order, OrderItem
 from .models import (
     MonthlyBudget, BudgetCategory, BudgetAllocation,
     Expense, CapitalEntry, RestockAlert
 )
+from .snapshots import get_month_figures
 from decimal import Decimal
+from hokasparlour.db_router import reporting
 import calendar
 
 
-# ── Helpers ───────────────────────────────────────────────────────
-
-def get_or_create_restock_alerts():
-    """Check all ready stock products and create alerts for low ones."""
-    low_products = Product.objects.filter(stock_type='ready', stock_quantity__lte=3)
-    for product in low_products:
-        # Only create if no active alert exists
-        if not RestockAlert.objects.filter(product=product, is_dismissed=False).exists():
-            cost = None
-            if product.purchase_cost:
-                needed = max(10 - product.stock_quantity, 5)  # suggest restocking to at least 10
-                cost = product.purchase_cost * needed
-            RestockAlert.objects.create(
-                product=product,
-                qty_at_alert=product.stock_quantity,
-                estimated_restock_cost=cost
-            )
-
-
-def get_monthly_revenue(year, month):
-    """Revenue from delivered orders in a given month."""
-    orders = Order.objects.filter(
-        order_status='delivered',
-        created_at__year=year,
-        created_at__month=month
-    )
-    total = Decimal('0.00')
-    for order in orders:
-        total += order.get_total()
-    return total
-
-
-def get_monthly_cogs(year, month):
-    """Cost of goods sold in a given month (from delivered orders)."""
-    items = OrderItem.objects.filter(
-        order__order_status='delivered',
-        order__created_at__year=year,
-        order__created_at__month=month
-    ).select_related('product')
-
-    total = Decimal('0.00')
-    for item in items:
-        cost = item.get_cost_total()
-        if cost:
-            total += cost
-    return total
-
-
 # ── Views ─────────────────────────────────────────────────────────
 
 @login_required
+@reporting()
 def finance_dashboard(request):
     """Main finance overview for the current month."""
-    get_or_create_restock_alerts()
-
     now   = timezone.now()
     year  = int(request.GET.get('year',  now.year))
     month = int(request.GET.get('month', now.month))
@@ -74,20 +25,14 @@ def finance_dashboard(request):
     # Get or hint at budget
     budget = MonthlyBudget.objects.filter(year=year, month=month).first()
 
-    # Revenue & COGS from orders
-    revenue = get_monthly_revenue(year, month)
-    cogs    = get_monthly_cogs(year, month)
+    # P&L — frozen snapshot for closed months, DB aggregates otherwise.
+    # Restock alerts are refreshed by the scheduler (finance.snapshots).
+    figures, snapshot = get_month_figures(year, month)
 
-    # Expenses logged this month
-    expenses_total = Decimal('0.00')
-    allocations    = []
+    allocations = []
     if budget:
-        expenses_total = budget.total_spent()
         allocations = budget.allocations.select_related('category').all()
 
-    gross_profit = revenue - cogs
-    net_profit   = gross_profit - expenses_total
-
     # Restock alerts
     active_alerts = RestockAlert.objects.filter(is_dismissed=False).select_related('product')
 
@@ -96,13 +41,6 @@ def finance_dashboard(request):
     if budget:
         recent_expenses = budget.expenses.select_related('category').order_by('-date')[:8]
 
-    # Capital entries
-    capital_in  = Decimal('0.00')
-    capital_out = Decimal('0.00')
-    if budget:
-        capital_in  = budget.capital_entries.filter(entry_type='in').aggregate(t=Sum('amount'))['t'] or Decimal('0.00')
-        capital_out = budget.capital_entries.filter(entry_type='out').aggregate(t=Sum('amount'))['t'] or Decimal('0.00')
-
     # Month navigation
     prev_month = month - 1 if month > 1 else 12
     prev_year  = year if month > 1 else year - 1
@@ -114,16 +52,17 @@ def finance_dashboard(request):
         'year':            year,
         'month':           month,
         'month_name':      calendar.month_name[month],
-        'revenue':         revenue,
-        'cogs':            cogs,
-        'gross_profit':    gross_profit,
-        'expenses_total':  expenses_total,
-        'net_profit':      net_profit,
+        'snapshot':        snapshot,
+        'revenue':         figures['revenue'],
+        'cogs':            figures['cogs'],
+        'gross_profit':    figures['gross_profit'],
+        'expenses_total':  figures['expenses'],
+        'net_profit':      figures['net_profit'],
         'allocations':     allocations,
         'active_alerts':   active_alerts,
         'recent_expenses': recent_expenses,
-        'capital_in':      capital_in,
-        'capital_out':     capital_out,
+        'capital_in':      figures['capital_in'],
+        'capital_out':     figures['capital_out'],
         'prev_month':      prev_month,
         'prev_year':       prev_year,
         'next_month':      next_month,
@@ -311,6 +250,7 @@ def dismiss_alert(request, pk):
 
 
 @login_required
+@reporting()
 def monthly_summary(request):
     """Full P&L summary for a selected month."""
     now   = timezone.now()
@@ -318,14 +258,7 @@ def monthly_summary(request):
     month = int(request.GET.get('month', now.month))
 
     budget   = MonthlyBudget.objects.filter(year=year, month=month).first()
-    revenue  = get_monthly_revenue(year, month)
-    cogs     = get_monthly_cogs(year, month)
-    expenses = Decimal('0.00')
-    if budget:
-        expenses = budget.total_spent()
-
-    gross_profit = revenue - cogs
-    net_profit   = gross_profit - expenses
+    figures, snapshot = get_month_figures(year, month)
 
     # Expense breakdown by category
     expense_breakdown = []
@@ -346,29 +279,23 @@ def monthly_summary(request):
         all_expenses = budget.expenses.select_related('category').order_by('-date')
 
     # Capital
-    capital_in  = Decimal('0.00')
-    capital_out = Decimal('0.00')
-    if budget:
-        capital_in  = budget.capital_entries.filter(entry_type='in').aggregate(t=Sum('amount'))['t'] or Decimal('0.00')
-        capital_out = budget.capital_entries.filter(entry_type='out').aggregate(t=Sum('amount'))['t'] or Decimal('0.00')
-        capital_entries = budget.capital_entries.order_by('-date')
-    else:
-        capital_entries = []
+    capital_entries = budget.capital_entries.order_by('-date') if budget else []
 
     context = {
         'budget':             budget,
         'year':               year,
         'month':              month,
         'month_name':         calendar.month_name[month],
-        'revenue':            revenue,
-        'cogs':               cogs,
-        'gross_profit':       gross_profit,
-        'expenses':           expenses,
-        'net_profit':         net_profit,
+        'snapshot':           snapshot,
+        'revenue':            figures['revenue'],
+        'cogs':               figures['cogs'],
+        'gross_profit':       figures['gross_profit'],
+        'expenses':           figures['expenses'],
+        'net_profit':         figures['net_profit'],
         'expense_breakdown':  expense_breakdown,
         'all_expenses':       all_expenses,
-        'capital_in':         capital_in,
-        'capital_out':        capital_out,
+        'capital_in':         figures['capital_in'],
+        'capital_out':        figures['capital_out'],
         'capital_entries':    capital_entries,
         'month_choices':      [(i, calendar.month_name[i]) for i in range(1, 13)],
         'current_year':       now.year,
@@ -11,6 +11,7 @@ class SalesRecordAdmin(admin.ModelAdmin):
     readonly_fields = ('sale_date',)
     date_hierarchy = 'sale_date'
     ordering = ('-sale_date',)
+    list_select_related = ('order',)
     
     def changelist_view(self, request, extra_context=None):
         response = super().changelist_view(request, extra_context=extra_context)
@@ -20,10 +21,15 @@ class SalesRecordAdmin(admin.ModelAdmin):
         except (AttributeError, KeyError):
             return response
         
+        totals = qs.aggregate(
+            total_sales=Sum('total_amount'),
+            total_orders=Count('id'),
+            total_profit=Sum('profit_estimate'),
+        )
         metrics = {
-            'total_sales': qs.aggregate(total=Sum('total_amount'))['total'] or 0,
-            'total_orders': qs.count(),
-            'total_profit': qs.aggregate(total=Sum('profit_estimate'))['total'] or 0,
+            'total_sales': totals['total_sales'] or 0,
+            'total_orders': totals['total_orders'],
+            'total_profit': totals['total_profit'] or 0,
         }
         
         response.context_data['summary'] = [
@@ -42,6 +48,7 @@ class ProductStatsAdmin(admin.ModelAdmin):
     search_fields = ('product__name',)
     readonly_fields = ('total_sold', 'total_revenue', 'last_sold_date')
     ordering = ('-total_revenue',)
+    list_select_related = ('product',)
 
 
 @admin.register(EmailLog)
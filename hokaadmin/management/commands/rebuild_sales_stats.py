@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from hokaadmin.stats import rebuild_product_stats, rebuild_sales_records
+
+
+class Command(BaseCommand):
+    help = "Recompute ProductStats and SalesRecord from OrderItem in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Rows per bulk_create / bulk_update statement (default 500).',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        created, updated = rebuild_product_stats(batch_size=batch_size)
+        self.stdout.write(f"Product stats: {created} created, {updated} updated")
+
+        created, updated = rebuild_sales_records(batch_size=batch_size)
+        self.stdout.write(f"Sales records: {created} created, {updated} updated")
+
+        self.stdout.write(self.style.SUCCESS("Sales stats rebuilt."))
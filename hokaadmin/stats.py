@@ -0,0 +1,184 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, Max, Sum
+from django.db.models.functions import Coalesce
+
+from parlour import counters
+from parlour.models import Order, OrderItem
+from .models import ProductStats, SalesRecord
+
+# Same 30% margin estimate the sales records have always used
+PROFIT_ESTIMATE_RATE = Decimal('0.3')
+
+MONEY = models.DecimalField(max_digits=12, decimal_places=2)
+
+BATCH_NAME = 'sales stats'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Per-transaction batch (parlour.counters)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _apply(ids, using='default'):
+    apply_batch(ids['order'], ids['item'], using=using)
+
+
+def queue_order(order, using='default'):
+    counters.queue(BATCH_NAME, _apply, using, order=order.pk)
+
+
+def queue_order_item(item, using='default'):
+    counters.queue(BATCH_NAME, _apply, using, order=item.order_id, item=item.pk)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Applying a batch
+# ─────────────────────────────────────────────────────────────────────────────
+
+def apply_batch(order_ids, item_ids, using='default'):
+    """
+    Aggregate the committed items once and apply them as F() upserts:
+    one ProductStats update per product, one SalesRecord update per order.
+    Items are re-read from the DB so anything rolled back is ignored.
+    """
+
+    per_product = defaultdict(lambda: [0, Decimal('0.00'), None])
+    per_order = defaultdict(lambda: [0, Decimal('0.00')])
+
+    rows = (
+        OrderItem.objects.using(using)
+        .filter(pk__in=item_ids)
+        .values('order_id', 'product_id')
+        .annotate(
+            qty=Sum('quantity'),
+            revenue=Sum(F('price') * F('quantity'), output_field=MONEY),
+            last_sold=Max('order__created_at'),
+        )
+    ) if item_ids else []
+
+    for row in rows:
+        product = per_product[row['product_id']]
+        product[0] += row['qty']
+        product[1] += row['revenue']
+        if product[2] is None or row['last_sold'] > product[2]:
+            product[2] = row['last_sold']
+
+        order = per_order[row['order_id']]
+        order[0] += row['qty']
+        order[1] += row['revenue']
+
+    with transaction.atomic(using=using):
+        for product_id, (qty, revenue, last_sold) in per_product.items():
+            _upsert_product_stats(product_id, qty, revenue, last_sold, using)
+
+        existing_orders = set(
+            Order.objects.using(using).filter(pk__in=order_ids).values_list('pk', flat=True)
+        )
+        for order_id in existing_orders:
+            qty, amount = per_order.get(order_id, (0, Decimal('0.00')))
+            _upsert_sales_record(order_id, qty, amount, using)
+
+
+def _upsert_product_stats(product_id, qty, revenue, last_sold, using):
+    counters.upsert(
+        ProductStats,
+        lookup={'product_id': product_id},
+        increments={'total_sold': qty, 'total_revenue': revenue},
+        extra={'last_sold_date': last_sold},
+        using=using,
+    )
+
+
+def _upsert_sales_record(order_id, qty, amount, using):
+    counters.upsert(
+        SalesRecord,
+        lookup={'order_id': order_id},
+        increments={
+            'total_items': qty,
+            'total_amount': amount,
+            'profit_estimate': (amount * PROFIT_ESTIMATE_RATE).quantize(Decimal('0.01')),
+        },
+        using=using,
+    )
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Reconciliation — full rebuild from OrderItem
+# ─────────────────────────────────────────────────────────────────────────────
+
+def rebuild_product_stats(batch_size=500):
+    """Recompute every ProductStats row from OrderItem. Returns (created, updated)."""
+
+    totals = {
+        row['product_id']: row
+        for row in OrderItem.objects.values('product_id').annotate(
+            qty=Sum('quantity'),
+            revenue=Sum(F('price') * F('quantity'), output_field=MONEY),
+            last_sold=Max('order__created_at'),
+        )
+    }
+
+    to_update = []
+    for stats in ProductStats.objects.all():
+        row = totals.pop(stats.product_id, None)
+        stats.total_sold = row['qty'] if row else 0
+        stats.total_revenue = row['revenue'] if row else Decimal('0.00')
+        stats.last_sold_date = row['last_sold'] if row else None
+        to_update.append(stats)
+
+    to_create = [
+        ProductStats(
+            product_id=product_id,
+            total_sold=row['qty'],
+            total_revenue=row['revenue'],
+            last_sold_date=row['last_sold'],
+        )
+        for product_id, row in totals.items()
+    ]
+
+    with transaction.atomic():
+        ProductStats.objects.bulk_update(
+            to_update, ['total_sold', 'total_revenue', 'last_sold_date'], batch_size=batch_size
+        )
+        ProductStats.objects.bulk_create(to_create, batch_size=batch_size)
+
+    return len(to_create), len(to_update)
+
+
+def rebuild_sales_records(batch_size=500):
+    """Recompute every SalesRecord row from OrderItem. Returns (created, updated)."""
+
+    totals = {
+        row['id']: row
+        for row in Order.objects.values('id').annotate(
+            qty=Coalesce(Sum('orderitem__quantity'), 0),
+            amount=Coalesce(
+                Sum(F('orderitem__price') * F('orderitem__quantity'), output_field=MONEY),
+                Decimal('0.00'),
+                output_field=MONEY,
+            ),
+        )
+    }
+
+    def fill(record, row):
+        record.total_items = row['qty']
+        record.total_amount = row['amount']
+        record.profit_estimate = (row['amount'] * PROFIT_ESTIMATE_RATE).quantize(Decimal('0.01'))
+        return record
+
+    to_update = [
+        fill(record, totals.pop(record.order_id))
+        for record in SalesRecord.objects.all()
+        if record.order_id in totals
+    ]
+    to_create = [fill(SalesRecord(order_id=order_id), row) for order_id, row in totals.items()]
+
+    with transaction.atomic():
+        SalesRecord.objects.bulk_update(
+            to_update, ['total_items', 'total_amount', 'profit_estimate'], batch_size=batch_size
+        )
+        SalesRecord.objects.bulk_create(to_create, batch_size=batch_size)
+
+    return len(to_create), len(to_update)
@@ -23,4 +23,7 @@ urlpatterns = [
     path('contacts/', views.contact_messages, name='contact_messages'),
     path('contacts/<int:msg_id>/', views.contact_message_detail, name='contact_message_detail'),
     path('contacts/<int:msg_id>/status/', views.contact_message_update_status, name='contact_message_update_status'),
+
+    # ── Scheduled Jobs ────────────────────────────────────────────
+    path('jobs/', views.scheduled_jobs, name='scheduled_jobs'),
 ]
\ No newline at end of file
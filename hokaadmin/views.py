@@ -7,9 +7,11 @@ from datetime import timedelta
 from parlour.models import Order, Product, OrderItem
 from .models import SalesRecord, ProductStats, EmailLog
 from decimal import Decimal
+from hokasparlour.db_router import reporting
 
 
 @login_required
+@reporting()
 def admin_dashboard(request):
     # ── Revenue ───────────────────────────────────────────────────
     total_revenue = SalesRecord.objects.aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00')
@@ -72,6 +74,7 @@ def admin_dashboard(request):
 
 
 @login_required
+@reporting()
 def sales_summary(request):
     period = request.GET.get('period', 'all')
     now    = timezone.now()
@@ -137,6 +140,7 @@ def sales_summary(request):
 
 
 @login_required
+@reporting()
 def daily_sales(request):
     days       = int(request.GET.get('days', 30))
     start_date = timezone.now() - timedelta(days=days)
@@ -168,6 +172,7 @@ def daily_sales(request):
 
 
 @login_required
+@reporting()
 def weekly_sales(request):
     weeks      = int(request.GET.get('weeks', 12))
     start_date = timezone.now() - timedelta(weeks=weeks)
@@ -199,6 +204,7 @@ def weekly_sales(request):
 
 
 @login_required
+@reporting()
 def monthly_sales(request):
     months     = int(request.GET.get('months', 12))
     start_date = timezone.now() - timedelta(days=months * 30)
@@ -230,6 +236,7 @@ def monthly_sales(request):
 
 
 @login_required
+@reporting()
 def top_products(request):
     limit = int(request.GET.get('limit', 10))
 
@@ -261,6 +268,7 @@ def top_products(request):
 
 
 @login_required
+@reporting()
 def revenue_trends(request):
     period = request.GET.get('period', 'month')
 
@@ -310,6 +318,7 @@ def revenue_trends(request):
 
 
 @login_required
+@reporting()
 def profit_report(request):
     period = request.GET.get('period', 'all')
     now    = timezone.now()
@@ -371,6 +380,7 @@ def profit_report(request):
 
 
 @login_required
+@reporting()
 def stock_report(request):
     ready_products     = Product.objects.filter(stock_type='ready').order_by('stock_quantity')
     warehouse_products = Product.objects.filter(stock_type='warehouse')
@@ -503,6 +513,7 @@ import json
 
 
 @login_required
+@reporting()
 def analytics_charts(request):
     """
     Gathers all chart data and passes it as JSON to the template.
@@ -708,13 +719,15 @@ from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
 from parlour.models import (
-    Profile, Order, OrderItem, OrderHistory,
+    Profile, Order, OrderItem,
     PromoUsage, Agent, Wishlist, ProductView,
     UserPreference
 )
+from parlour import customers
 
 
 @login_required
+@reporting()
 def user_profiles(request):
     """
     Admin user profiles page with:
@@ -728,7 +741,7 @@ def user_profiles(request):
     users = User.objects.select_related(
         'profile', 'agent'
     ).prefetch_related(
-        'order_history', 'promousage'
+        'promousage'
     ).filter(is_staff=False)
 
     # ── Search ────────────────────────────────────────────────────
@@ -793,34 +806,10 @@ def user_profiles(request):
     # We build order data in Python for flexibility
     all_user_ids = list(users.values_list('id', flat=True))
 
-    # Map user_id -> order stats
-    order_stats = {}
-    for uid in all_user_ids:
-        order_stats[uid] = {
-            'total_orders': 0,
-            'total_spent': Decimal('0.00'),
-            'last_order_date': None,
-        }
-
-    # Get orders linked via OrderHistory
-    histories = (
-        OrderHistory.objects
-        .filter(user_id__in=all_user_ids)
-        .select_related('order')
-        .order_by('user_id', '-viewed_at')
-    )
-    seen = set()
-    for h in histories:
-        uid = h.user_id
-        oid = h.order_id
-        key = (uid, oid)
-        if key not in seen:
-            seen.add(key)
-            stats = order_stats[uid]
-            stats['total_orders'] += 1
-            stats['total_spent'] += h.order.get_total()
-            if stats['last_order_date'] is None:
-                stats['last_order_date'] = h.order.created_at
+    # Map user_id -> order stats, from the users' linked customers
+    linked = customers.order_stats(all_user_ids)
+    empty = {'total_orders': 0, 'total_spent': Decimal('0.00'), 'last_order_date': None}
+    order_stats = {uid: linked.get(uid, empty) for uid in all_user_ids}
 
     # ── Sort ──────────────────────────────────────────────────────
     sort_by = request.GET.get('sort', 'newest')
@@ -917,6 +906,7 @@ def user_profiles(request):
 
 
 @login_required
+@reporting()
 def user_profile_detail(request, user_id):
     """Detailed view for a single user."""
     u = get_object_or_404(User, id=user_id)
@@ -931,13 +921,9 @@ def user_profile_detail(request, user_id):
     except Exception:
         preferences = None
 
-    # Order history
-    order_history = (
-        OrderHistory.objects
-        .filter(user=u)
-        .select_related('order')
-        .order_by('-viewed_at')[:20]
-    )
+    # Orders
+    orders = customers.orders_for(u).prefetch_related('orderitem_set')[:20]
+    stats = customers.order_stats([u.id]).get(u.id, {})
 
     # Wishlist
     wishlist = Wishlist.objects.filter(user=u).select_related('product')[:10]
@@ -945,8 +931,6 @@ def user_profile_detail(request, user_id):
     # Recent product views
     recent_views = ProductView.objects.filter(user=u).select_related('product')[:10]
 
-    # Totals
-    total_spent = sum(h.order.get_total() for h in order_history)
 
     context = {
         'u': u,
@@ -954,10 +938,11 @@ def user_profile_detail(request, user_id):
         'agent': agent,
         'promo': promo,
         'preferences': preferences,
-        'order_history': order_history,
+        'orders': orders,
         'wishlist': wishlist,
         'recent_views': recent_views,
-        'total_spent': total_spent,
+        'total_orders': stats.get('total_orders', 0),
+        'total_spent': stats.get('total_spent', Decimal('0.00')),
     }
     return render(request, 'hokaadmin/user_profile_detail.html', context)   
 
@@ -1077,4 +1062,39 @@ def contact_message_update_status(request, msg_id):
             msg.status = new_status
             msg.save(update_fields=['status', 'updated_at'])
             return JsonResponse({'ok': True, 'status': msg.status, 'label': msg.get_status_display()})
-    return JsonResponse({'ok': False}, status=400)
\ No newline at end of file
+    return JsonResponse({'ok': False}, status=400)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Scheduled jobs
+# ─────────────────────────────────────────────────────────────────────────────
+
+from django.contrib.admin.views.decorators import staff_member_required
+from parlour import scheduler
+from parlour.models import JobRun
+
+
+@staff_member_required
+def scheduled_jobs(request):
+    """Job catalog with next/last runs, the current leader and recent run history."""
+
+    runs_qs = JobRun.objects.all()
+
+    job_filter    = request.GET.get('job', 'all')
+    status_filter = request.GET.get('status', 'all')
+    if job_filter != 'all':
+        runs_qs = runs_qs.filter(job_id=job_filter)
+    if status_filter != 'all':
+        runs_qs = runs_qs.filter(status=status_filter)
+
+    lease = scheduler.lease_status()
+
+    context = {
+        'jobs':           scheduler.job_status(),
+        'lease':          lease,
+        'leader_alive':   bool(lease and lease.holder and lease.expires_at and lease.expires_at > timezone.now()),
+        'runs':           runs_qs[:100],
+        'job_filter':     job_filter,
+        'status_filter':  status_filter,
+        'status_choices': JobRun.STATUS_CHOICES,
+    }
+    return render(request, 'hokaadmin/scheduled_jobs.html', context)
@@ -3,6 +3,15 @@ ASGI config for hokasparlour project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Production runs it under gunicorn with uvicorn workers, so the async views
+(STK push, payment status, the WhatsApp service calls) don't tie up a
+worker while they wait on the network:
+
+    gunicorn hokasparlour.asgi:application -k uvicorn_worker.UvicornWorker
+
+Run it with DB_POOL=1, so each worker draws database connections from a
+pool rather than opening one per request (see DATABASES in settings).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -14,3 +23,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hokasparlour.settings')
 
 application = get_asgi_application()
+
+# The event loop lives as long as the worker: keep one outbound HTTP client per loop
+from parlour import http_client  # noqa: E402
+
+http_client.share_clients()
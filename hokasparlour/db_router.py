@@ -0,0 +1,97 @@
+"""
+Database routing: reporting reads to a replica, everything else to the primary.
+
+Nothing is sent to the replica unless asked. Analytics views, exports and
+reports run inside reporting() — a context manager that also works as a
+decorator — and their reads go to the settings.REPLICA_DATABASE alias when
+one is configured. Writes always go to the primary, and reads stay on it:
+
+  * once the current request or job has written anything (db_for_write
+    pins it),
+  * for REPLICA_PIN_SECONDS after a client's request wrote, carried to its
+    next requests in a cookie by parlour.middleware.ReplicaPinMiddleware, so
+    whoever just changed an order sees the change on the next dashboard,
+  * while a transaction is open on the primary.
+
+With no replica alias configured reporting() changes nothing, so dev and a
+single-database deployment behave as before. To try it locally, point
+DB_REPLICA_NAME at the SQLite file (or a copy of it) — see settings.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Writes to these apps don't pin: a session save is not data anyone re-reads
+PIN_EXEMPT_APPS = {'sessions'}
+
+_reporting = contextvars.ContextVar('db_reporting', default=False)
+_pinned = contextvars.ContextVar('db_pinned', default=False)
+_wrote = contextvars.ContextVar('db_wrote', default=False)
+
+
+def replica_alias():
+    """The configured replica alias, or None."""
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def reporting():
+    """Send reads made inside this block (or decorated function) to the replica."""
+    token = _reporting.set(True)
+    try:
+        yield
+    finally:
+        _reporting.reset(token)
+
+
+@contextmanager
+def pin_scope(pinned=False):
+    """
+    A unit of work — a request, a scheduled job — with its own pin, starting
+    pinned or not. Yields a callable telling whether the work has written.
+    """
+    pin_token, wrote_token = _pinned.set(pinned), _wrote.set(False)
+    try:
+        yield _wrote.get
+    finally:
+        _pinned.reset(pin_token)
+        _wrote.reset(wrote_token)
+
+
+def pin():
+    """Keep this unit of work's reads on the primary from now on."""
+    _pinned.set(True)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _pinned.get():
+            # Even for related objects of an instance read from the replica
+            return DEFAULT_DB_ALIAS
+        if not _reporting.get():
+            return None
+        replica = replica_alias()
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return replica
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PIN_EXEMPT_APPS:
+            _wrote.set(True)
+            pin()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema by replication
+        return db == DEFAULT_DB_ALIAS
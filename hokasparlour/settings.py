@@ -50,6 +50,8 @@ AUTHENTICATION_BACKENDS = [
 
 # ── Middleware ────────────────────────────────────────────────────────────────
 MIDDLEWARE = [
+    'parlour.middleware.RequestLogMiddleware',
+    'parlour.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -79,34 +81,96 @@ TEMPLATES = [
                 'parlour.context_processors.whatsapp_popup',
                 'parlour.context_processors.promo_popup',
                 'parlour.context_processors.cart_count',
+                'parlour.context_processors.pricing',
                 'parlour.context_processors.pending_orders_count',
+                'parlour.context_processors.storefront_cache',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'hokasparlour.wsgi.application'
+# Production serves this under uvicorn workers (see hokasparlour/asgi.py)
+ASGI_APPLICATION = 'hokasparlour.asgi.application'
 
 # ── Database ──────────────────────────────────────────────────────────────────
+# Connections are kept DB_CONN_MAX_AGE seconds and checked before reuse.
+# Under the uvicorn workers each request runs in a fresh context, so a kept
+# connection is never picked up again: there, set DB_POOL=1 for a psycopg
+# pool per worker instead (needs psycopg 3 with the pool extra).
+#
+# Reads made inside hokasparlour.db_router.reporting() — analytics, exports,
+# reports — go to the 'replica' alias when DB_REPLICA_HOST is set, or in dev
+# DB_REPLICA_NAME (another alias on the same SQLite file, or a copy of it).
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
+DB_POOL = os.getenv('DB_POOL') == '1'
+
 if IS_PRODUCTION:
+    _postgres = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv('DB_NAME'),
+        'USER': os.getenv('DB_USER'),
+        'PASSWORD': os.getenv('DB_PASSWORD'),
+        'PORT': os.getenv('DB_PORT', '5432'),
+        'CONN_HEALTH_CHECKS': True,
+        'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+    }
+    if DB_POOL:
+        _postgres['OPTIONS'] = {'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX', 10)),
+        }}
     DATABASES = {
-        'default': {
-            'ENGINE': 'django.db.backends.postgresql',
-            'NAME': os.getenv('DB_NAME'),
-            'USER': os.getenv('DB_USER'),
-            'PASSWORD': os.getenv('DB_PASSWORD'),
-            'HOST': os.getenv('DB_HOST', 'localhost'),
-            'PORT': os.getenv('DB_PORT', '5432'),
-        }
+        'default': {**_postgres, 'HOST': os.getenv('DB_HOST', 'localhost')},
     }
+    if os.getenv('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **_postgres,
+            'HOST': os.getenv('DB_REPLICA_HOST'),
+            'PORT': os.getenv('DB_REPLICA_PORT', _postgres['PORT']),
+        }
 else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.getenv('DB_REPLICA_NAME'):
+        DATABASES['replica'] = {**DATABASES['default'], 'NAME': BASE_DIR / os.getenv('DB_REPLICA_NAME')}
+
+if 'replica' in DATABASES:
+    # Tests read the replica through the test primary
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['hokasparlour.db_router.ReplicaRouter']
+REPLICA_DATABASE = 'replica'
+# How long a client's reads stay on the primary after a request of theirs wrote
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+
+# ── Cache ─────────────────────────────────────────────────────────────────────
+# Production uses a file cache so every gunicorn worker shares the same
+# storefront pages; dev keeps the in-process default.
+if IS_PRODUCTION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR', '/var/tmp/qunimart_cache'),
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         }
     }
 
+STOREFRONT_PAGE_CACHE_TIMEOUT = 60 * 10   # anonymous full pages
+STOREFRONT_FRAGMENT_CACHE_TIMEOUT = 60 * 60  # product card fragments
+
 # ── Password Validation ───────────────────────────────────────────────────────
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -128,11 +192,34 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# collectstatic writes hashed, gzip + brotli copies (hokasparlour.storage);
+# WhiteNoise serves hashed names as immutable for a year or more. Libraries
+# the templates load are vendored under static/vendor by `manage.py
+# vendor_static`, and `manage.py check_static` fails on any template asset
+# that would not get a hashed URL. Deploy: vendor_static (when bumping a
+# library) → check_static → collectstatic.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'hokasparlour.storage.StaticStorage'},
+}
+# Hashed URLs even though DEBUG is on (see hokasparlour.storage)
+STATIC_HASHED_URLS = IS_PRODUCTION
+if IS_PRODUCTION:
+    # Scan static files once at startup, not on every request
+    WHITENOISE_AUTOREFRESH = False
+    # For the few unhashed URLs (manifest.json, icons named in it)
+    WHITENOISE_MAX_AGE = 60 * 60
+
 # ── Auth & Login ──────────────────────────────────────────────────────────────
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
+# ── One-time passcodes (parlour.otp) ─────────────────────────────────────────
+# Print a code to the console when it couldn't be delivered. Never logged.
+# Local development only — set OTP_DEV_ECHO=1 in the environment.
+OTP_DEV_ECHO = os.getenv('OTP_DEV_ECHO') == '1' and not IS_PRODUCTION
+
 # ── 2FA ───────────────────────────────────────────────────────────────────────
 TWO_FACTOR_FORCE_OTP_ADMIN = True
 TWO_FACTOR_PATCH_ADMIN = True
@@ -160,10 +247,19 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
+# Compile each email template (CSS inlined) once per process. Keyed on
+# production rather than DEBUG, which is on here (see parlour.email_utils)
+EMAIL_TEMPLATE_CACHE = IS_PRODUCTION
 
 # ── WhatsApp ──────────────────────────────────────────────────────────────────
 WHATSAPP_SERVICE_URL = "http://localhost:3000"
 
+# ── Outbound HTTP ─────────────────────────────────────────────────────────────
+# Connection pool of the async client used by the views that call Lipana and
+# the WhatsApp service (parlour.http_client) — shared per worker under ASGI.
+HTTP_POOL_MAX_CONNECTIONS = 100
+HTTP_POOL_MAX_KEEPALIVE = 20
+
 # ── Session & Cookies ─────────────────────────────────────────────────────────
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SAMESITE = 'Lax'
@@ -199,21 +295,65 @@ MPESA_SIMULATE = os.getenv('MPESA_SIMULATE', 'True') == 'True'
 # ── SEO ───────────────────────────────────────────────────────────────────────
 ROBOTS_USE_SITEMAP = True
 ROBOTS_SITEMAP_URLS = ['https://hokasparlour.adcent.online/sitemap.xml']
+SITEMAP_BASE_URL = 'https://hokasparlour.adcent.online'
+SITEMAP_ROOT = os.path.join(MEDIA_ROOT, 'sitemaps')  # pre-generated by the scheduler
+SITEMAP_CHUNK_SIZE = 5000  # product URLs per sitemap file
+
+# ── Ad Analytics ──────────────────────────────────────────────────────────────
+AD_IMPRESSION_RETENTION_DAYS = 90  # raw impressions kept; daily rollups kept forever
+
+# ── Scheduler ─────────────────────────────────────────────────────────────────
+# Jobs run in `manage.py run_scheduler`; processes elect a leader via a DB lease
+SCHEDULER_AUTOSTART = True  # also contend for the lease under runserver
+SCHEDULER_LEASE_SECONDS = 60  # a standby takes over this long after the leader dies
+JOB_RUN_RETENTION_DAYS = 30
+
+# ── Reports ───────────────────────────────────────────────────────────────────
+ORDER_REPORT_RECIPIENTS = ['hokasparlour@gmail.com']  # daily / weekly / monthly orders reports
 
 # ── Logging ───────────────────────────────────────────────────────────────────
+# Handlers write from a listener thread (parlour.logging_utils.AsyncHandler),
+# so request threads never wait on disk. The file is JSON lines, size-capped
+# and rotated; every record carries the request's correlation id.
+LOG_FILE = BASE_DIR / 'debug.log'
+LOG_FILE_MAX_BYTES = 20 * 1024 * 1024
+LOG_FILE_BACKUPS = 5
+SLOW_REQUEST_MS = 1000  # slower requests are logged at WARNING
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'parlour.logging_utils.JsonFormatter'},
+        'console': {'format': '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'},
+    },
+    'filters': {
+        # Fraction of INFO records kept for the chattiest loggers
+        'sample': {
+            '()': 'parlour.logging_utils.SamplingFilter',
+            'rates': {'parlour.requests': 0.1},
+        },
+    },
     'handlers': {
-        'console': {'class': 'logging.StreamHandler'},
-        'file': {'class': 'logging.FileHandler', 'filename': BASE_DIR / 'debug.log'},
+        'console': {
+            'class': 'parlour.logging_utils.AsyncHandler',
+            'target': 'logging.StreamHandler',
+            'formatter': 'console',
+            'filters': ['sample'],
+        },
+        'file': {
+            'class': 'parlour.logging_utils.AsyncHandler',
+            'target': 'logging.handlers.RotatingFileHandler',
+            'filename': LOG_FILE,
+            'maxBytes': LOG_FILE_MAX_BYTES,
+            'backupCount': LOG_FILE_BACKUPS,
+            'encoding': 'utf-8',
+            'formatter': 'json',
+            'filters': ['sample'],
+        },
     },
     'root': {'handlers': ['console', 'file'], 'level': 'INFO'},
     'loggers': {
-        'django.core.mail': {
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
-            'propagate': True,
-        },
+        'django.core.mail': {'level': 'WARNING'},
     },
 }
@@ -1,40 +1,236 @@
-from django.contrib.sitemaps import Sitemap
+"""
+Pre-generated sitemaps.
+
+build_sitemaps() writes a sitemap index, a static-pages sitemap and
+fixed-size product chunks (plain and gzipped) to SITEMAP_ROOT. The scheduler
+refreshes them; sitemap_file() only streams files from disk, so crawler hits
+cost no DB work.
+"""
+import glob
+import gzip
+import logging
+import os
+import re
+import tempfile
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
 from django.urls import reverse
-from parlour.models import Product
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+
+from parlour.models import Product, ProductImage
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_ROOT = getattr(settings, 'SITEMAP_ROOT', os.path.join(settings.MEDIA_ROOT, 'sitemaps'))
+SITEMAP_CHUNK_SIZE = getattr(settings, 'SITEMAP_CHUNK_SIZE', 5000)
+SITEMAP_BASE_URL = getattr(settings, 'SITEMAP_BASE_URL', 'https://hokasparlour.adcent.online').rstrip('/')
+
+INDEX_NAME = 'sitemap.xml'
+STATIC_NAME = 'sitemap-static.xml'
+PRODUCTS_NAME = 'sitemap-products-{}.xml'
+
+# Only names build_sitemaps() can produce are ever served
+SITEMAP_NAME_RE = re.compile(r'^sitemap(-static|-products-\d+)?\.xml$')
+
+# (url name, priority, changefreq)
+STATIC_PAGES = [
+    ('home',    0.9, 'daily'),
+    ('about',   0.7, 'monthly'),
+    ('contact', 0.6, 'monthly'),
+    ('terms',   0.3, 'yearly'),
+    ('privacy', 0.3, 'yearly'),
+]
+
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+XMLNS_IMAGE = 'http://www.google.com/schemas/sitemap-image/1.1'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# XML helpers
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _absolute(path):
+    return path if path.startswith(('http://', 'https://')) else f"{SITEMAP_BASE_URL}{path}"
+
+
+def _image_url(name):
+    return _absolute(default_storage.url(name))
+
+
+def _lastmod(value):
+    return value.date().isoformat() if value else ''
+
+
+def _url_entry(loc, lastmod='', changefreq='', priority=None, images=()):
+    parts = [f"<url><loc>{escape(loc)}</loc>"]
+    if lastmod:
+        parts.append(f"<lastmod>{lastmod}</lastmod>")
+    if changefreq:
+        parts.append(f"<changefreq>{changefreq}</changefreq>")
+    if priority is not None:
+        parts.append(f"<priority>{priority:.1f}</priority>")
+    for image in images:
+        parts.append(f"<image:image><image:loc>{escape(image)}</image:loc></image:image>")
+    parts.append("</url>")
+    return ''.join(parts)
+
+
+def _urlset(entries):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<urlset xmlns="{XMLNS}" xmlns:image="{XMLNS_IMAGE}">\n'
+        + '\n'.join(entries)
+        + '\n</urlset>\n'
+    )
+
+
+def _sitemapindex(sitemaps):
+    entries = []
+    for name, lastmod in sitemaps:
+        entry = f"<sitemap><loc>{escape(_absolute('/' + name))}</loc>"
+        if lastmod:
+            entry += f"<lastmod>{lastmod}</lastmod>"
+        entries.append(entry + "</sitemap>")
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<sitemapindex xmlns="{XMLNS}">\n'
+        + '\n'.join(entries)
+        + '\n</sitemapindex>\n'
+    )
+
+
+def _write(name, content):
+    """Write name and name.gz atomically — a crawler never sees half a file."""
+    data = content.encode('utf-8')
+    for filename, payload in ((name, data), (f"{name}.gz", gzip.compress(data, mtime=0))):
+        fd, tmp_path = tempfile.mkstemp(dir=SITEMAP_ROOT, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, os.path.join(SITEMAP_ROOT, filename))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Building
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _product_chunks(chunk_size):
+    """Active products as (id, updated_at, image) tuples, chunk_size at a time by id."""
+    last_id = 0
+    while True:
+        rows = list(
+            Product.objects.filter(is_active=True, id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'updated_at', 'image')[:chunk_size]
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _product_sitemap(rows):
+    """Return (xml, newest lastmod) for one chunk of product rows."""
+    extra_images = {}
+    for product_id, image in (
+        ProductImage.objects.filter(product_id__in=[row[0] for row in rows])
+        .exclude(image='')
+        .order_by('product_id', 'order')
+        .values_list('product_id', 'image')
+    ):
+        extra_images.setdefault(product_id, []).append(image)
+
+    entries = []
+    newest = None
+    for product_id, updated_at, image in rows:
+        images = ([image] if image else []) + extra_images.get(product_id, [])
+        entries.append(_url_entry(
+            _absolute(reverse('product_detail', args=[product_id])),
+            lastmod=_lastmod(updated_at),
+            changefreq='weekly',
+            priority=0.8,
+            images=[_image_url(name) for name in images],
+        ))
+        if updated_at and (newest is None or updated_at > newest):
+            newest = updated_at
+
+    return _urlset(entries), _lastmod(newest)
+
+
+def _static_sitemap():
+    return _urlset(
+        _url_entry(_absolute(reverse(name)), changefreq=changefreq, priority=priority)
+        for name, priority, changefreq in STATIC_PAGES
+    )
+
+
+def build_sitemaps(chunk_size=None):
+    """
+    Regenerate every sitemap file. Chunks are written before the index so the
+    index never points at a missing file; leftover chunks from a larger
+    catalogue are removed last. Returns the number of product chunks.
+    """
+    chunk_size = chunk_size or SITEMAP_CHUNK_SIZE
+    os.makedirs(SITEMAP_ROOT, exist_ok=True)
 
+    _write(STATIC_NAME, _static_sitemap())
+    index = [(STATIC_NAME, _lastmod(timezone.now()))]
 
-class StaticViewSitemap(Sitemap):
-    protocol = 'https'
+    for number, rows in enumerate(_product_chunks(chunk_size), start=1):
+        xml, lastmod = _product_sitemap(rows)
+        name = PRODUCTS_NAME.format(number)
+        _write(name, xml)
+        index.append((name, lastmod))
 
-    def items(self):
-        return [
-            ('home',    0.9, 'daily'),
-            ('about',   0.7, 'monthly'),
-            ('contact', 0.6, 'monthly'),
-            ('terms',   0.3, 'yearly'),
-            ('privacy', 0.3, 'yearly'),
-        ]
+    _write(INDEX_NAME, _sitemapindex(index))
 
-    def location(self, item):
-        return reverse(item[0])
+    current = {name for name, _ in index}
+    for path in glob.glob(os.path.join(SITEMAP_ROOT, PRODUCTS_NAME.format('*') + '*')):
+        if os.path.basename(path).removesuffix('.gz') not in current:
+            os.remove(path)
 
-    def priority(self, item):
-        return item[1]
+    chunks = len(index) - 1
+    logger.info(f"Sitemaps rebuilt: {chunks} product chunk(s) of up to {chunk_size}")
+    return chunks
 
-    def changefreq(self, item):
-        return item[2]
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Serving
+# ─────────────────────────────────────────────────────────────────────────────
 
-class ProductSitemap(Sitemap):
-    protocol = 'https'
-    changefreq = 'weekly'
-    priority = 0.8
+def sitemap_file(request, name=INDEX_NAME):
+    """Serve a pre-generated sitemap, gzipped when the client accepts it."""
+    if not SITEMAP_NAME_RE.match(name):
+        raise Http404
 
-    def items(self):
-        return Product.objects.all()
+    path = os.path.join(SITEMAP_ROOT, name)
+    if not os.path.exists(os.path.join(SITEMAP_ROOT, INDEX_NAME)):
+        # First request after a deploy, before the scheduler has run
+        try:
+            build_sitemaps()
+        except Exception as e:
+            logger.error(f"Error building sitemaps on demand: {e}", exc_info=True)
+    if not os.path.exists(path):
+        raise Http404
 
-    def location(self, obj):
-        return reverse('product_detail', args=[obj.id])
+    gzipped = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '') and os.path.exists(f"{path}.gz")
+    if gzipped:
+        path = f"{path}.gz"
 
-    def lastmod(self, obj):
-        return getattr(obj, 'updated_at', None) or getattr(obj, 'created_at', None)
+    response = FileResponse(open(path, 'rb'), content_type='application/xml')
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    response['Vary'] = 'Accept-Encoding'
+    response['Last-Modified'] = http_date(os.path.getmtime(path))
+    patch_cache_control(response, public=True, max_age=60 * 60)
+    return response
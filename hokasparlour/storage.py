@@ -0,0 +1,27 @@
+"""
+Static files storage: hashed names, pre-compressed copies.
+
+collectstatic writes every file under a content-hashed name with gzip and
+brotli (when the Brotli package is installed) variants beside it, and
+WhiteNoise serves the hashed names with a far-future immutable
+Cache-Control. Django only hands out hashed URLs when DEBUG is off, and
+this project runs with DEBUG on, so with settings.STATIC_HASHED_URLS
+StaticStorage hands them out whenever collectstatic has written a manifest
+— and falls back to the plain name for a file missing from it rather than
+failing the page (check_static reports those). Dev leaves the setting off,
+so an old local collectstatic doesn't hide template and CSS edits.
+"""
+from django.conf import settings
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticStorage(CompressedManifestStaticFilesStorage):
+    manifest_strict = False
+
+    def url(self, name, force=False):
+        if not (getattr(settings, 'STATIC_HASHED_URLS', False) and self.hashed_files):
+            return super().url(name, force)
+        try:
+            return super().url(name, force=True)
+        except ValueError:
+            return super().url(name, force=False)
@@ -1,9 +1,8 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
-from django.contrib.sitemaps.views import sitemap
-from .sitemaps import StaticViewSitemap, ProductSitemap
+from .sitemaps import sitemap_file
 from parlour.views import robots_txt
 from django.http import FileResponse, HttpResponse
 from two_factor.urls import urlpatterns as tf_urls
@@ -23,12 +22,6 @@ admin.site.__class__ = SecureAdminSite
 # ─────────────────────────────────────────────────────────────────────────────
 
 
-sitemaps = {
-    'static': StaticViewSitemap,
-    'products': ProductSitemap,
-}
-
-
 def google_verify(request):
     file_path = os.path.join(settings.BASE_DIR, 'static', 'googleb193ab12b0274614.html')
     return FileResponse(open(file_path, 'rb'), content_type='text/html')
@@ -43,7 +36,8 @@ urlpatterns = [
     path('admin-dashboard/', include('hokaadmin.urls')),
     path('finance/', include('finance.urls', namespace='finance')),
     path('seller/', include('seller.urls', namespace='seller')),
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='sitemap'),
+    path('sitemap.xml', sitemap_file, name='sitemap'),
+    re_path(r'^(?P<name>sitemap-[a-z]+(?:-\d+)?\.xml)$', sitemap_file, name='sitemap_section'),
     path('robots.txt', robots_txt),
 ]
 
@@ -0,0 +1,143 @@
+"""
+In-memory ad-serving index.
+
+Every live ad is loaded once and bucketed by (placement, category, device
+class), already in display order, so picking the ads for a page is a dict
+lookup. Each process keeps its own copy and rebuilds it when:
+
+  * the 'ads' or 'category' cache tag changes — the same versions the
+    storefront page cache uses, bumped by the Advertisement / AdImage /
+    Category signals in any process;
+  * the next start_date / end_date boundary passes. The process that
+    notices also bumps the 'ads' tag so cached pages drop the old line-up.
+"""
+import logging
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from . import page_cache
+from .models import Advertisement
+
+logger = logging.getLogger(__name__)
+
+DEVICES = ('mobile', 'tablet', 'desktop')
+
+# Category part of a key matching ads regardless of their product category
+ANY_CATEGORY = '*'
+
+# Placement part of a key covering every non-hero placement — what a
+# storefront category section shows
+SECTION = 'section'
+
+_TAGS = (page_cache.TAG_ADS, page_cache.TAG_CATEGORY)
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+class _Snapshot:
+    def __init__(self, buckets, versions, expires_at):
+        self.buckets = buckets
+        self.versions = versions
+        self.expires_at = expires_at
+
+
+def _shows_on(ad, device):
+    return {
+        'mobile': ad.show_on_mobile,
+        'tablet': ad.show_on_tablet,
+        'desktop': ad.show_on_desktop,
+    }[device]
+
+
+def _build(versions):
+    now = timezone.now()
+    ads = list(
+        Advertisement.objects.filter(is_active=True)
+        .select_related('product_category', 'linked_product')
+        .prefetch_related('ad_images')
+        .order_by('order', '-created_at')
+    )
+
+    buckets = defaultdict(list)
+    expires_at = None
+    for ad in ads:
+        # Next moment this ad enters or leaves its window
+        if ad.start_date and ad.start_date > now:
+            boundary = ad.start_date
+        elif ad.end_date and ad.end_date >= now:
+            boundary = ad.end_date + timedelta(microseconds=1)
+        else:
+            boundary = None
+        if boundary and (expires_at is None or boundary < expires_at):
+            expires_at = boundary
+
+        live = (ad.start_date is None or ad.start_date <= now) and (ad.end_date is None or ad.end_date >= now)
+        if not live:
+            continue
+
+        keys = [(ad.ad_category, ad.product_category_id), (ad.ad_category, ANY_CATEGORY)]
+        if ad.ad_category != 'main' and ad.product_category_id:
+            keys.append((SECTION, ad.product_category_id))
+        for device in DEVICES:
+            if _shows_on(ad, device):
+                for placement, category in keys:
+                    buckets[(placement, category, device)].append(ad)
+
+    return _Snapshot(dict(buckets), versions, expires_at)
+
+
+def _current():
+    """The live snapshot, rebuilt first if it is stale."""
+    global _snapshot
+
+    versions = page_cache.tag_versions(*_TAGS)
+    snapshot = _snapshot
+    if snapshot and snapshot.versions == versions and (
+        snapshot.expires_at is None or timezone.now() < snapshot.expires_at
+    ):
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot and snapshot.versions == versions:
+            if snapshot.expires_at is None or timezone.now() < snapshot.expires_at:
+                return snapshot
+            # A schedule boundary passed without anything being saved
+            page_cache.invalidate(page_cache.TAG_ADS)
+            versions = page_cache.tag_versions(*_TAGS)
+
+        try:
+            _snapshot = _build(versions)
+        except Exception as e:
+            logger.error(f"Error building ad index: {e}", exc_info=True)
+            if snapshot is None:
+                raise
+            return snapshot
+        return _snapshot
+
+
+def get_ads(placement, category=ANY_CATEGORY, device='desktop'):
+    """
+    Ads to show for a placement ('main', 'banner', ... or SECTION), a
+    category id (ANY_CATEGORY for all) and a device class, in display order.
+    """
+    return list(_current().buckets.get((placement, category, device), ()))
+
+
+def current_versions():
+    """
+    The ad / category tag versions the index is current for. Checks the
+    schedule first, so a passed start_date or end_date has already bumped
+    the 'ads' tag.
+    """
+    return dict(_current().versions)
+
+
+def reset():
+    """Drop this process's index; the next lookup rebuilds it."""
+    global _snapshot
+    _snapshot = None
@@ -0,0 +1,274 @@
+"""
+Ad analytics rollups.
+
+Every homepage view writes one AdImpression per ad shown, so the raw table
+is only kept for AD_IMPRESSION_RETENTION_DAYS. compact_impressions() rolls
+finished days up into AdDailyStat (views, unique sessions and click-through
+sessions per ad, day and device class); prune_impressions() then deletes raw
+rows that are both rolled up and past retention. The ad dashboards read the
+rollups, plus the raw rows of any day not compacted yet (normally just today).
+"""
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import AdDailyStat, AdImpression
+from .page_cache import device_class_for_agent
+
+logger = logging.getLogger(__name__)
+
+RETENTION_DAYS = getattr(settings, 'AD_IMPRESSION_RETENTION_DAYS', 90)
+
+# Already-compacted days are re-rolled this far back, so clicks on an
+# impression from late last night are still counted once the day is closed
+REROLL_DAYS = 1
+
+PRUNE_BATCH_SIZE = 5000
+
+DEVICE_CLASSES = [code for code, _ in AdDailyStat.DEVICE_CLASSES]
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def last_compacted_day():
+    return AdDailyStat.objects.aggregate(last=Max('date'))['last']
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Compaction
+# ─────────────────────────────────────────────────────────────────────────────
+
+def rollup_day(day):
+    """
+    Replace the AdDailyStat rows for one day from the raw impressions.
+    Idempotent — safe to re-run for a day. A day with no raw impressions
+    left (pruned) keeps the rows it has. Returns the rows written.
+    """
+    start = _day_start(day)
+    end = _day_start(day + timedelta(days=1))
+
+    # One row per (ad, session, user agent); device class is derived from the
+    # user agent in Python since the DB can't classify it
+    sessions = (
+        AdImpression.objects.filter(viewed_at__gte=start, viewed_at__lt=end)
+        .values('advertisement_id', 'session_key', 'user_agent')
+        .annotate(views=Count('id'), clicks=Count('id', filter=Q(clicked=True)))
+        .order_by()
+    )
+
+    totals = defaultdict(lambda: {'views': 0, 'sessions': set(), 'clicked': set()})
+    for row in sessions.iterator():
+        bucket = totals[(row['advertisement_id'], device_class_for_agent(row['user_agent']))]
+        bucket['views'] += row['views']
+        bucket['sessions'].add(row['session_key'])
+        if row['clicks']:
+            bucket['clicked'].add(row['session_key'])
+
+    stats = [
+        AdDailyStat(
+            advertisement_id=ad_id,
+            date=day,
+            device_class=device,
+            views=bucket['views'],
+            unique_sessions=len(bucket['sessions']),
+            clicks=len(bucket['clicked']),
+        )
+        for (ad_id, device), bucket in totals.items()
+    ]
+
+    if not stats and AdDailyStat.objects.filter(date=day).exists():
+        logger.warning(f"No raw ad impressions left for {day}; keeping its existing rollup")
+        return 0
+
+    with transaction.atomic():
+        AdDailyStat.objects.filter(date=day).delete()
+        AdDailyStat.objects.bulk_create(stats)
+    return len(stats)
+
+
+def compact_impressions(today=None):
+    """
+    Roll up every finished day that isn't compacted yet (and re-roll the
+    last REROLL_DAYS of those that are). Returns the number of days rolled.
+    """
+    today = today or timezone.localdate()
+    last = last_compacted_day()
+
+    if last:
+        first = last - timedelta(days=REROLL_DAYS)
+    else:
+        oldest = AdImpression.objects.order_by('viewed_at').values_list('viewed_at', flat=True).first()
+        if oldest is None:
+            return 0
+        first = timezone.localdate(oldest)
+
+    days = 0
+    day = first
+    while day < today:
+        rollup_day(day)
+        days += 1
+        day += timedelta(days=1)
+    return days
+
+
+def prune_cutoff_day(today=None, retention_days=None):
+    """
+    The first day whose raw impressions are kept; earlier days may already
+    be pruned. None while nothing has been rolled up (nothing is pruned).
+    """
+    today = today or timezone.localdate()
+    retention_days = RETENTION_DAYS if retention_days is None else retention_days
+    last = last_compacted_day()
+    if last is None:
+        return None
+    # Keep the re-roll window intact as well
+    return min(today - timedelta(days=retention_days), last - timedelta(days=REROLL_DAYS))
+
+
+def prune_impressions(today=None, retention_days=None):
+    """
+    Delete raw impressions older than the retention window, but never from a
+    day that hasn't been rolled up. Deletes in batches to keep locks short.
+    """
+    cutoff_day = prune_cutoff_day(today, retention_days)
+    if cutoff_day is None:
+        return 0
+    cutoff = _day_start(cutoff_day)
+
+    deleted = 0
+    while True:
+        ids = list(
+            AdImpression.objects.filter(viewed_at__lt=cutoff)
+            .values_list('pk', flat=True)[:PRUNE_BATCH_SIZE]
+        )
+        if not ids:
+            return deleted
+        deleted += AdImpression.objects.filter(pk__in=ids).delete()[0]
+
+
+def compact_and_prune():
+    days = compact_impressions()
+    pruned = prune_impressions()
+    logger.info(f"Ad impressions compacted: {days} day(s) rolled up, {pruned} raw row(s) pruned")
+    return days, pruned
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Reading — rollups for compacted days, raw rows for the rest
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _split(start_day, end_day):
+    """(last day answered by rollups, first day answered by raw impressions)."""
+    last = last_compacted_day()
+    if last is None or last < start_day:
+        return None, start_day
+    return min(last, end_day), min(last, end_day) + timedelta(days=1)
+
+
+def daily_series(start_day, end_day, advertisement=None):
+    """
+    {date: {'views', 'sessions', 'clicks'}} for every day in
+    [start_day, end_day], optionally for one ad.
+    """
+    series = {
+        start_day + timedelta(days=i): {'views': 0, 'sessions': 0, 'clicks': 0}
+        for i in range((end_day - start_day).days + 1)
+    }
+    ad_filter = {'advertisement': advertisement} if advertisement else {}
+    rolled_until, raw_from = _split(start_day, end_day)
+
+    if rolled_until:
+        rows = (
+            AdDailyStat.objects.filter(date__gte=start_day, date__lte=rolled_until, **ad_filter)
+            .values('date')
+            .annotate(views=Sum('views'), sessions=Sum('unique_sessions'), clicks=Sum('clicks'))
+            .order_by()
+        )
+        for row in rows:
+            series[row['date']] = {'views': row['views'], 'sessions': row['sessions'], 'clicks': row['clicks']}
+
+    if raw_from <= end_day:
+        rows = (
+            AdImpression.objects.filter(
+                viewed_at__gte=_day_start(raw_from),
+                viewed_at__lt=_day_start(end_day + timedelta(days=1)),
+                **ad_filter,
+            )
+            .annotate(day=TruncDate('viewed_at'))
+            .values('day')
+            .annotate(
+                views=Count('id'),
+                sessions=Count('session_key', distinct=True),
+                clicks=Count('session_key', distinct=True, filter=Q(clicked=True)),
+            )
+            .order_by()
+        )
+        for row in rows:
+            if row['day'] in series:
+                series[row['day']] = {'views': row['views'], 'sessions': row['sessions'], 'clicks': row['clicks']}
+
+    return series
+
+
+def period_totals(days=30, advertisement=None):
+    """Views / sessions / clicks summed over the last `days` days, today included."""
+    today = timezone.localdate()
+    series = daily_series(today - timedelta(days=days - 1), today, advertisement)
+    return {
+        key: sum(day[key] for day in series.values())
+        for key in ('views', 'sessions', 'clicks')
+    }
+
+
+def device_breakdown(days=30, advertisement=None):
+    """[{'device_class', 'views', 'sessions', 'clicks', 'ctr'}] over the last `days` days."""
+    today = timezone.localdate()
+    start_day = today - timedelta(days=days - 1)
+    ad_filter = {'advertisement': advertisement} if advertisement else {}
+    totals = {device: {'views': 0, 'sessions': 0, 'clicks': 0} for device in DEVICE_CLASSES}
+    rolled_until, raw_from = _split(start_day, today)
+
+    if rolled_until:
+        rows = (
+            AdDailyStat.objects.filter(date__gte=start_day, date__lte=rolled_until, **ad_filter)
+            .values('device_class')
+            .annotate(views=Sum('views'), sessions=Sum('unique_sessions'), clicks=Sum('clicks'))
+            .order_by()
+        )
+        for row in rows:
+            bucket = totals[row['device_class']]
+            for key in ('views', 'sessions', 'clicks'):
+                bucket[key] += row[key]
+
+    # Uncompacted days: group by user agent, classify here
+    rows = (
+        AdImpression.objects.filter(viewed_at__gte=_day_start(raw_from), **ad_filter)
+        .values('user_agent')
+        .annotate(
+            views=Count('id'),
+            sessions=Count('session_key', distinct=True),
+            clicks=Count('session_key', distinct=True, filter=Q(clicked=True)),
+        )
+        .order_by()
+    )
+    for row in rows:
+        bucket = totals[device_class_for_agent(row['user_agent'])]
+        for key in ('views', 'sessions', 'clicks'):
+            bucket[key] += row[key]
+
+    return [
+        {
+            'device_class': device,
+            **bucket,
+            'ctr': (bucket['clicks'] / bucket['views'] * 100) if bucket['views'] else 0,
+        }
+        for device, bucket in totals.items()
+    ]
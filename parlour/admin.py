@@ -1,9 +1,14 @@
+from decimal import Decimal
+
 from django.contrib import admin
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Coalesce
 from django.utils.html import format_html, mark_safe
+from .admin_utils import EstimatedCountPaginator
 from .models import (
     Product, ProductImage, Order, OrderItem, StoreSettings, 
-    EmailOTP, Profile, OrderHistory, Advertisement, AdImage, AdImpression,
-    MpesaPayment
+    EmailOTP, Profile, OrderHistory, Advertisement, AdImage, AdImpression, AdDailyStat,
+    MpesaPayment, JobRun, OrderEvent, Customer
 )
 from .models import Store, SellerApplication
 from .models import Category
@@ -117,6 +122,7 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ('name', 'description')
     ordering = ('-created_at',)
     inlines = [ProductImageInline]
+    list_select_related = ('category', 'store')
 
     readonly_fields = (
         'profit_display',
@@ -156,6 +162,12 @@ class ProductAdmin(admin.ModelAdmin):
 
     filter_horizontal = ('colors',)
 
+    def get_queryset(self, request):
+        # One query for the whole page instead of a COUNT per row
+        return super().get_queryset(request).annotate(
+            additional_image_count=Count('additional_images')
+        )
+
     # ── List display helpers ───────────────────────────────────────
 
     def is_in_stock(self, obj):
@@ -174,11 +186,12 @@ class ProductAdmin(admin.ModelAdmin):
         return mark_safe('<span style="color:#ccc;">—</span>')
 
     def image_count(self, obj):
-        count = obj.additional_images.count()
+        count = obj.additional_image_count
         if count > 0:
             return format_html('<span style="color: green;">✓ {} additional</span>', count)
         return mark_safe('<span style="color: gray;">Main only</span>')
     image_count.short_description = 'Images'
+    image_count.admin_order_field = 'additional_image_count'
 
     def delivery_badge(self, obj):
         if obj.stock_type == 'ready':
@@ -234,6 +247,7 @@ class ProductAdmin(admin.ModelAdmin):
 class ProductImageAdmin(admin.ModelAdmin):
     list_display = ('product', 'alt_text', 'order', 'image_preview')
     list_filter = ('product__category',)
+    list_select_related = ('product',)
     search_fields = ('product__name', 'alt_text')
     ordering = ('product', 'order')
     list_editable = ('order',)
@@ -254,10 +268,12 @@ class OrderAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'get_total_display', 'show_pickup_info')
     inlines = [OrderItemInline]
     ordering = ('-created_at',)
+    raw_id_fields = ('customer',)
+    actions = ['resend_confirmation_emails', 'mark_processing', 'mark_dispatched', 'mark_delivered']
     
     fieldsets = (
         ('Customer Information', {
-            'fields': ('customer_name', 'phone_number', 'email', 'delivery_address')
+            'fields': ('customer_name', 'phone_number', 'email', 'delivery_address', 'customer')
         }),
         ('Order Details', {
             'fields': ('order_status', 'is_paid', 'created_at', 'get_total_display')
@@ -281,9 +297,57 @@ class OrderAdmin(admin.ModelAdmin):
         )
     payment_status.short_description = 'Payment Status'
 
+    def resend_confirmation_emails(self, request, queryset):
+        from .email_utils import send_order_confirmation_emails
+        try:
+            sent = send_order_confirmation_emails(queryset)
+        except Exception as e:
+            self.message_user(request, f'❌ Sending failed: {e}', level='error')
+            return
+        self.message_user(request, f'📧 {sent} confirmation email(s) sent.')
+    resend_confirmation_emails.short_description = '📧 Resend order confirmation emails'
+
+    def _bulk_transition(self, request, queryset, to_status):
+        from .order_lifecycle import STATUS_LABELS, bulk_transition
+        result = bulk_transition(list(queryset.values_list('pk', flat=True)), to_status)
+        self.message_user(request, f'{len(result.moved)} order(s) marked {STATUS_LABELS[to_status]}.')
+        if result.skipped:
+            self.message_user(
+                request,
+                f"{len(result.skipped)} order(s) can't move to {STATUS_LABELS[to_status]} and were left as they were.",
+                level='warning',
+            )
+
+    def mark_processing(self, request, queryset):
+        self._bulk_transition(request, queryset, 'processing')
+    mark_processing.short_description = '⚙️ Mark selected as processing'
+
+    def mark_dispatched(self, request, queryset):
+        self._bulk_transition(request, queryset, 'dispatched')
+    mark_dispatched.short_description = '🚚 Mark selected as dispatched'
+
+    def mark_delivered(self, request, queryset):
+        self._bulk_transition(request, queryset, 'delivered')
+    mark_delivered.short_description = '✅ Mark selected as delivered'
+
+    def get_queryset(self, request):
+        money = DecimalField(max_digits=12, decimal_places=2)
+        # Coalesce: orders without items total 0, not NULL (no per-row fallback, stable sorting)
+        return super().get_queryset(request).annotate(
+            total_amount=Coalesce(
+                Sum(F('orderitem__price') * F('orderitem__quantity'), output_field=money),
+                Decimal('0'),
+                output_field=money,
+            )
+        )
+
     def get_total_display(self, obj):
-        return f"KSH {obj.get_total()}"
+        total = getattr(obj, 'total_amount', None)
+        if total is None:
+            total = obj.get_total()
+        return f"KSH {total}"
     get_total_display.short_description = 'Total Amount'
+    get_total_display.admin_order_field = 'total_amount'
     
     def show_pickup_info(self, obj):
         pickup_info = obj.get_pickup_info()
@@ -306,6 +370,7 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('order', 'product', 'quantity', 'size', 'price', 'get_subtotal_display')
     list_filter = ('order__order_status', 'product__category')
     search_fields = ('order__id', 'product__name', 'order__customer_name')
+    list_select_related = ('order', 'product')
     
     def get_subtotal_display(self, obj):
         return f"KSH {obj.get_subtotal()}"
@@ -316,6 +381,7 @@ class OrderItemAdmin(admin.ModelAdmin):
 class EmailOTPAdmin(admin.ModelAdmin):
     list_display = ('user', 'otp', 'created_at')
     list_filter = ('created_at',)
+    list_select_related = ('user',)
     search_fields = ('user__username', 'user__email', 'otp')
     readonly_fields = ('created_at',)
     ordering = ('-created_at',)
@@ -325,6 +391,7 @@ class EmailOTPAdmin(admin.ModelAdmin):
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'phone_number', 'preferred_payment_method', 'has_complete_profile', 'whatsapp_status', 'created_at')
     list_filter = ('preferred_payment_method', 'whatsapp_joined', 'created_at')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'user__email', 'phone_number')
     readonly_fields = ('created_at', 'updated_at')
     
@@ -376,17 +443,36 @@ class ProfileAdmin(admin.ModelAdmin):
 class OrderHistoryAdmin(admin.ModelAdmin):
     list_display = ('user', 'order', 'viewed_at')
     list_filter = ('viewed_at',)
+    list_select_related = ('user', 'order')
     search_fields = ('user__username', 'order__id', 'order__customer_name')
     readonly_fields = ('viewed_at',)
     ordering = ('-viewed_at',)
 
 
+@admin.register(Customer)
+class CustomerAdmin(admin.ModelAdmin):
+    list_display = ('name', 'email', 'phone', 'user', 'order_count', 'created_at')
+    list_select_related = ('user',)
+    search_fields = ('name', 'email', 'phone', 'user__username')
+    raw_id_fields = ('user',)
+    readonly_fields = ('created_at',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(order_count=Count('orders'))
+
+    def order_count(self, obj):
+        return obj.order_count
+    order_count.short_description = 'Orders'
+    order_count.admin_order_field = 'order_count'
+
+
 @admin.register(Advertisement)
 class AdvertisementAdmin(admin.ModelAdmin):
     list_display = ('title', 'ad_type', 'ad_category', 'product_category', 'is_active', 'order', 'views', 'clicks', 'ctr', 'status_badge')
     list_filter = ('ad_type', 'ad_category', 'is_active', 'target_audience', 'product_category', 'created_at')
     search_fields = ('title', 'headline', 'subheadline')
     ordering = ('order', '-created_at')
+    list_select_related = ('product_category',)
     list_editable = ('order', 'is_active')
     inlines = [AdImageInline]
     
@@ -478,6 +564,7 @@ class AdvertisementAdmin(admin.ModelAdmin):
 @admin.register(AdImage)
 class AdImageAdmin(admin.ModelAdmin):
     list_display = ('advertisement', 'caption', 'order', 'image_preview')
+    list_select_related = ('advertisement',)
     list_filter = ('advertisement__ad_type',)
     search_fields = ('advertisement__title', 'caption')
     ordering = ('advertisement', 'order')
@@ -497,6 +584,11 @@ class AdImpressionAdmin(admin.ModelAdmin):
     search_fields = ('session_key', 'ip_address', 'advertisement__title')
     readonly_fields = ('advertisement', 'session_key', 'ip_address', 'user_agent', 'viewed_at', 'clicked')
     ordering = ('-viewed_at',)
+    list_select_related = ('advertisement',)
+
+    # Impressions grow without bound — skip the exact COUNT(*) on every page
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def has_add_permission(self, request):
         return False
@@ -505,6 +597,63 @@ class AdImpressionAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(AdDailyStat)
+class AdDailyStatAdmin(admin.ModelAdmin):
+    list_display = ('date', 'advertisement', 'device_class', 'views', 'unique_sessions', 'clicks', 'ctr_display')
+    list_filter = ('device_class', 'date', 'advertisement')
+    search_fields = ('advertisement__title',)
+    date_hierarchy = 'date'
+    ordering = ('-date',)
+    list_select_related = ('advertisement',)
+
+    def ctr_display(self, obj):
+        return f"{obj.ctr:.1f}%"
+    ctr_display.short_description = 'CTR'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OrderEvent)
+class OrderEventAdmin(admin.ModelAdmin):
+    list_display = ('order', 'from_status', 'to_status', 'status', 'attempts', 'delivered', 'created_at', 'sent_at')
+    list_filter = ('status', 'to_status')
+    search_fields = ('order__id', 'order__customer_name', 'last_error')
+    raw_id_fields = ('order',)
+    actions = ['retry_events']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def retry_events(self, request, queryset):
+        from .background import run_in_background
+        from .order_lifecycle import deliver_pending
+        count = queryset.filter(status='failed').update(status='pending', attempts=0)
+        run_in_background(deliver_pending)
+        self.message_user(request, f'{count} failed notification(s) queued again.')
+    retry_events.short_description = '🔁 Retry failed notifications'
+
+
+@admin.register(JobRun)
+class JobRunAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'status', 'started_at', 'duration_ms', 'rows', 'detail', 'host')
+    list_filter = ('status', 'job_id')
+    search_fields = ('job_id', 'detail', 'error')
+    date_hierarchy = 'started_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(MpesaPayment)
 class MpesaPaymentAdmin(admin.ModelAdmin):
     list_display = (
@@ -520,6 +669,9 @@ class MpesaPaymentAdmin(admin.ModelAdmin):
     )
     ordering = ('-created_at',)
 
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
     fieldsets = (
         ('Transaction Info', {
             'fields': ('checkout_request_id', 'phone_number', 'amount', 'status')
@@ -554,7 +706,7 @@ class MpesaPaymentAdmin(admin.ModelAdmin):
 
 
 
-from .models import Agent, PromoUsage
+from .models import Agent, PromoUsage, ReferralEntry
 
 @admin.register(Agent)
 class AgentAdmin(admin.ModelAdmin):
@@ -563,6 +715,7 @@ class AgentAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'user__email', 'referral_code', 'phone_number')
     readonly_fields = ('created_at', 'approved_at', 'total_referrals', 'referral_link')  # ← referral_code removed so admin can edit it
     ordering = ('-created_at',)
+    list_select_related = ('user',)
 
     fieldsets = (
         ('Agent Info', {
@@ -629,6 +782,7 @@ class PromoUsageAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'user__email', 'agent__referral_code')
     readonly_fields = ('user', 'agent', 'promo_purchases_count', 'is_active', 'created_at')
     ordering = ('-created_at',)
+    list_select_related = ('user', 'agent__user')
 
     fieldsets = (
         ('Usage Info', {
@@ -667,6 +821,27 @@ class PromoUsageAdmin(admin.ModelAdmin):
     remaining.short_description = 'Remaining'
 
 
+@admin.register(ReferralEntry)
+class ReferralEntryAdmin(admin.ModelAdmin):
+    """The referral ledger is append-only: written by parlour.referrals, never edited."""
+    list_display = ('created_at', 'user', 'agent', 'kind', 'order', 'units', 'promo_sales')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('user__username', 'user__email', 'agent__referral_code')
+    ordering = ('-created_at',)
+    list_select_related = ('user', 'agent__user', 'order')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 from parlour.models import ContactMessage
 
 @admin.register(ContactMessage)
@@ -693,6 +868,7 @@ class StoreAdmin(admin.ModelAdmin):
     search_fields = ('store_name', 'owner__username', 'owner__email', 'phone', 'email')
     readonly_fields = ('created_at', 'approved_at', 'slug', 'product_count')
     ordering = ('-created_at',)
+    list_select_related = ('owner',)
 
     fieldsets = (
         ('Store Identity', {
@@ -715,10 +891,16 @@ class StoreAdmin(admin.ModelAdmin):
 
     actions = ['approve_stores', 'suspend_stores']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(product_total=Count('products'))
+
     def product_count(self, obj):
-        count = obj.get_product_count()
+        count = getattr(obj, 'product_total', None)
+        if count is None:
+            count = obj.get_product_count()
         return format_html('<strong>{}</strong> product{}', count, 's' if count != 1 else '')
     product_count.short_description = 'Products'
+    product_count.admin_order_field = 'product_total'
 
     def status_badge(self, obj):
         colors = {
@@ -760,6 +942,7 @@ class SellerApplicationAdmin(admin.ModelAdmin):
     search_fields = ('business_name', 'user__username', 'user__email', 'phone')
     readonly_fields = ('user', 'business_name', 'phone', 'email', 'reason', 'created_at', 'reviewed_at')
     ordering = ('-created_at',)
+    list_select_related = ('user__store',)
 
     fieldsets = (
         ('Applicant Info', {
@@ -0,0 +1,63 @@
+"""
+Admin helpers for large tables.
+
+EstimatedCountPaginator replaces the exact COUNT(*) of an unfiltered
+changelist with the planner's row estimate once a table is big enough for
+the count to dominate the page. Filtered or searched lists, and small
+tables, still get an exact count.
+"""
+import logging
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+# Below this many (estimated) rows an exact count is cheap enough
+ESTIMATE_THRESHOLD = 10000
+
+
+def estimated_row_count(model, using='default'):
+    """Planner estimate of a table's row count, or None if the backend has none."""
+    connection = connections[using]
+    table = model._meta.db_table
+
+    if connection.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)"
+        params = [connection.ops.quote_name(table)]
+    elif connection.vendor == 'mysql':
+        sql = (
+            "SELECT table_rows FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = %s"
+        )
+        params = [table]
+    else:
+        return None
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except Exception as e:
+        logger.error(f"Error reading row estimate for {table}: {e}")
+        return None
+
+    # reltuples is -1 for a table that has never been analysed
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose count is the table estimate for unfiltered querysets."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where and not query.distinct:
+            estimate = estimated_row_count(queryset.model, using=queryset.db)
+            if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
@@ -0,0 +1,391 @@
+"""
+Read-only JSON catalog API for the storefront PWA.
+
+    GET /api/v1/products/            ?category= &gender= &ids=1,2 &limit= &cursor= &fields=
+    GET /api/v1/products/<id>/       ?fields=
+    GET /api/v1/categories/
+    GET /api/v1/ads/                 ?placement= &device=
+    GET /api/v1/delivery/
+
+Rows are read with values() and written out as plain dicts — no model
+instances. Products come newest first in keyset pages: `next` carries an
+opaque cursor (created_at, id) instead of an offset, so a page costs the
+same however deep it is. `fields` picks the product fields to return from
+PRODUCT_FIELDS (and DETAIL_FIELDS on a single product).
+
+Prices are list prices; promo pricing is per user and stays server-side.
+
+Every response carries a strong ETag and a Last-Modified taken from the
+page_cache tag versions it depends on — the counters the Product /
+Category / Advertisement / StoreSettings signals bump — so revalidating
+unchanged data is answered 304 from one cache lookup, before any query.
+"""
+import base64
+import hashlib
+from datetime import datetime, time
+from functools import wraps
+
+from django.core.files.storage import default_storage
+from django.db.models import Count, Q
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag, urlencode
+from django.views.decorators.http import require_safe
+
+from . import ad_index, page_cache, wishlists
+from .models import AdImage, Advertisement, Category, Color, Product, ProductImage, StoreSettings
+
+API_PAGE_SIZE = 24
+API_MAX_PAGE_SIZE = 100
+
+
+class ApiError(Exception):
+    """A bad request, answered as {"error": message} with status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Field formatting
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _media_url(name):
+    return default_storage.url(name) if name else None
+
+
+def _sizes(value):
+    return [size.strip() for size in (value or '').split(',') if size.strip()]
+
+
+def _product_url(product_id):
+    return reverse('product_detail', args=[product_id])
+
+
+# Product field name → (values() lookup, formatter)
+PRODUCT_FIELDS = {
+    'id':             ('id', None),
+    'name':           ('name', None),
+    'description':    ('description', None),
+    'price':          ('price', None),
+    'anchor_price':   ('anchor_price', None),
+    'discount_price': ('discount_price', None),
+    'category':       ('category_id', None),
+    'category_name':  ('category__name', None),
+    'gender':         ('gender', None),
+    'stock_type':     ('stock_type', None),
+    'sizes':          ('available_sizes', _sizes),
+    'image':          ('image', _media_url),
+    'url':            ('id', _product_url),
+    'created_at':     ('created_at', None),
+    'updated_at':     ('updated_at', None),
+}
+
+DEFAULT_PRODUCT_FIELDS = (
+    'id', 'name', 'price', 'anchor_price', 'discount_price',
+    'category', 'stock_type', 'image', 'url',
+)
+
+# Extra fields of a single product, each read by its own query when asked for
+DETAIL_FIELDS = ('images', 'colors', 'delivery')
+
+
+def _fields(request, allowed, default):
+    raw = request.GET.get('fields')
+    if not raw:
+        return tuple(default)
+    fields = tuple(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in allowed]
+    if unknown or not fields:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown) or raw}. Allowed: {', '.join(allowed)}")
+    return fields
+
+
+def _lookups(fields):
+    return list(dict.fromkeys(PRODUCT_FIELDS[name][0] for name in fields if name in PRODUCT_FIELDS))
+
+
+def _product_row(row, fields):
+    out = {}
+    for name in fields:
+        if name not in PRODUCT_FIELDS:
+            continue
+        lookup, formatter = PRODUCT_FIELDS[name]
+        value = row[lookup]
+        out[name] = formatter(value) if formatter else value
+    return out
+
+
+def _delivery(info):
+    return {key: info[key] for key in ('date', 'time', 'label') if key in info}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Cursors
+# ─────────────────────────────────────────────────────────────────────────────
+
+def encode_cursor(created_at, pk):
+    raw = f"{created_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from encode_cursor(); ApiError if it isn't one."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError("Invalid cursor")
+
+
+def _limit(request):
+    raw = request.GET.get('limit')
+    if not raw:
+        return API_PAGE_SIZE
+    if not raw.isdigit() or not 1 <= int(raw) <= API_MAX_PAGE_SIZE:
+        raise ApiError(f"limit must be between 1 and {API_MAX_PAGE_SIZE}")
+    return int(raw)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Conditional responses
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _validators(request, versions, daily):
+    """(strong ETag, Last-Modified datetime or None) for this URL at these tag versions."""
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    parts = [request.path, query]
+    parts.extend(f"{tag}={version}" for tag, version in sorted(versions.items()))
+
+    times = [page_cache.version_time(version) for version in versions.values()]
+    last_modified = max(times) if times and all(times) else None
+    if daily:
+        # Delivery dates move on at midnight without anything being saved
+        today = timezone.localdate()
+        parts.append(str(today))
+        midnight = timezone.make_aware(datetime.combine(today, time.min))
+        last_modified = max(last_modified, midnight) if last_modified else None
+
+    etag = quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+    return etag, last_modified
+
+
+def catalog_view(*tags, versions=None, daily=False):
+    """
+    Serve a view's payload as JSON with ETag / Last-Modified validators.
+
+    tags      page_cache tags the payload depends on
+    versions  callable returning {tag: version} to use instead of tags
+    daily     the payload also changes with the date
+    The view returns a dict; it may raise ApiError or Http404.
+    """
+    def decorator(view):
+        @require_safe
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            current = versions() if versions else page_cache.tag_versions(*tags)
+            etag, last_modified = _validators(request, current, daily)
+
+            response = get_conditional_response(
+                request,
+                etag=etag,
+                last_modified=int(last_modified.timestamp()) if last_modified else None,
+            )
+            if response is None:
+                try:
+                    response = JsonResponse(view(request, *args, **kwargs))
+                except ApiError as e:
+                    return JsonResponse({'error': str(e)}, status=e.status)
+                except Http404:
+                    return JsonResponse({'error': 'Not found'}, status=404)
+
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+            # Any cache may keep it, but must revalidate — which is the cheap 304
+            patch_cache_control(response, public=True, no_cache=True)
+            return response
+
+        return wrapper
+    return decorator
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Endpoints
+# ─────────────────────────────────────────────────────────────────────────────
+
+@catalog_view(page_cache.TAG_PRODUCT, page_cache.TAG_CATEGORY)
+def products(request):
+    """A page of live products, newest first."""
+    fields = _fields(request, PRODUCT_FIELDS, DEFAULT_PRODUCT_FIELDS)
+    limit = _limit(request)
+
+    queryset = Product.objects.filter(is_active=True)
+    category = request.GET.get('category')
+    if category:
+        if not category.isdigit():
+            raise ApiError("category must be a category id")
+        queryset = queryset.filter(category_id=category)
+    gender = request.GET.get('gender')
+    if gender:
+        queryset = queryset.filter(gender=gender)
+    if request.GET.get('ids'):
+        ids = wishlists.parse_ids(request.GET['ids'].split(','))[:API_MAX_PAGE_SIZE]
+        queryset = queryset.filter(id__in=ids)
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    lookups = list(dict.fromkeys(_lookups(fields) + ['id', 'created_at']))
+    rows = list(queryset.order_by('-created_at', '-id').values(*lookups)[:limit + 1])
+
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        query = request.GET.copy()
+        query['cursor'] = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+        next_url = f"{request.path}?{query.urlencode()}"
+
+    return {
+        'results': [_product_row(row, fields) for row in rows],
+        'next': next_url,
+    }
+
+
+@catalog_view(page_cache.TAG_PRODUCT, page_cache.TAG_CATEGORY, page_cache.TAG_SETTINGS, daily=True)
+def product(request, product_id):
+    """One live product, with its images, colors and next delivery date unless fields leaves them out."""
+    fields = _fields(
+        request,
+        tuple(PRODUCT_FIELDS) + DETAIL_FIELDS,
+        tuple(PRODUCT_FIELDS) + DETAIL_FIELDS,
+    )
+    lookups = list(dict.fromkeys(_lookups(fields) + ['stock_type']))
+    row = Product.objects.filter(id=product_id, is_active=True).values(*lookups).first()
+    if row is None:
+        raise Http404
+
+    data = _product_row(row, fields)
+    if 'images' in fields:
+        data['images'] = [
+            {'url': _media_url(image), 'alt_text': alt_text}
+            for image, alt_text in (
+                ProductImage.objects.filter(product_id=product_id)
+                .order_by('order', 'id').values_list('image', 'alt_text')
+            )
+        ]
+    if 'colors' in fields:
+        data['colors'] = list(
+            Color.objects.filter(products__id=product_id).order_by('name').values('name', 'hex_code')
+        )
+    if 'delivery' in fields:
+        store_settings = StoreSettings.get_settings()
+        if row['stock_type'] == 'ready':
+            data['delivery'] = _delivery(store_settings.get_ready_delivery_info())
+        else:
+            data['delivery'] = _delivery(store_settings.get_warehouse_delivery_info())
+    return data
+
+
+@catalog_view(page_cache.TAG_CATEGORY, page_cache.TAG_PRODUCT)
+def categories(request):
+    """Every category with its number of live products, by name."""
+    return {
+        'results': list(
+            Category.objects.annotate(
+                product_count=Count('products', filter=Q(products__is_active=True))
+            )
+            .order_by('name')
+            .values('id', 'name', 'slug', 'gender', 'description', 'product_count')
+        ),
+    }
+
+
+# Advertisement field name → values() lookup
+AD_FIELDS = {
+    'id': 'id',
+    'ad_type': 'ad_type',
+    'placement': 'ad_category',
+    'category': 'product_category_id',
+    'headline': 'headline',
+    'subheadline': 'subheadline',
+    'button_text': 'button_text',
+    'button_color': 'button_color',
+    'background_color': 'background_color',
+    'text_color': 'text_color',
+    'overlay_opacity': 'overlay_opacity',
+    'autoplay': 'autoplay',
+    'loop': 'loop',
+}
+
+
+@catalog_view(versions=ad_index.current_versions)
+def ads(request):
+    """Live ads in display order, optionally for one placement and device class."""
+    now = timezone.now()
+    queryset = Advertisement.objects.filter(is_active=True).filter(
+        Q(start_date__isnull=True) | Q(start_date__lte=now),
+        Q(end_date__isnull=True) | Q(end_date__gte=now),
+    )
+    placement = request.GET.get('placement')
+    if placement:
+        queryset = queryset.filter(ad_category=placement)
+    device = request.GET.get('device')
+    if device:
+        if device not in ad_index.DEVICES:
+            raise ApiError(f"device must be one of: {', '.join(ad_index.DEVICES)}")
+        queryset = queryset.filter(**{f"show_on_{device}": True})
+
+    rows = list(
+        queryset.order_by('order', '-created_at').values(
+            *AD_FIELDS.values(), 'single_image', 'video', 'video_poster',
+            'link_type', 'linked_product_id', 'button_url',
+            'show_on_mobile', 'show_on_tablet', 'show_on_desktop',
+        )
+    )
+    images = {}
+    if rows:
+        for ad_id, image, caption in (
+            AdImage.objects.filter(advertisement_id__in=[row['id'] for row in rows])
+            .order_by('order', 'id').values_list('advertisement_id', 'image', 'caption')
+        ):
+            images.setdefault(ad_id, []).append({'url': _media_url(image), 'caption': caption})
+
+    results = []
+    for row in rows:
+        ad = {name: row[lookup] for name, lookup in AD_FIELDS.items()}
+        # Same target as Advertisement.get_button_url()
+        if row['link_type'] == 'product' and row['linked_product_id']:
+            ad['target_url'] = _product_url(row['linked_product_id'])
+        else:
+            ad['target_url'] = row['button_url'] or '#'
+        ad.update(
+            click_url=reverse('ad_click', args=[row['id']]),
+            image=_media_url(row['single_image']),
+            video=_media_url(row['video']),
+            video_poster=_media_url(row['video_poster']),
+            images=images.get(row['id'], []),
+            devices=[name for name in ad_index.DEVICES if row[f"show_on_{name}"]],
+        )
+        results.append(ad)
+    return {'results': results}
+
+
+@catalog_view(page_cache.TAG_SETTINGS, daily=True)
+def delivery(request):
+    """Next delivery dates for ready and warehouse stock, and the pickup point."""
+    store_settings = StoreSettings.get_settings()
+    ready = store_settings.get_ready_delivery_info()
+    return {
+        'ready': dict(_delivery(ready), days=ready['days']),
+        'warehouse': _delivery(store_settings.get_warehouse_delivery_info()),
+        'pickup_location': store_settings.pickup_location,
+        'store_phone': store_settings.store_phone,
+        'store_email': store_settings.store_email,
+    }
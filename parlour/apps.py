@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.conf import settings
 import os
 
 class ParlourConfig(AppConfig):
@@ -9,7 +10,9 @@ class ParlourConfig(AppConfig):
         # Always register signals
         from . import signals
 
-        # Only start scheduler in dev (Django reloader process)
-        if os.environ.get('RUN_MAIN') == 'true':
+        # Production runs `manage.py run_scheduler` as its own process. Under
+        # runserver (the reloader's child process) the dev server contends for
+        # the same lease on a thread, so it stays idle if that process is up.
+        if os.environ.get('RUN_MAIN') == 'true' and getattr(settings, 'SCHEDULER_AUTOSTART', True):
             from . import scheduler
             scheduler.start()
@@ -0,0 +1,42 @@
+"""
+Fire-and-forget work off the request thread.
+
+A small per-process thread pool for slow I/O (SMTP, the WhatsApp service)
+the response shouldn't wait for. Jobs are not persisted — anything that must
+survive a restart belongs in the scheduler or the database instead.
+"""
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = getattr(settings, 'BACKGROUND_MAX_WORKERS', 4)
+
+# Run jobs inline instead (tests, management commands that want the result)
+EAGER = getattr(settings, 'BACKGROUND_TASKS_EAGER', False)
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='parlour-bg')
+
+
+def _run(fn, args, kwargs):
+    try:
+        fn(*args, **kwargs)
+    except Exception as e:
+        logger.error(f"Background task {fn.__name__} failed: {e}", exc_info=True)
+    finally:
+        # Worker threads keep their own DB connections — don't leak them
+        if not EAGER:
+            close_old_connections()
+
+
+def run_in_background(fn, *args, **kwargs):
+    """Queue fn(*args, **kwargs) and return immediately. Errors are logged."""
+    if EAGER:
+        _run(fn, args, kwargs)
+        return
+    # Carry the caller's context (its request id) over to the worker thread
+    _executor.submit(contextvars.copy_context().run, _run, fn, args, kwargs)
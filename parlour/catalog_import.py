@@ -0,0 +1,472 @@
+"""
+Bulk catalog import.
+
+Rows come from CSV or JSON (a JSON array, or JSON Lines for streaming) and
+images from an optional ZIP. Categories, colours, stores and existing
+products are loaded once into lookup maps; rows are validated, given the
+same derived fields Product.save() would set, and written in batches with
+bulk_create / bulk_update.
+
+Columns (only name / price / category / description / available_sizes /
+image are needed for new products):
+
+    id, name, description, price, anchor_price, discount_price,
+    purchase_cost, supplier_cost, category, store, gender,
+    intended_stock_type, stock_quantity, available_sizes, is_active,
+    image, additional_images, colors
+
+Multi-value columns (additional_images, colors) are separated by '|'.
+A row updates an existing product when its `id` matches, or when exactly
+one product in the same store has the same name; otherwise it creates one.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import zipfile
+from decimal import Decimal, InvalidOperation
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import page_cache
+from .models import Category, Color, Product, ProductImage, Store
+
+logger = logging.getLogger(__name__)
+
+MULTI_SEPARATOR = '|'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'off', ''}
+
+REQUIRED_FOR_CREATE = ('name', 'description', 'price', 'category', 'available_sizes', 'image')
+
+GENDERS = {code for code, _ in Product.GENDER_CHOICES}
+STOCK_TYPES = {code for code, _ in Product.STOCK_TYPE_CHOICES}
+
+
+class RowError(ValueError):
+    pass
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Readers — yield (line_number, dict) without loading the whole file
+# ─────────────────────────────────────────────────────────────────────────────
+
+def iter_csv(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    for line, row in enumerate(reader, start=2):
+        yield line, {(k or '').strip().lower(): (v or '').strip() for k, v in row.items()}
+
+
+def iter_json(fileobj):
+    """A JSON array is parsed in one go; JSON Lines are read line by line."""
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig')
+    first = text.read(1)
+    while first and first.isspace():
+        first = text.read(1)
+
+    if first == '[':
+        rows = json.loads(first + text.read())
+        for line, row in enumerate(rows, start=1):
+            yield line, _normalise_json_row(row)
+        return
+
+    for line, raw in enumerate(_prepend(first, text), start=1):
+        raw = raw.strip()
+        if raw:
+            yield line, _normalise_json_row(json.loads(raw))
+
+
+def _prepend(first, text):
+    if not first:
+        return
+    rest = text.readline()
+    yield first + rest
+    yield from text
+
+
+def _normalise_json_row(row):
+    if not isinstance(row, dict):
+        raise RowError("Each JSON row must be an object")
+    normalised = {}
+    for key, value in row.items():
+        if isinstance(value, list):
+            value = MULTI_SEPARATOR.join(str(v) for v in value)
+        elif value is None:
+            value = ''
+        normalised[str(key).strip().lower()] = str(value).strip()
+    return normalised
+
+
+def iter_rows(fileobj, filename):
+    name = filename.lower()
+    if name.endswith('.csv'):
+        return iter_csv(fileobj)
+    if name.endswith(('.json', '.jsonl', '.ndjson')):
+        return iter_json(fileobj)
+    raise ValueError("Catalog file must be .csv, .json, .jsonl or .ndjson")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Result
+# ─────────────────────────────────────────────────────────────────────────────
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.images = 0
+        self.errors = []  # (line, message)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def summary(self):
+        return (
+            f"{self.created} created, {self.updated} updated, "
+            f"{self.images} images, {len(self.errors)} rows skipped"
+        )
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Importer
+# ─────────────────────────────────────────────────────────────────────────────
+
+class CatalogImporter:
+    """
+    store       — bind every row to this Store (ignores the `store` column)
+    images_zip  — path or file object of a ZIP holding the image files
+    dry_run     — validate everything, write nothing
+    """
+
+    def __init__(self, store=None, images_zip=None, batch_size=500, dry_run=False):
+        self.store = store
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.result = ImportResult()
+        self._zip = zipfile.ZipFile(images_zip) if images_zip else None
+        self._zip_names = {}
+        if self._zip:
+            for info in self._zip.infolist():
+                if not info.is_dir():
+                    self._zip_names[info.filename.lower()] = info.filename
+                    self._zip_names.setdefault(os.path.basename(info.filename).lower(), info.filename)
+        self._load_lookups()
+
+    # ── Lookup maps ───────────────────────────────────────────────
+
+    def _load_lookups(self):
+        # Global categories first, then the bound store's own, so a store
+        # category overrides a global one with the same name
+        categories = Category.objects.filter(store__isnull=True).values_list('pk', 'name', 'slug')
+        own = (
+            Category.objects.filter(store=self.store).values_list('pk', 'name', 'slug')
+            if self.store else []
+        )
+        self.categories = {}
+        for pk, name, slug in list(categories) + list(own):
+            self.categories[name.lower()] = pk
+            if slug:
+                self.categories[slug.lower()] = pk
+
+        self.colors = {name.lower(): pk for pk, name in Color.objects.values_list('pk', 'name')}
+        self.stores = {}
+        if not self.store:
+            for pk, slug, name in Store.objects.values_list('pk', 'slug', 'store_name'):
+                self.stores[slug.lower()] = pk
+                self.stores[name.lower()] = pk
+
+        products = Product.objects.all()
+        if self.store:
+            products = products.filter(store=self.store)
+        self.product_ids = set()
+        self.products_by_name = {}
+        for pk, store_id, name in products.values_list('pk', 'store_id', 'name'):
+            self.product_ids.add(pk)
+            self.products_by_name.setdefault((store_id, name.lower()), []).append(pk)
+
+    # ── Entry point ───────────────────────────────────────────────
+
+    def run(self, rows):
+        batch = []
+        for line, row in self._safe_rows(rows):
+            try:
+                batch.append(self._parse_row(line, row))
+            except RowError as e:
+                self.result.errors.append((line, str(e)))
+                continue
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                batch = []
+        if batch:
+            self._write_batch(batch)
+
+        if not self.dry_run and (self.result.created or self.result.updated):
+            # bulk writes skip post_save, so bump the storefront cache here
+            page_cache.invalidate(page_cache.TAG_PRODUCT, page_cache.TAG_CATEGORY)
+        return self.result
+
+    def _safe_rows(self, rows):
+        iterator = iter(rows)
+        while True:
+            try:
+                yield next(iterator)
+            except StopIteration:
+                return
+            except (RowError, ValueError, csv.Error) as e:
+                # A malformed line ends the stream — report it instead of crashing
+                self.result.errors.append((None, f"Could not read file: {e}"))
+                return
+
+    # ── Row parsing ───────────────────────────────────────────────
+
+    def _parse_row(self, line, row):
+        parsed = {'line': line, 'fields': {}, 'colors': None, 'image': None, 'additional_images': []}
+        fields = parsed['fields']
+
+        store_id = self._resolve_store(row)
+        parsed['store_id'] = store_id
+        parsed['pk'] = self._match_existing(row, store_id)
+        creating = parsed['pk'] is None
+
+        if creating:
+            missing = [col for col in REQUIRED_FOR_CREATE if not row.get(col)]
+            if missing:
+                raise RowError(f"Missing required column(s) for a new product: {', '.join(missing)}")
+
+        for col in ('name', 'description', 'available_sizes'):
+            if col in row:
+                if not row[col]:
+                    raise RowError(f"'{col}' cannot be blank")
+                fields[col] = row[col]
+
+        if 'price' in row:
+            fields['price'] = self._decimal(row['price'], 'price', required=True)
+        for col in ('anchor_price', 'discount_price', 'purchase_cost', 'supplier_cost'):
+            if col in row:
+                fields[col] = self._decimal(row[col], col)
+
+        if row.get('gender'):
+            gender = row['gender'].upper()[:1]
+            if gender not in GENDERS:
+                raise RowError(f"Unknown gender '{row['gender']}'")
+            fields['gender'] = gender
+
+        if row.get('intended_stock_type'):
+            stock_type = row['intended_stock_type'].lower()
+            if stock_type not in STOCK_TYPES:
+                raise RowError(f"Unknown stock type '{row['intended_stock_type']}'")
+            fields['intended_stock_type'] = stock_type
+
+        if row.get('stock_quantity'):
+            try:
+                fields['stock_quantity'] = int(row['stock_quantity'])
+            except ValueError:
+                raise RowError(f"Invalid stock_quantity '{row['stock_quantity']}'")
+            if fields['stock_quantity'] < 0:
+                raise RowError("stock_quantity cannot be negative")
+
+        if 'is_active' in row:
+            value = row['is_active'].lower()
+            if value not in TRUE_VALUES | FALSE_VALUES:
+                raise RowError(f"Invalid is_active '{row['is_active']}'")
+            fields['is_active'] = value in TRUE_VALUES
+
+        if 'category' in row:
+            fields['category_id'] = self._lookup(self.categories, row['category'], 'category') if row['category'] else None
+
+        if row.get('colors'):
+            parsed['colors'] = [self._lookup(self.colors, c, 'color') for c in self._split(row['colors'])]
+
+        if row.get('image'):
+            parsed['image'] = self._image_source(row['image'])
+        parsed['additional_images'] = [self._image_source(i) for i in self._split(row.get('additional_images', ''))]
+        return parsed
+
+    def _resolve_store(self, row):
+        if self.store:
+            return self.store.pk
+        if row.get('store'):
+            return self._lookup(self.stores, row['store'], 'store')
+        return None
+
+    def _match_existing(self, row, store_id):
+        if row.get('id'):
+            try:
+                pk = int(row['id'])
+            except ValueError:
+                raise RowError(f"Invalid id '{row['id']}'")
+            if pk not in self.product_ids:
+                raise RowError(f"No product with id {pk}")
+            return pk
+        if row.get('name'):
+            matches = self.products_by_name.get((store_id, row['name'].lower()), [])
+            if len(matches) > 1:
+                raise RowError(f"Several products are named '{row['name']}' — give an id")
+            if matches:
+                return matches[0]
+        return None
+
+    def _decimal(self, value, column, required=False):
+        if not value:
+            if required:
+                raise RowError(f"'{column}' is required")
+            return None
+        try:
+            number = Decimal(value.replace(',', ''))
+        except InvalidOperation:
+            raise RowError(f"Invalid {column} '{value}'")
+        if number < 0:
+            raise RowError(f"{column} cannot be negative")
+        return number.quantize(Decimal('0.01'))
+
+    def _lookup(self, mapping, value, label):
+        pk = mapping.get(value.strip().lower())
+        if pk is None:
+            raise RowError(f"Unknown {label} '{value}'")
+        return pk
+
+    def _split(self, value):
+        return [part.strip() for part in value.split(MULTI_SEPARATOR) if part.strip()]
+
+    def _image_source(self, value):
+        """('zip', member) for files in the upload, ('path', name) for files already in storage."""
+        member = self._zip_names.get(value.lower()) if self._zip else None
+        if member:
+            return ('zip', member)
+        if value.lower().endswith(IMAGE_EXTENSIONS) and default_storage.exists(value):
+            return ('path', value)
+        raise RowError(f"Image '{value}' not found in the ZIP or media storage")
+
+    # ── Writing ───────────────────────────────────────────────────
+
+    def _store_image(self, source, field):
+        kind, name = source
+        if kind == 'path' or self.dry_run:
+            return name
+        target = field.generate_filename(None, os.path.basename(name))
+        with self._zip.open(name) as fh:
+            return default_storage.save(target, File(fh, name=os.path.basename(name)))
+
+    def _write_batch(self, batch):
+        image_field = Product._meta.get_field('image')
+        extra_image_field = ProductImage._meta.get_field('image')
+        now = timezone.now()
+
+        existing = Product.objects.in_bulk([row['pk'] for row in batch if row['pk']])
+        to_create, to_update = [], []
+        for row in batch:
+            if row['pk']:
+                product = existing.get(row['pk'])
+                if product is None:
+                    self.result.errors.append((row['line'], f"Product {row['pk']} was deleted during the import"))
+                    continue
+            else:
+                product = Product(store_id=row['store_id'])
+            for field, value in row['fields'].items():
+                setattr(product, field, value)
+            product.apply_derived_fields()
+            row['product'] = product
+            (to_update if row['pk'] else to_create).append(row)
+
+        if self.dry_run:
+            self.result.created += len(to_create)
+            self.result.updated += len(to_update)
+            self.result.images += sum(bool(r['image']) + len(r['additional_images']) for r in batch)
+            return
+
+        # Files go to storage before the DB transaction so a failed copy skips only its row
+        for row in to_create + to_update:
+            try:
+                if row['image']:
+                    row['product'].image = self._store_image(row['image'], image_field)
+                row['extra_names'] = [self._store_image(src, extra_image_field) for src in row['additional_images']]
+            except Exception as e:
+                logger.error(f"Catalog import: image copy failed on line {row['line']}: {e}")
+                row['failed'] = True
+                self.result.errors.append((row['line'], f"Image upload failed: {e}"))
+        to_create = [r for r in to_create if not r.get('failed')]
+        to_update = [r for r in to_update if not r.get('failed')]
+
+        update_fields = set()
+        for row in to_update:
+            row['product'].updated_at = now
+            update_fields.update(row['fields'])
+            if row['image']:
+                update_fields.add('image')
+        update_fields.update({'stock_type', 'anchor_price', 'discount_price', 'updated_at'})
+
+        with transaction.atomic():
+            Product.objects.bulk_create([r['product'] for r in to_create], batch_size=self.batch_size)
+            if to_update:
+                Product.objects.bulk_update(
+                    [r['product'] for r in to_update], sorted(update_fields), batch_size=self.batch_size
+                )
+
+            written = to_create + to_update
+            self._write_colors(written)
+            self.result.images += self._write_images(written)
+
+        for row in to_create:
+            self.product_ids.add(row['product'].pk)
+            self.products_by_name.setdefault(
+                (row['store_id'], row['product'].name.lower()), []
+            ).append(row['product'].pk)
+
+        self.result.created += len(to_create)
+        self.result.updated += len(to_update)
+        self.result.images += sum(1 for r in to_create + to_update if r['image'])
+
+    def _write_colors(self, rows):
+        rows = [r for r in rows if r['colors'] is not None]
+        if not rows:
+            return
+        through = Product.colors.through
+        through.objects.filter(product_id__in=[r['product'].pk for r in rows]).delete()
+        through.objects.bulk_create(
+            [
+                through(product_id=r['product'].pk, color_id=color_id)
+                for r in rows for color_id in dict.fromkeys(r['colors'])
+            ],
+            batch_size=self.batch_size,
+        )
+
+    def _write_images(self, rows):
+        rows = [r for r in rows if r.get('extra_names')]
+        if not rows:
+            return 0
+        next_order = dict(
+            ProductImage.objects.filter(product_id__in=[r['product'].pk for r in rows])
+            .values('product_id').annotate(last=Max('order')).values_list('product_id', 'last')
+        )
+        images = []
+        for row in rows:
+            start = next_order.get(row['product'].pk)
+            start = 0 if start is None else start + 1
+            images.extend(
+                ProductImage(product_id=row['product'].pk, image=name, order=start + idx)
+                for idx, name in enumerate(row['extra_names'])
+            )
+        ProductImage.objects.bulk_create(images, batch_size=self.batch_size)
+        return len(images)
+
+    def close(self):
+        if self._zip:
+            self._zip.close()
+
+
+def import_catalog(fileobj, filename, images_zip=None, store=None, batch_size=500, dry_run=False):
+    """Import one catalog file. Returns an ImportResult."""
+    importer = CatalogImporter(store=store, images_zip=images_zip, batch_size=batch_size, dry_run=dry_run)
+    try:
+        return importer.run(iter_rows(fileobj, filename))
+    finally:
+        importer.close()
@@ -1,7 +1,11 @@
+from django.conf import settings
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from datetime import timedelta
 import logging
 from parlour.models import Profile, Order
+from parlour.pricing import promo_for_request
+from parlour.page_cache import CSRF_PLACEHOLDER, TAG_CATEGORY, TAG_PRODUCT, tag_versions
 
 logger = logging.getLogger(__name__)
 
@@ -37,7 +41,7 @@ def promo_popup(request):
         # Force fresh read from DB every time
         profile = Profile.objects.get(user=request.user)
 
-        logger.info(f"PROMO CHECK - show_promo_popup: {profile.show_promo_popup} | promo_popup_shown: {profile.promo_popup_shown} | user: {request.user}")
+        logger.debug(f"PROMO CHECK - show_promo_popup: {profile.show_promo_popup} | promo_popup_shown: {profile.promo_popup_shown} | user: {request.user}")
 
         if profile.promo_popup_shown:
             return {'show_promo_popup': False}
@@ -58,6 +62,11 @@ def cart_count(request):
     return {'cart_count': count}
 
 
+def pricing(request):
+    """The user's promo state as `promo`, looked up at most once per request and only if used."""
+    return {'promo': SimpleLazyObject(lambda: promo_for_request(request))}
+
+
 def pending_orders_count(request):
     """Inject active order count for staff notification badge."""
     if not request.user.is_authenticated or not request.user.is_staff:
@@ -69,4 +78,22 @@ def pending_orders_count(request):
         ).count()
         return {'pending_orders_count': count}
     except Exception:
-        return {'pending_orders_count': 0}
\ No newline at end of file
+        return {'pending_orders_count': 0}
+
+
+def storefront_cache(request):
+    """
+    Cache helpers for templates: a stable version for product card fragments,
+    and a CSRF placeholder while a page is being rendered for the page cache.
+    """
+    def product_card_version():
+        versions = tag_versions(TAG_PRODUCT, TAG_CATEGORY)
+        return f"{versions[TAG_PRODUCT]}.{versions[TAG_CATEGORY]}"
+
+    context = {
+        'product_card_version': product_card_version,
+        'product_card_timeout': getattr(settings, 'STOREFRONT_FRAGMENT_CACHE_TIMEOUT', 60 * 60),
+    }
+    if getattr(request, '_storefront_page_render', False):
+        context['csrf_token'] = CSRF_PLACEHOLDER
+    return context
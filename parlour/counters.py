@@ -0,0 +1,96 @@
+"""
+Denormalized counters kept up to date from saves.
+
+Signal receivers don't write counters row by row. They queue() ids into a
+batch for the open transaction, which is applied once when the transaction
+commits, with increments made by upsert(): one UPDATE ... SET x = x + n per
+row, or an INSERT the first time. hokaadmin.stats (sales stats) and
+seller.ledger (store ledger) both work this way.
+"""
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Per-transaction batch
+# ─────────────────────────────────────────────────────────────────────────────
+
+class _Batch:
+    """Ids saved inside the current transaction, by kind."""
+
+    def __init__(self, name, apply, using):
+        self.name = name
+        self.apply = apply
+        self.using = using
+        self.ids = defaultdict(set)
+
+    def flush(self):
+        batches = getattr(_local, 'batches', {})
+        if batches.get(self.name) is self:
+            del batches[self.name]
+        try:
+            self.apply(self.ids, using=self.using)
+        except Exception as e:
+            logger.error(f"Error applying {self.name} batch: {e}", exc_info=True)
+
+
+def queue(name, apply, using='default', **ids):
+    """
+    Add ids (kind=id; None is skipped) to the batch called name for the open
+    transaction; apply(ids, using=using) gets {kind: set of ids} once it
+    commits. The batch's flush is registered with on_commit once; a batch
+    whose flush is no longer queued on the connection (already ran, or
+    discarded by a rollback) is replaced. Outside atomic() on_commit runs
+    straight away, so each save flushes alone.
+    """
+    if not hasattr(_local, 'batches'):
+        _local.batches = {}
+    connection = transaction.get_connection(using)
+    batch = _local.batches.get(name)
+    live = batch is not None and batch.using == using and any(
+        hook[1] == batch.flush for hook in connection.run_on_commit
+    )
+    if not live:
+        batch = _Batch(name, apply, using)
+
+    for kind, value in ids.items():
+        if value is not None:
+            batch.ids[kind].add(value)
+
+    if not live:
+        _local.batches[name] = batch
+        transaction.on_commit(batch.flush, using=using)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Upserts
+# ─────────────────────────────────────────────────────────────────────────────
+
+def upsert(model, lookup, increments, extra=None, create=None, using='default'):
+    """
+    UPDATE … SET x = x + n (and extra) for the row matching lookup, falling
+    back to INSERT — with the create-only fields too — for the first row.
+    Returns True when the row was created.
+    """
+    extra = extra or {}
+    manager = model.objects.using(using)
+    updates = {field: F(field) + value for field, value in increments.items()}
+
+    if manager.filter(**lookup).update(**updates, **extra):
+        return False
+    try:
+        with transaction.atomic(using=using):
+            manager.create(**lookup, **increments, **extra, **(create or {}))
+        return True
+    except IntegrityError:
+        # Another transaction created the row first — increment it instead
+        manager.filter(**lookup).update(**updates, **extra)
+        return False
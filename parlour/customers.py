@@ -0,0 +1,262 @@
+"""
+Customer identity: which Customer an order belongs to.
+
+Checkout never required an account, so an order only carries what the buyer
+typed. resolve() matches those details to a Customer — by email, compared
+lowercased, else by phone normalized with parlour.phones (only to a customer
+with no other email on file) — and creates one when neither is known,
+attached to the account registered under that email if there is one. A
+signed-in checkout goes to its account's customer (for_checkout()). New
+orders are linked as they are created, or else as they are first saved (the
+pre_save receiver in parlour.signals); backfill() links older ones in
+batches, and claim() attaches a customer to the account that logs in with
+its email.
+
+An account's orders are then one indexed query, orders_for(user), instead
+of a match on Order.email.
+"""
+import logging
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import Coalesce, Lower
+
+from .models import Customer, Order
+from .phones import normalize_phone
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 500
+
+MONEY = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+def email_key(email):
+    return (email or '').strip().lower()
+
+
+def _account_for(email):
+    """The unlinked account registered under email, if any."""
+    if not email:
+        return None
+    return User.objects.filter(email__iexact=email, customer__isnull=True).order_by('pk').first()
+
+
+def _fill_blanks(customer, email, phone, name, user_id=None):
+    filled = {
+        field: value
+        for field, value in (('email', email), ('phone', phone), ('name', name), ('user_id', user_id))
+        if value and not getattr(customer, field)
+    }
+    if filled:
+        for field, value in filled.items():
+            setattr(customer, field, value)
+        customer.save(update_fields=list(filled))
+    return customer
+
+
+def resolve(email='', phone='', name='', user_id=None):
+    """
+    The Customer for these checkout details, created if new. Blank fields of
+    a match are filled in. With user_id (a signed-in checkout) it is that
+    account's customer, whatever details were typed.
+    """
+    email, phone = email_key(email), normalize_phone(phone)
+
+    if user_id:
+        customer = Customer.objects.filter(user_id=user_id).first()
+        if customer is not None:
+            return _fill_blanks(customer, email, phone, name)
+
+    customer = None
+    if email:
+        customer = Customer.objects.filter(email=email).order_by('pk').first()
+    if customer is None and phone:
+        # A shared phone only identifies someone who has no other email on file
+        matches = Customer.objects.filter(phone=phone)
+        if email:
+            matches = matches.filter(email='')
+        customer = matches.order_by('pk').first()
+    if user_id and customer is not None and customer.user_id not in (None, user_id):
+        customer = None  # another account's customer
+
+    try:
+        with transaction.atomic():
+            if customer is None:
+                if not user_id:
+                    account = _account_for(email)
+                    user_id = account.pk if account else None
+                return Customer.objects.create(user_id=user_id, name=name, email=email, phone=phone)
+            return _fill_blanks(customer, email, phone, name, user_id)
+    except IntegrityError:
+        if not user_id:
+            raise
+        # The account was linked to a customer by a concurrent checkout or login
+        return Customer.objects.get(user_id=user_id)
+
+
+def for_checkout(details):
+    """
+    resolve() for the order details checkout keeps in the session /
+    MpesaPayment.order_details. None on failure: the order is then linked
+    when it's saved, or by the link_order_customers job.
+    """
+    try:
+        return resolve(
+            details.get('email', ''), details.get('phone_number', ''), details.get('customer_name', ''),
+            details.get('user_id'),
+        )
+    except Exception as e:
+        logger.error(f"Could not resolve the customer for checkout by {details.get('email')}: {e}", exc_info=True)
+        return None
+
+
+def link_order(order):
+    """Set order.customer from its details, if it has none. Doesn't save the order."""
+    if order.customer_id is None:
+        order.customer = resolve(order.email, order.phone_number, order.customer_name)
+    return order.customer
+
+
+def claim(user):
+    """Attach the unlinked customer with user's email to user. Returns the user's customer, if any."""
+    customer = Customer.objects.filter(user=user).first()
+    if customer is not None:
+        return customer
+    email = email_key(user.email)
+    if not email:
+        return None
+    customer = Customer.objects.filter(email=email, user__isnull=True).order_by('pk').first()
+    if customer is not None:
+        customer.user = user
+        try:
+            customer.save(update_fields=['user'])
+        except IntegrityError:
+            # Linked by a concurrent login
+            return Customer.objects.filter(user=user).first()
+    return customer
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Lookups
+# ─────────────────────────────────────────────────────────────────────────────
+
+def orders_for(user):
+    """user's orders, newest first."""
+    return Order.objects.filter(customer__user=user).order_by('-created_at')
+
+
+def order_stats(user_ids):
+    """{user id: {total_orders, total_spent, last_order_date}} for the given accounts — one query."""
+    rows = (
+        Order.objects.filter(customer__user_id__in=user_ids)
+        .values('customer__user_id')
+        .annotate(
+            total_orders=Count('id', distinct=True),
+            total_spent=Coalesce(
+                Sum(F('orderitem__price') * F('orderitem__quantity'), output_field=MONEY),
+                Decimal('0.00'),
+                output_field=MONEY,
+            ),
+            last_order_date=Max('created_at'),
+        )
+        .order_by()
+    )
+    return {row.pop('customer__user_id'): row for row in rows}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Backfill
+# ─────────────────────────────────────────────────────────────────────────────
+
+def backfill(batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Link every order that has no customer, oldest first, by the same rules
+    as resolve(). Known customers are read into memory once; each batch is
+    then one SELECT of orders, one SELECT of accounts and one INSERT for the
+    customers it introduces, and one UPDATE. Returns (orders linked,
+    customers created).
+    """
+    # by_phone: any customer with the phone; by_phone_only: one with no email
+    by_email, by_phone, by_phone_only = {}, {}, {}
+    for pk, email, phone in Customer.objects.order_by('pk').values_list('pk', 'email', 'phone'):
+        if email:
+            by_email.setdefault(email, pk)
+        if phone:
+            by_phone.setdefault(phone, pk)
+            if not email:
+                by_phone_only.setdefault(phone, pk)
+
+    linked = created = 0
+    last_pk = 0
+    while True:
+        orders = list(
+            Order.objects.filter(customer__isnull=True, pk__gt=last_pk)
+            .only('pk', 'customer_name', 'email', 'phone_number', 'customer')
+            .order_by('pk')[:batch_size]
+        )
+        if not orders:
+            break
+        last_pk = orders[-1].pk
+
+        # Customers first seen in this batch, by email / by phone (oldest first)
+        new_by_email, new_by_phone = {}, {}
+        waiting = []
+        for order in orders:
+            email, phone = email_key(order.email), normalize_phone(order.phone_number)
+            pk = by_email.get(email) if email else None
+            if pk is None and phone:
+                pk = (by_phone_only if email else by_phone).get(phone)
+            if pk is not None:
+                order.customer_id = pk
+                continue
+
+            customer = new_by_email.get(email) if email else None
+            if customer is None and phone:
+                customer = next(
+                    (known for known in new_by_phone.get(phone, []) if not (email and known.email)), None
+                )
+            if customer is None:
+                customer = Customer(name=order.customer_name, email=email, phone=phone)
+                if phone:
+                    new_by_phone.setdefault(phone, []).append(customer)
+            else:
+                customer.email = customer.email or email
+                customer.phone = customer.phone or phone
+            if customer.email:
+                new_by_email.setdefault(customer.email, customer)
+            waiting.append((order, customer))
+
+        customers = list({id(customer): customer for _, customer in waiting}.values())
+        if customers:
+            emails = {customer.email for customer in customers if customer.email}
+            accounts = {}
+            if emails:
+                for pk, email in (
+                    User.objects.filter(customer__isnull=True)
+                    .annotate(email_key=Lower('email')).filter(email_key__in=emails)
+                    .order_by('-pk').values_list('pk', 'email_key')
+                ):
+                    accounts[email] = pk
+            for customer in customers:
+                customer.user_id = accounts.get(customer.email)
+            Customer.objects.bulk_create(customers)
+            created += len(customers)
+            for customer in customers:
+                if customer.email:
+                    by_email.setdefault(customer.email, customer.pk)
+                if customer.phone:
+                    by_phone.setdefault(customer.phone, customer.pk)
+                    if not customer.email:
+                        by_phone_only.setdefault(customer.phone, customer.pk)
+            for order, customer in waiting:
+                order.customer_id = customer.pk
+
+        Order.objects.bulk_update(orders, ['customer'])
+        linked += len(orders)
+
+    if linked:
+        logger.info(f"Linked {linked} order(s) to customers, {created} customer(s) created")
+    return linked, created
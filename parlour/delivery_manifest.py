@@ -0,0 +1,152 @@
+"""
+Delivery manifests: the open orders laid out as runs for the riders.
+
+Each open order is given a delivery day by the StoreSettings rules — an
+order holding any warehouse-stock item goes out on the Friday after it was
+placed, an all-ready-stock order on the next ready delivery day — unless
+staff set an expected_delivery_date on it. Orders whose day has passed are
+carried onto today's run. Within a day, orders are grouped by area: the
+order's delivery_location, or else the first part of its delivery address.
+
+Every area run and every day carries a pick list (quantity per product and
+size), so the stock for a run can be pulled in one pass. A whole manifest
+is built from four queries however many orders are open: store settings,
+the orders, their items with products, and their M-Pesa payments.
+"""
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import MpesaPayment, Order, OrderItem, StoreSettings
+
+OPEN_STATUSES = ('pending', 'processing', 'dispatched')
+
+UNKNOWN_AREA = 'Unspecified area'
+
+PickLine = namedtuple('PickLine', 'product size quantity order_ids')
+
+
+class Stop:
+    """One order on a run, with everything the rider needs for it."""
+
+    def __init__(self, order, items, payment, due, overdue):
+        self.order = order
+        self.items = items
+        self.payment = payment
+        self.due = due
+        self.overdue = overdue
+        self.has_warehouse = any(item.product.stock_type == 'warehouse' for item in items)
+        self.total = sum((item.get_subtotal() for item in items), Decimal('0.00'))
+        self.quantity = sum(item.quantity for item in items)
+
+    @property
+    def to_collect(self):
+        """Amount the rider collects on delivery — nothing if it's paid."""
+        return Decimal('0.00') if self.order.is_paid else self.total
+
+
+def pick_list(stops):
+    """Quantity needed per (product, size) across stops, by product name."""
+    lines = {}
+    for stop in stops:
+        for item in stop.items:
+            key = (item.product_id, item.size)
+            line = lines.get(key)
+            if line is None:
+                lines[key] = PickLine(item.product, item.size, item.quantity, [stop.order.id])
+            else:
+                line.order_ids.append(stop.order.id)
+                lines[key] = line._replace(quantity=line.quantity + item.quantity)
+    return sorted(lines.values(), key=lambda line: (line.product.name.lower(), line.size))
+
+
+class Run:
+    """The stops for one area on one day."""
+
+    def __init__(self, area, stops):
+        self.area = area
+        self.stops = stops
+        self.pick_list = pick_list(stops)
+        self.total = sum((stop.total for stop in stops), Decimal('0.00'))
+        self.to_collect = sum((stop.to_collect for stop in stops), Decimal('0.00'))
+
+
+class DeliveryDay:
+    def __init__(self, date, runs):
+        self.date = date
+        self.runs = runs
+        self.stops = [stop for run in runs for stop in run.stops]
+        self.pick_list = pick_list(self.stops)
+        self.total = sum((run.total for run in runs), Decimal('0.00'))
+        self.to_collect = sum((run.to_collect for run in runs), Decimal('0.00'))
+        self.has_warehouse = any(stop.has_warehouse for stop in self.stops)
+
+
+def area_of(order):
+    """The area an order is delivered to, title-cased so spellings group together."""
+    source = order.delivery_location or (order.delivery_address or '').split(',')[0]
+    area = ' '.join(source.replace('📍', ' ').split())
+    return area.title() if area else UNKNOWN_AREA
+
+
+def due_date(order, items, store_settings):
+    """The day order is scheduled to go out, before carrying overdue orders forward."""
+    if order.expected_delivery_date:
+        return order.expected_delivery_date
+    placed = timezone.localdate(order.created_at)
+    if any(item.product.stock_type == 'warehouse' for item in items):
+        return store_settings.next_warehouse_date(placed)
+    return store_settings.next_ready_date(placed)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Building manifests
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _load(statuses):
+    orders = list(
+        Order.objects.filter(order_status__in=statuses)
+        .prefetch_related(Prefetch(
+            'orderitem_set',
+            queryset=OrderItem.objects.select_related('product').order_by('id'),
+        ))
+        .order_by('created_at')
+    )
+    payments = {}
+    if orders:
+        # Newest first, so the first seen per order is the one delivery_detail shows
+        for payment in (
+            MpesaPayment.objects.filter(order_id__in=[order.id for order in orders])
+            .order_by('-created_at')
+        ):
+            payments.setdefault(payment.order_id, payment)
+    return orders, payments
+
+
+def build(statuses=OPEN_STATUSES):
+    """DeliveryDays for the open orders, soonest first, each with its runs sorted by area."""
+    store_settings = StoreSettings.get_settings()
+    today = timezone.localdate()
+    orders, payments = _load(statuses)
+
+    by_day = defaultdict(lambda: defaultdict(list))
+    for order in orders:
+        items = list(order.orderitem_set.all())
+        due = due_date(order, items, store_settings)
+        stop = Stop(order, items, payments.get(order.id), due, overdue=due < today)
+        by_day[max(due, today)][area_of(order)].append(stop)
+
+    return [
+        DeliveryDay(date, [Run(area, stops) for area, stops in sorted(areas.items())])
+        for date, areas in sorted(by_day.items())
+    ]
+
+
+def find_day(days, date):
+    """The DeliveryDay for date from build(), or an empty one."""
+    for day in days:
+        if day.date == date:
+            return day
+    return DeliveryDay(date, [])
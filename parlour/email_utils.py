@@ -1,380 +1,257 @@
-from django.core.mail import EmailMessage
-from django.conf import settings
-from .models import StoreSettings
+"""
+Transactional email rendering and sending.
+
+Emails are Django templates under parlour/emails/. Each template is compiled
+once per process (with settings.EMAIL_TEMPLATE_CACHE; dev re-reads them so
+edits show up) with its <style> rules already inlined onto the matching
+elements (most mail clients ignore <style>), and every message carries a
+plain-text part — from a sibling .txt template when there is one, otherwise
+derived from the HTML. send_emails() pushes a whole batch through one SMTP
+connection.
+"""
+import html as html_lib
 import logging
+import re
+import threading
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template import TemplateDoesNotExist, engines
+from django.template.loader import get_template
+
+from .models import Order, StoreSettings
 
 logger = logging.getLogger(__name__)
 
-def send_order_confirmation_email(order):
-    """Send styled HTML order confirmation email with product images"""
-    
-    # Get global store settings
-    store_settings = StoreSettings.get_settings()
-    pickup_info = order.get_pickup_info()
-    
-    subject = f'Order Confirmation #{order.id} - Hoka\'s Parlour'
-    
-    # Get order items
-    items = order.orderitem_set.all()
-    
-    # Build product rows HTML
-    product_rows = ""
-    for item in items:
-        # Get product image URL (full URL needed for email)
-        image_url = ""
-        if item.product.image:
-            image_url = f"{settings.MEDIA_URL}{item.product.image.name}"
-        
-        product_rows += f"""
-        <tr>
-            <td style="padding: 15px; border-bottom: 1px solid #eee;">
-                <div style="display: flex; align-items: center; gap: 15px;">
-                    <img src="{image_url}" alt="{item.product.name}" 
-                         style="width: 80px; height: 80px; object-fit: cover; border-radius: 8px; border: 1px solid #ddd;">
-                    <div>
-                        <strong style="color: #333; font-size: 16px;">{item.product.name}</strong>
-                        <p style="color: #666; margin: 5px 0; font-size: 14px;">Size: {item.size}</p>
-                    </div>
-                </div>
-            </td>
-            <td style="padding: 15px; border-bottom: 1px solid #eee; text-align: center; color: #666;">
-                {item.quantity}
-            </td>
-            <td style="padding: 15px; border-bottom: 1px solid #eee; text-align: right; color: #666;">
-                KSH {item.price}
-            </td>
-            <td style="padding: 15px; border-bottom: 1px solid #eee; text-align: right; color: #333; font-weight: bold;">
-                KSH {item.get_subtotal()}
-            </td>
-        </tr>
-        """
-    
-    # HTML email template
-    html_message = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <style>
-            body {{
-                font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', Arial, sans-serif;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                margin: 0;
-                padding: 20px;
-                line-height: 1.6;
-            }}
-            .container {{
-                max-width: 650px;
-                margin: 0 auto;
-                background: white;
-                border-radius: 16px;
-                overflow: hidden;
-                box-shadow: 0 20px 60px rgba(0,0,0,0.15);
-            }}
-            .header {{
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                color: white;
-                padding: 40px 30px;
-                text-align: center;
-            }}
-            .logo {{
-                font-size: 32px;
-                font-weight: 800;
-                margin-bottom: 10px;
-                font-family: 'Playfair Display', serif;
-            }}
-            .logo span {{
-                color: #ffd700;
-            }}
-            .success-badge {{
-                background: rgba(255,255,255,0.2);
-                display: inline-block;
-                padding: 8px 20px;
-                border-radius: 20px;
-                font-size: 14px;
-                margin-top: 10px;
-            }}
-            .content {{
-                padding: 40px 30px;
-            }}
-            .order-id {{
-                background: #f8f9fa;
-                border-left: 4px solid #667eea;
-                padding: 15px 20px;
-                margin: 20px 0;
-                border-radius: 4px;
-            }}
-            .order-id strong {{
-                color: #667eea;
-                font-size: 24px;
-            }}
-            .section {{
-                margin: 30px 0;
-            }}
-            .section-title {{
-                color: #333;
-                font-size: 20px;
-                font-weight: 700;
-                margin-bottom: 15px;
-                border-bottom: 2px solid #667eea;
-                padding-bottom: 10px;
-            }}
-            .product-table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin: 20px 0;
-            }}
-            .product-table th {{
-                background: #f8f9fa;
-                color: #666;
-                text-align: left;
-                padding: 12px 15px;
-                font-weight: 600;
-                font-size: 12px;
-                text-transform: uppercase;
-                letter-spacing: 0.5px;
-            }}
-            .total-row {{
-                background: #667eea;
-                color: white;
-                font-size: 20px;
-                font-weight: bold;
-            }}
-            .total-row td {{
-                padding: 20px 15px;
-            }}
-            .info-box {{
-                background: #fff3cd;
-                border: 1px solid #ffc107;
-                border-radius: 8px;
-                padding: 20px;
-                margin: 20px 0;
-            }}
-            .info-box h3 {{
-                color: #856404;
-                margin: 0 0 15px 0;
-                font-size: 18px;
-            }}
-            .info-grid {{
-                display: grid;
-                grid-template-columns: 1fr 1fr;
-                gap: 15px;
-                margin-top: 15px;
-            }}
-            .info-item {{
-                background: white;
-                padding: 12px;
-                border-radius: 6px;
-            }}
-            .info-item strong {{
-                display: block;
-                color: #666;
-                font-size: 11px;
-                text-transform: uppercase;
-                margin-bottom: 5px;
-            }}
-            .info-item span {{
-                color: #333;
-                font-size: 15px;
-            }}
-            .highlight {{
-                background: #e8f5e9;
-                border-left: 4px solid #4caf50;
-                padding: 15px;
-                margin: 20px 0;
-                border-radius: 4px;
-            }}
-            .footer {{
-                background: #f8f9fa;
-                padding: 30px;
-                text-align: center;
-                border-top: 1px solid #eee;
-            }}
-            .footer p {{
-                color: #666;
-                margin: 5px 0;
-                font-size: 14px;
-            }}
-            .social-links {{
-                margin-top: 20px;
-            }}
-            .social-links a {{
-                display: inline-block;
-                margin: 0 10px;
-                color: #667eea;
-                text-decoration: none;
-                font-weight: 600;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <div class="logo">HOKA'S<span>PARLOUR</span></div>
-                <p>Premium Fashion & Streetwear</p>
-                <div class="success-badge">✓ Order Confirmed</div>
-            </div>
-            
-            <div class="content">
-                <h2 style="color: #333; text-align: center; margin-bottom: 10px;">Thank You for Your Order!</h2>
-                <p style="text-align: center; color: #666; margin-bottom: 30px;">
-                    Dear <strong>{order.customer_name}</strong>, your order has been successfully placed.
-                </p>
-                
-                <div class="order-id">
-                    <div style="color: #666; font-size: 12px; text-transform: uppercase; margin-bottom: 5px;">Order Number</div>
-                    <strong>#{order.id}</strong>
-                    <div style="color: #666; font-size: 14px; margin-top: 8px;">
-                        {order.created_at.strftime('%B %d, %Y at %I:%M %p')}
-                    </div>
-                </div>
-                
-                <div class="section">
-                    <h3 class="section-title">📦 Items Ordered</h3>
-                    <table class="product-table">
-                        <thead>
-                            <tr>
-                                <th>Product</th>
-                                <th style="text-align: center;">Qty</th>
-                                <th style="text-align: right;">Price</th>
-                                <th style="text-align: right;">Subtotal</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-                            {product_rows}
-                        </tbody>
-                        <tfoot>
-                            <tr class="total-row">
-                                <td colspan="3" style="text-align: right;">TOTAL:</td>
-                                <td style="text-align: right;">KSH {order.get_total()}</td>
-                            </tr>
-                        </tfoot>
-                    </table>
-                </div>
-                
-                <div class="info-box">
-                    <h3>📍 Pickup Information</h3>
-                    <div class="info-grid">
-                        <div class="info-item">
-                            <strong>Pickup Location</strong>
-                            <span>{pickup_info['location']}</span>
-                        </div>
-                        <div class="info-item">
-                            <strong>Pickup Date</strong>
-                            <span>{pickup_info['date'].strftime('%B %d, %Y')}</span>
-                        </div>
-                        <div class="info-item">
-                            <strong>Pickup Time</strong>
-                            <span>{pickup_info['time'].strftime('%I:%M %p')}</span>
-                        </div>
-                        <div class="info-item">
-                            <strong>Available Days</strong>
-                            <span>{pickup_info['days']}</span>
-                        </div>
-                    </div>
-                </div>
-                
-                <div class="highlight">
-                    <strong style="color: #2e7d32; font-size: 16px;">⚠️ Important Reminder:</strong>
-                    <p style="color: #1b5e20; margin: 10px 0 0 0;">
-                        Please bring your <strong>Order ID #{order.id}</strong> when picking up your order on 
-                        <strong>{pickup_info['date'].strftime('%B %d, %Y')}</strong> at 
-                        <strong>{pickup_info['time'].strftime('%I:%M %p')}</strong>.
-                    </p>
-                </div>
-                
-                <div class="section">
-                    <h3 class="section-title">📋 Order Summary</h3>
-                    <table style="width: 100%; color: #666; font-size: 14px;">
-                        <tr>
-                            <td style="padding: 8px 0;"><strong>Status:</strong></td>
-                            <td style="text-align: right;">{order.get_order_status_display()}</td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 8px 0;"><strong>Email:</strong></td>
-                            <td style="text-align: right;">{order.email}</td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 8px 0;"><strong>Phone:</strong></td>
-                            <td style="text-align: right;">{order.phone_number}</td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 8px 0;"><strong>Delivery Address:</strong></td>
-                            <td style="text-align: right;">{order.delivery_address}</td>
-                        </tr>
-                    </table>
-                </div>
-            </div>
-            
-            <div class="footer">
-                <p style="font-weight: 600; color: #333; font-size: 16px;">Qunimart</p>
-                <p>📍 {pickup_info['location']}</p>
-                <p>📧 {store_settings.store_email} | 📞 {store_settings.store_phone}</p>
-                
-                <div style="margin: 20px 0; padding: 15px; background: white; border-radius: 8px; display: inline-block;">
-                    <p style="color: #666; margin: 0; font-size: 13px;">
-                        Questions? Contact us at <a href="mailto:{store_settings.store_email}" style="color: #667eea; text-decoration: none;">{store_settings.store_email}</a>
-                    </p>
-                </div>
-                
-                <p style="color: #999; font-size: 12px; margin-top: 20px;">
-                    © 2026 Qunimart. All rights reserved.
-                </p>
-            </div>
-        </div>
-    </body>
-    </html>
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CSS inlining — applied to the template source, before compiling
+# ─────────────────────────────────────────────────────────────────────────────
+
+_STYLE_BLOCK_RE = re.compile(r'<style[^>]*>(.*?)</style>', re.S | re.I)
+_CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+_CSS_RULE_RE = re.compile(r'([^{}@]+)\{([^{}]*)\}')
+_CSS_AT_BLOCK_RE = re.compile(r'@[^{]+\{(?:[^{}]*\{[^{}]*\})*[^{}]*\}', re.S)
+_COMPOUND_RE = re.compile(r'^([a-z][a-z0-9]*)?((?:\.[\w-]+)*)$', re.I)
+_TAG_RE = re.compile(r'<(/?)([a-zA-Z][a-zA-Z0-9]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*?)(/?)>')
+_ATTR_RE = r'\b{}\s*=\s*"([^"]*)"'
+
+_VOID_TAGS = {'area', 'base', 'br', 'col', 'hr', 'img', 'input', 'link', 'meta', 'source', 'wbr'}
+_SKIP_TAGS = {'html', 'head', 'style', 'meta', 'title', 'link'}
+
+
+def _parse_css(css):
+    """Inlinable rules as (specificity, order, [(tag, classes), ...], declarations)."""
+    css = _CSS_AT_BLOCK_RE.sub('', _CSS_COMMENT_RE.sub('', css))
+    rules = []
+    for selectors, body in _CSS_RULE_RE.findall(css):
+        declarations = ' '.join(body.split()).strip().rstrip(';').replace('"', "'")
+        if not declarations:
+            continue
+        for selector in selectors.split(','):
+            parts = []
+            for compound in selector.split():
+                match = _COMPOUND_RE.match(compound)
+                if not match or not compound:
+                    parts = None  # pseudo-classes, combinators, attributes: leave in <style>
+                    break
+                tag, classes = match.groups()
+                parts.append(((tag or '').lower(), frozenset(filter(None, (classes or '').split('.')))))
+            if parts:
+                specificity = (sum(len(c) for _, c in parts), sum(1 for t, _ in parts if t))
+                rules.append((specificity, len(rules), parts, declarations))
+    return sorted(rules, key=lambda rule: (rule[0], rule[1]))
+
+
+def _matches(part, element):
+    tag, classes = part
+    return (not tag or tag == element[0]) and classes <= element[1]
+
+
+def _rule_applies(parts, element, ancestors):
+    if not _matches(parts[-1], element):
+        return False
+    remaining = list(parts[:-1])
+    for ancestor in reversed(ancestors):
+        if remaining and _matches(remaining[-1], ancestor):
+            remaining.pop()
+    return not remaining
+
+
+def inline_css(source):
+    """Copy <style> rules onto matching elements as style="" attributes."""
+    rules = []
+    for css in _STYLE_BLOCK_RE.findall(source):
+        rules.extend(_parse_css(css))
+    if not rules:
+        return source
+    rules.sort(key=lambda rule: (rule[0], rule[1]))
+
+    stack = []
+    out = []
+    last = 0
+    for match in _TAG_RE.finditer(source):
+        closing, tag, attrs, self_closing = match.groups()
+        tag = tag.lower()
+        if closing:
+            for depth in range(len(stack) - 1, -1, -1):
+                if stack[depth][0] == tag:
+                    del stack[depth:]
+                    break
+            continue
+        if tag in _SKIP_TAGS:
+            continue
+
+        class_match = re.search(_ATTR_RE.format('class'), attrs)
+        classes = frozenset(
+            name for name in (class_match.group(1).split() if class_match else [])
+            if '{' not in name and '}' not in name
+        )
+        element = (tag, classes)
+        declarations = [decl for _, _, parts, decl in rules if _rule_applies(parts, element, stack)]
+
+        if declarations:
+            style_match = re.search(_ATTR_RE.format('style'), attrs)
+            if style_match:
+                # The element's own style comes last so it still wins
+                merged = '; '.join(declarations + [style_match.group(1).strip().rstrip(';')])
+                new_attrs = attrs[:style_match.start()] + f'style="{merged}"' + attrs[style_match.end():]
+            else:
+                new_attrs = f'{attrs.rstrip()} style="{"; ".join(declarations)}"'
+                if attrs.endswith(' ') or self_closing:
+                    new_attrs += ' '
+            out.append(source[last:match.start()])
+            out.append(f'<{tag}{new_attrs}{self_closing}>')
+            last = match.end()
+
+        if tag not in _VOID_TAGS and not self_closing:
+            stack.append(element)
+
+    out.append(source[last:])
+    return ''.join(out)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Rendering
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _compile(name):
+    """Template for name with CSS inlined; compiled once per process."""
+    template = _compiled.get(name)
+    if template is not None:
+        return template
+
+    source = get_template(name).template.source
+    template = engines['django'].from_string(inline_css(source) if name.endswith('.html') else source)
+    if getattr(settings, 'EMAIL_TEMPLATE_CACHE', True):
+        with _compiled_lock:
+            _compiled[name] = template
+    return template
+
+
+_BLOCK_END_RE = re.compile(r'</(p|div|h[1-6]|tr|table|li|ul|ol)>|<br\s*/?>', re.I)
+_HEAD_RE = re.compile(r'<head.*?</head>', re.S | re.I)
+_TAGS_RE = re.compile(r'<[^>]+>')
+
+
+def html_to_text(html):
+    """Readable plain-text fallback for an HTML email."""
+    text = _HEAD_RE.sub('', html)
+    text = _BLOCK_END_RE.sub('\n', text)
+    text = html_lib.unescape(_TAGS_RE.sub(' ', text))
+    lines = [' '.join(line.split()) for line in text.splitlines()]
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip() + '\n'
+
+
+def render_email(name, context):
+    """
+    Render parlour/emails/<name>.html. Returns (text, html); the text part
+    comes from <name>.txt when that template exists.
     """
-    
-    # Plain text fallback
-    plain_message = f"""
-Dear {order.customer_name},
+    html = _compile(f'parlour/emails/{name}.html').render(context)
+    try:
+        text = _compile(f'parlour/emails/{name}.txt').render(context)
+    except TemplateDoesNotExist:
+        text = html_to_text(html)
+    return text, html
 
-Thank you for your order at Qunimart!
 
-ORDER NUMBER: #{order.id}
-Order Date: {order.created_at.strftime('%B %d, %Y at %I:%M %p')}
+def build_email(name, context, subject, to, from_email=None, reply_to=None):
+    """An EmailMultiAlternatives with a text body and the HTML alternative."""
+    text, html = render_email(name, context)
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body=text,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=to if isinstance(to, (list, tuple)) else [to],
+        reply_to=reply_to,
+    )
+    message.attach_alternative(html, 'text/html')
+    return message
 
-ITEMS ORDERED:
-"""
-    for item in items:
-        plain_message += f"\n- {item.product.name} (Size: {item.size})\n"
-        plain_message += f"  Quantity: {item.quantity} | Price: KSH {item.price} | Subtotal: KSH {item.get_subtotal()}\n"
-    
-    plain_message += f"\nTOTAL: KSH {order.get_total()}\n"
-    plain_message += f"""
-PICKUP INFORMATION:
-Location: {pickup_info['location']}
-Date: {pickup_info['date'].strftime('%B %d, %Y')}
-Time: {pickup_info['time'].strftime('%I:%M %p')}
-
-Please bring Order ID #{order.id} when picking up.
-
-Contact: {store_settings.store_email} | {store_settings.store_phone}
-
-Best regards,
-Qunimart Team
+
+def send_emails(messages, fail_silently=False):
+    """Send a batch over one SMTP connection. Returns the number sent."""
+    messages = [message for message in messages if message is not None]
+    if not messages:
+        return 0
+    connection = get_connection(fail_silently=fail_silently)
+    return connection.send_messages(messages) or 0
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Order confirmations
+# ─────────────────────────────────────────────────────────────────────────────
+
+def build_order_confirmation(order, store_settings):
+    """Confirmation message for an order whose items/products are prefetched."""
+    items = list(order.orderitem_set.all())
+    context = {
+        'order': order,
+        'items': items,
+        'total': sum(item.get_subtotal() for item in items),
+        'pickup': order.get_pickup_info(store_settings),
+        'store_settings': store_settings,
+        'media_url': settings.MEDIA_URL,
+    }
+    return build_email(
+        'order_confirmation', context,
+        subject=f'Order Confirmation #{order.id} - Hoka\'s Parlour',
+        to=[order.email],
+    )
+
+
+def send_order_confirmation_emails(orders):
+    """
+    Render and send confirmations for many orders: one query for the
+    orders with their items and products, one for the store settings, one
+    SMTP connection. Returns the number of emails sent.
     """
-    
+    order_ids = [getattr(order, 'pk', order) for order in orders]
+    orders = Order.objects.filter(pk__in=order_ids).prefetch_related('orderitem_set__product')
+    store_settings = StoreSettings.get_settings()
+
+    messages = []
+    for order in orders:
+        if not order.email:
+            continue
+        try:
+            messages.append(build_order_confirmation(order, store_settings))
+        except Exception as e:
+            logger.error(f"Failed to render order confirmation for order #{order.id}: {e}", exc_info=True)
+
+    sent = send_emails(messages)
+    logger.info(f"Order confirmation emails sent: {sent} of {len(order_ids)}")
+    return sent
+
+
+def send_order_confirmation_email(order):
+    """Send one order confirmation. Returns True on success."""
     try:
-        # Create email with HTML content
-        email = EmailMessage(
-            subject=subject,
-            body=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[order.email],
-        )
-        email.content_subtype = "html"
-        email.body = html_message
-        
-        # Send email
-        sent_count = email.send(fail_silently=False)
-        
-        logger.info(f"Order confirmation email sent to {order.email}. Result: {sent_count}")
-        return True
-        
+        return send_order_confirmation_emails([order]) == 1
     except Exception as e:
         logger.error(f"Failed to send order confirmation to {order.email}: {str(e)}")
-        print(f"Error sending email: {e}")
-        return False
\ No newline at end of file
+        return False
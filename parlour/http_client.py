@@ -0,0 +1,60 @@
+"""
+Pooled async HTTP client for the views that wait on other services
+(Lipana, the WhatsApp service).
+
+    async with http_client.client() as client:
+        response = await client.post(...)
+
+Under uvicorn (hokasparlour.asgi calls share_clients()) that is one
+httpx.AsyncClient per event loop — one per worker process, kept for its
+lifetime — so keep-alive connections to each service are reused across
+requests and a worker can hold many outbound calls open at once. Under
+runserver / WSGI every async view runs in a short-lived loop of its own, so
+each call gets a fresh client that is closed, with its sockets, on the way
+out of the block.
+"""
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+
+import httpx
+from django.conf import settings
+
+POOL_LIMITS = httpx.Limits(
+    max_connections=getattr(settings, 'HTTP_POOL_MAX_CONNECTIONS', 100),
+    max_keepalive_connections=getattr(settings, 'HTTP_POOL_MAX_KEEPALIVE', 20),
+)
+
+# Per-call timeouts are passed by the callers; this only bounds connecting
+DEFAULT_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+_clients = weakref.WeakKeyDictionary()
+_shared = False
+
+
+def share_clients():
+    """Keep one client per event loop. Only for servers whose loop lives as long as the worker."""
+    global _shared
+    _shared = True
+
+
+def _new_client():
+    return httpx.AsyncClient(limits=POOL_LIMITS, timeout=DEFAULT_TIMEOUT)
+
+
+def _shared_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = _new_client()
+    return client
+
+
+@asynccontextmanager
+async def client():
+    """An AsyncClient for the block: the event loop's shared one under ASGI, else a fresh one."""
+    if _shared:
+        yield _shared_client()
+        return
+    async with _new_client() as fresh:
+        yield fresh
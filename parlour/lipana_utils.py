@@ -1,90 +1,115 @@
-import requests
+import logging
 import os
 
+import httpx
+import requests
+
+from . import http_client
+from .phones import e164
+
+logger = logging.getLogger(__name__)
+
 LIPANA_API_BASE = "https://api.lipana.dev/v1"
 LIPANA_SECRET_KEY = os.getenv("LIPANA_SECRET_KEY")
 
-
-def format_phone(phone: str) -> str:
-    phone = phone.strip().replace(" ", "").replace("-", "")
-    if phone.startswith('+254'):
-        return phone
-    elif phone.startswith('254'):
-        return '+' + phone
-    elif phone.startswith('07') or phone.startswith('01'):
-        return '+254' + phone[1:]
-    elif phone.startswith('7') or phone.startswith('1'):
-        return '+254' + phone
-    return phone
+STK_TIMEOUT = 30
 
 
-def stk_push(phone: str, amount: float, reference: str = None) -> dict:
+def _stk_request(phone: str, amount: float):
+    """(url, payload, headers) for an STK push."""
     url = f"{LIPANA_API_BASE}/transactions/push-stk"
     headers = {
-        "x-api-key": LIPANA_SECRET_KEY,
         "Content-Type": "application/json",
     }
-
-    formatted_phone = format_phone(phone)
     payload = {
-        "phone": formatted_phone,
+        "phone": e164(phone),
         "amount": int(amount),
     }
 
-    print(f"STK Push → phone: {formatted_phone}, amount: {int(amount)}")
-    print(f"Using API key: {LIPANA_SECRET_KEY[:20]}..." if LIPANA_SECRET_KEY else "⚠️ NO API KEY FOUND")
+    logger.info(f"STK Push → phone: {payload['phone']}, amount: {payload['amount']}")
+    if LIPANA_SECRET_KEY:
+        headers["x-api-key"] = LIPANA_SECRET_KEY
+    else:
+        logger.error("STK Push: LIPANA_SECRET_KEY is not set")
+    return url, payload, headers
 
-    try:
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
-        
-        # Print full raw response for debugging
-        print(f"Status code: {response.status_code}")
-        print(f"Raw response: {response.text}")
-
-        data = response.json()
-
-        if response.status_code in (200, 201) and data.get("success"):
-            # Handle both possible response structures
-            response_data = data.get("data", {})
-            
-            checkout_id = (
-                response_data.get("checkoutRequestID") or
-                response_data.get("CheckoutRequestID") or
-                response_data.get("checkout_request_id") or
-                data.get("checkoutRequestID") or  # sometimes at root level
-                response_data.get("transactionId")  # fallback to transactionId
-            )
-            
-            transaction_id = (
-                response_data.get("transactionId") or
-                response_data.get("transaction_id") or
-                ""
-            )
-
-            print(f"checkout_id resolved to: {checkout_id}")
-
-            if not checkout_id:
-                print(f"⚠️ Could not find checkoutRequestID in: {data}")
-                return {
-                    "success": False,
-                    "message": f"Unexpected response structure: {data}"
-                }
 
+def _stk_result(status_code: int, text: str, data: dict) -> dict:
+    logger.debug(f"STK Push response {status_code}: {text}")
+
+    if status_code in (200, 201) and data.get("success"):
+        # Handle both possible response structures
+        response_data = data.get("data", {})
+
+        checkout_id = (
+            response_data.get("checkoutRequestID") or
+            response_data.get("CheckoutRequestID") or
+            response_data.get("checkout_request_id") or
+            data.get("checkoutRequestID") or  # sometimes at root level
+            response_data.get("transactionId")  # fallback to transactionId
+        )
+
+        transaction_id = (
+            response_data.get("transactionId") or
+            response_data.get("transaction_id") or
+            ""
+        )
+
+        logger.debug(f"STK Push checkout_id resolved to: {checkout_id}")
+
+        if not checkout_id:
+            logger.error(f"STK Push: no checkoutRequestID in response: {data}")
             return {
-                "success": True,
-                "checkout_request_id": checkout_id,
-                "transaction_id": transaction_id,
-                "message": data.get("message", "STK push sent"),
+                "success": False,
+                "message": f"Unexpected response structure: {data}"
             }
 
         return {
-            "success": False,
-            "message": data.get("message", "STK push failed")
+            "success": True,
+            "checkout_request_id": checkout_id,
+            "transaction_id": transaction_id,
+            "message": data.get("message", "STK push sent"),
         }
 
+    return {
+        "success": False,
+        "message": data.get("message", "STK push failed")
+    }
+
+
+def stk_push(phone: str, amount: float, reference: str = None) -> dict:
+    url, payload, headers = _stk_request(phone, amount)
+
+    try:
+        response = requests.post(url, json=payload, headers=headers, timeout=STK_TIMEOUT)
+        return _stk_result(response.status_code, response.text, response.json())
+
     except requests.exceptions.Timeout:
+        logger.warning(f"STK Push timed out for {payload['phone']}")
         return {"success": False, "message": "Request timed out. Please try again."}
     except requests.exceptions.RequestException as e:
+        logger.error(f"STK Push network error: {e}")
+        return {"success": False, "message": f"Network error: {str(e)}"}
+    except Exception as e:
+        logger.error(f"STK Push error: {e}", exc_info=True)
+        return {"success": False, "message": f"Unexpected error: {str(e)}"}
+
+
+async def astk_push(phone: str, amount: float, reference: str = None) -> dict:
+    """stk_push() for async views, over parlour.http_client."""
+    url, payload, headers = _stk_request(phone, amount)
+
+    try:
+        async with http_client.client() as client:
+            response = await client.post(url, json=payload, headers=headers, timeout=STK_TIMEOUT)
+        return _stk_result(response.status_code, response.text, response.json())
+
+    except httpx.TimeoutException:
+        logger.warning(f"STK Push timed out for {payload['phone']}")
+        return {"success": False, "message": "Request timed out. Please try again."}
+    except httpx.HTTPError as e:
+        logger.error(f"STK Push network error: {e}")
         return {"success": False, "message": f"Network error: {str(e)}"}
     except Exception as e:
-        return {"success": False, "message": f"Unexpected error: {str(e)}"}
\ No newline at end of file
+        logger.error(f"STK Push error: {e}", exc_info=True)
+        return {"success": False, "message": f"Unexpected error: {str(e)}"}
@@ -0,0 +1,171 @@
+"""
+Logging plumbing wired up from settings.LOGGING.
+
+  * AsyncHandler — request threads only put records on a bounded queue; a
+    listener thread formats them and writes through the real handler
+    (a RotatingFileHandler, a StreamHandler, ...).
+  * JsonFormatter — one JSON object per line, including any `extra` fields.
+  * SamplingFilter — keeps a fraction of the INFO-and-below records of the
+    noisiest loggers; warnings and errors always pass.
+  * Correlation ids — RequestLogMiddleware sets one per request and every
+    record logged while handling it carries it as `request_id`.
+
+Nothing here touches settings or models: this module is loaded while
+Django configures logging, before any app is ready.
+"""
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueListener
+
+from django.utils.module_loading import import_string
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+def set_request_id(request_id):
+    """Set the correlation id for this context. Returns a token for reset_request_id()."""
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token):
+    _request_id.reset(token)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Queue handler
+# ─────────────────────────────────────────────────────────────────────────────
+
+class AsyncHandler(logging.Handler):
+    """
+    Puts records on a queue; a listener thread hands them to `target`, built
+    from its dotted path and the remaining options:
+
+        'file': {
+            'class': 'parlour.logging_utils.AsyncHandler',
+            'target': 'logging.handlers.RotatingFileHandler',
+            'filename': ..., 'maxBytes': ..., 'backupCount': ...,
+            'formatter': 'json',
+        }
+
+    The formatter is applied by the target on the listener thread. When the
+    queue is full, records are dropped and counted rather than blocking.
+    """
+
+    def __init__(self, target, queue_size=10000, **options):
+        super().__init__()
+        self.target = import_string(target)(**options)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self._lock_listener = threading.Lock()
+        self._start_listener()
+
+    def _start_listener(self):
+        self._pid = os.getpid()
+        self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        """Copy of record safe to format on another thread, with the request id attached."""
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if getattr(record, 'request_id', None) is None:
+            record.request_id = get_request_id() or '-'
+        return record
+
+    def emit(self, record):
+        # A worker forked after logging was configured has no listener thread
+        if self._pid != os.getpid():
+            with self._lock_listener:
+                if self._pid != os.getpid():
+                    self.queue = queue.Queue(maxsize=self.queue.maxsize)
+                    self._start_listener()
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        try:
+            if self._pid == os.getpid():
+                self.listener.stop()  # drains the queue first
+            self.target.close()
+        finally:
+            super().close()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Formatting and sampling
+# ─────────────────────────────────────────────────────────────────────────────
+
+# Attributes every LogRecord has; anything else came from `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None) or get_request_id(),
+            'pid': record.process,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        if record.stack_info:
+            payload['stack'] = record.stack_info
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    rates: {logger name prefix: fraction of records below WARNING to keep}.
+    The longest matching prefix wins; loggers not listed are not sampled.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = sorted((rates or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record):
+        # Decided once per record, so every handler keeps or drops it alike
+        keep = getattr(record, '_sampled', None)
+        if keep is None:
+            keep = record._sampled = self._keep(record)
+        return keep
+
+    def _keep(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + '.'):
+                return rate >= 1 or random.random() < rate
+        return True
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from parlour.customers import BACKFILL_BATCH_SIZE, backfill
+
+
+class Command(BaseCommand):
+    help = "Link every order without a customer to one, creating customers as needed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BACKFILL_BATCH_SIZE,
+            help=f'Orders per batch (default {BACKFILL_BATCH_SIZE}).',
+        )
+
+    def handle(self, *args, **options):
+        linked, created = backfill(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Linked {linked} order(s), created {created} customer(s)."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from hokasparlour.sitemaps import SITEMAP_ROOT, build_sitemaps
+
+
+class Command(BaseCommand):
+    help = "Regenerate the sitemap index and product sitemap chunks (plain and gzipped)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=None,
+            help='Product URLs per sitemap file (default SITEMAP_CHUNK_SIZE).',
+        )
+
+    def handle(self, *args, **options):
+        chunks = build_sitemaps(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {chunks} product sitemap(s) to {SITEMAP_ROOT}"))
@@ -0,0 +1,19 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from parlour.static_assets import check
+
+
+class Command(BaseCommand):
+    help = "Fail if any template asset would be served without a hashed name (direct /static/ links, CDN libraries)."
+
+    def handle(self, *args, **options):
+        problems = check()
+        for path, line, message in problems:
+            where = f"{os.path.relpath(path, settings.BASE_DIR)}:{line}: " if path else ''
+            self.stderr.write(f"{where}{message}")
+        if problems:
+            raise CommandError(f"{len(problems)} static asset problem(s).")
+        self.stdout.write(self.style.SUCCESS("Every template asset is served under a hashed name."))
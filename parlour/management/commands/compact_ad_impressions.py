@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from parlour.ad_stats import (
+    RETENTION_DAYS, compact_impressions, prune_cutoff_day, prune_impressions, rollup_day,
+)
+
+
+class Command(BaseCommand):
+    help = "Roll raw ad impressions up into daily per-ad stats and prune raw rows past retention."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days', type=int, default=RETENTION_DAYS,
+            help=f'Raw impressions to keep, in days (default {RETENTION_DAYS}).',
+        )
+        parser.add_argument(
+            '--date', action='append', default=[],
+            help='Re-roll one day (YYYY-MM-DD) from raw impressions, within retention; may be repeated.',
+        )
+        parser.add_argument('--no-prune', action='store_true', help='Compact only; keep every raw impression.')
+
+    def handle(self, *args, **options):
+        days = [date.fromisoformat(value) for value in options['date']]
+        cutoff = prune_cutoff_day(retention_days=options['retention_days'])
+        too_old = [str(day) for day in days if cutoff and day < cutoff]
+        if too_old:
+            raise CommandError(
+                f"Raw impressions before {cutoff} may already be pruned; "
+                f"re-rolling {', '.join(too_old)} could lose their stats."
+            )
+
+        for day in days:
+            rows = rollup_day(day)
+            self.stdout.write(f"{day}: {rows} rollup row(s)")
+
+        days = compact_impressions()
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {days} day(s)"))
+
+        if not options['no_prune']:
+            pruned = prune_impressions(retention_days=options['retention_days'])
+            self.stdout.write(self.style.SUCCESS(f"Pruned {pruned} raw impression(s)"))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from parlour.catalog_import import import_catalog
+from parlour.models import Store
+
+
+class Command(BaseCommand):
+    help = "Create or update products in bulk from a CSV / JSON / JSON Lines file and an optional image ZIP."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Catalog file (.csv, .json, .jsonl or .ndjson).')
+        parser.add_argument('--images', help='ZIP archive holding the files named in the image columns.')
+        parser.add_argument('--store', help='Store slug to bind every row to (overrides the store column).')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows written per batch (default 500).')
+        parser.add_argument('--dry-run', action='store_true', help='Validate every row without writing anything.')
+
+    def handle(self, *args, **options):
+        store = None
+        if options['store']:
+            store = Store.objects.filter(slug=options['store']).first()
+            if store is None:
+                raise CommandError(f"No store with slug '{options['store']}'")
+
+        images_zip = open(options['images'], 'rb') if options['images'] else None
+        try:
+            with open(options['path'], 'rb') as catalog:
+                result = import_catalog(
+                    catalog, options['path'],
+                    images_zip=images_zip,
+                    store=store,
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                )
+        finally:
+            if images_zip:
+                images_zip.close()
+
+        for line, message in result.errors:
+            self.stderr.write(f"line {line}: {message}")
+
+        prefix = 'Dry run — ' if options['dry_run'] else ''
+        style = self.style.SUCCESS if result.ok else self.style.WARNING
+        self.stdout.write(style(f"{prefix}{result.summary()}"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from parlour.referrals import reconcile
+
+
+class Command(BaseCommand):
+    help = "Rebuild promo purchase counts and agent referral totals from the referral ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would change without saving it.',
+        )
+
+    def handle(self, *args, **options):
+        usages, agents = reconcile(dry_run=options['dry_run'])
+        verb = 'Would fix' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {usages} promo usage(s) and {agents} agent total(s)."))
@@ -0,0 +1,49 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from parlour import scheduler
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the periodic job scheduler. Start one or more of these alongside the "
+        "web workers; they elect a leader through the database and only it runs jobs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--run', metavar='JOB_ID', action='append', default=[],
+            help='Run a catalog job once, now, and exit; may be repeated.',
+        )
+        parser.add_argument('--list', action='store_true', help='List the job catalog and exit.')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for job in scheduler.JOBS:
+                cron = ' '.join(f"{key}={value}" for key, value in job.cron.items())
+                self.stdout.write(f"{job.id:<26} {cron:<22} {job.name}")
+            return
+
+        if options['run']:
+            unknown = [job_id for job_id in options['run'] if job_id not in scheduler.JOBS_BY_ID]
+            if unknown:
+                raise CommandError(f"Unknown job(s): {', '.join(unknown)}")
+            for job_id in options['run']:
+                run = scheduler.execute(job_id)
+                style = self.style.SUCCESS if run.status == 'success' else self.style.ERROR
+                self.stdout.write(style(f"{job_id}: {run.status} in {run.duration_ms} ms — {run.rows} row(s) {run.detail}"))
+            return
+
+        stop = threading.Event()
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping scheduler…")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        self.stdout.write(f"Scheduler process {scheduler.HOLDER} waiting for the lease")
+        scheduler.run(stop)
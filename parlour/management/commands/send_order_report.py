@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from parlour.reports import PERIODS, build_report, send_report
+
+
+class Command(BaseCommand):
+    help = "Email the daily, weekly or monthly orders report (with its CSV), or write the CSV out."
+
+    def add_arguments(self, parser):
+        parser.add_argument('period', choices=PERIODS)
+        parser.add_argument('--date', help='Any day in the period (YYYY-MM-DD); defaults to today.')
+        parser.add_argument('--to', action='append', help='Recipient; may be repeated. Defaults to ORDER_REPORT_RECIPIENTS.')
+        parser.add_argument('--csv', metavar='PATH', help='Write the CSV to PATH instead of sending the email.')
+
+    def handle(self, *args, **options):
+        day = date.fromisoformat(options['date']) if options['date'] else None
+
+        if options['csv']:
+            report = build_report(options['period'], day)
+            with open(options['csv'], 'w', newline='', encoding='utf-8') as f:
+                f.write(report.csv)
+            self.stdout.write(self.style.SUCCESS(
+                f"{report.title} for {report.label}: {report.total_orders} orders written to {options['csv']}"
+            ))
+            return
+
+        report = send_report(options['period'], day, to=options['to'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.title} for {report.label} sent: {report.total_orders} orders, KSH {report.total_revenue}"
+        ))
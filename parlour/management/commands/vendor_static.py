@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from parlour.static_assets import VENDOR_ASSETS, vendor
+
+
+class Command(BaseCommand):
+    help = "Download (or build) the third-party CSS/JS in VENDOR_ASSETS into static/vendor/."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names', nargs='*',
+            help=f"Libraries to vendor (default all): {', '.join(VENDOR_ASSETS)}.",
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Fetch again even if already vendored.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            written = vendor(options['names'], force=options['force'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for name, files in written.items():
+            self.stdout.write(f"{name}: {files} file(s)")
+        self.stdout.write(self.style.SUCCESS(f"Vendored {len(written)} librar{'y' if len(written) == 1 else 'ies'}."))
@@ -0,0 +1,120 @@
+import logging
+import re
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from hokasparlour.db_router import pin_scope, replica_alias
+
+from .logging_utils import reset_request_id, set_request_id
+
+logger = logging.getLogger('parlour.requests')
+
+# Requests slower than this are logged at WARNING, so they survive sampling
+SLOW_REQUEST_MS = getattr(settings, 'SLOW_REQUEST_MS', 1000)
+
+# An id passed in by the proxy is reused only if it looks like one
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{8,64}$')
+
+
+class RequestLogMiddleware:
+    """
+    Give each request a correlation id (the proxy's X-Request-ID when it
+    sends a sane one), tag every log record made while handling it, echo it
+    back in the response, and log the request's status and duration.
+    Keep it first in MIDDLEWARE so the timing covers the whole stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Async under ASGI, so async views aren't pushed through a thread here
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token, started = self._start(request)
+        try:
+            return self._finish(request, self.get_response(request), started)
+        finally:
+            reset_request_id(token)
+
+    async def __acall__(self, request):
+        token, started = self._start(request)
+        try:
+            return self._finish(request, await self.get_response(request), started)
+        finally:
+            reset_request_id(token)
+
+    def _start(self, request):
+        incoming = request.headers.get('X-Request-ID', '')
+        request_id = incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+        request.request_id = request_id
+        return set_request_id(request_id), time.monotonic()
+
+    def _finish(self, request, response, started):
+        duration_ms = int((time.monotonic() - started) * 1000)
+        response['X-Request-ID'] = request.request_id
+
+        level = logging.INFO
+        if response.status_code >= 500 or duration_ms >= SLOW_REQUEST_MS:
+            level = logging.WARNING
+        logger.log(
+            level,
+            f"{request.method} {request.path} {response.status_code} {duration_ms}ms",
+            extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': duration_ms,
+            },
+        )
+        return response
+
+
+class ReplicaPinMiddleware:
+    """
+    Read-your-writes for replica routing (hokasparlour.db_router). Each
+    request gets its own pin; one that arrives with the pin cookie starts
+    pinned to the primary, and one that writes sets the cookie, so the
+    client's reads stay on the primary for REPLICA_PIN_SECONDS while the
+    replica catches up. Does nothing when no replica is configured.
+    """
+
+    COOKIE = 'db_pin'
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with pin_scope(self.COOKIE in request.COOKIES) as wrote:
+            response = self.get_response(request)
+            return self._finish(request, response, wrote())
+
+    async def __acall__(self, request):
+        with pin_scope(self.COOKIE in request.COOKIES) as wrote:
+            response = await self.get_response(request)
+            return self._finish(request, response, wrote())
+
+    def _finish(self, request, response, wrote):
+        if wrote and replica_alias():
+            response.set_cookie(
+                self.COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10),
+                httponly=True, samesite='Lax', secure=request.is_secure(),
+            )
+        return response
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parlour', '0037_order_status_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('device_class', models.CharField(choices=[('mobile', 'Mobile'), ('tablet', 'Tablet'), ('desktop', 'Desktop')], max_length=10)),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('unique_sessions', models.PositiveIntegerField(default=0)),
+                ('clicks', models.PositiveIntegerField(default=0, help_text='Sessions that clicked through')),
+            ],
+            options={
+                'verbose_name': 'Ad Daily Stat',
+                'verbose_name_plural': 'Ad Daily Stats',
+                'ordering': ['-date', 'advertisement'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='adimpression',
+            index=models.Index(fields=['advertisement', 'viewed_at'], name='adimpression_ad_viewed'),
+        ),
+        migrations.AddIndex(
+            model_name='adimpression',
+            index=models.Index(fields=['viewed_at'], name='adimpression_viewed'),
+        ),
+        migrations.AddField(
+            model_name='addailystat',
+            name='advertisement',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='parlour.advertisement'),
+        ),
+        migrations.AddIndex(
+            model_name='addailystat',
+            index=models.Index(fields=['date'], name='parlour_add_date_4d9139_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='addailystat',
+            constraint=models.UniqueConstraint(fields=('advertisement', 'date', 'device_class'), name='unique_ad_daily_stat'),
+        ),
+    ]
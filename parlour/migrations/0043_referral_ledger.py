@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:53
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+def clamp_promo_counts(apps, schema_editor):
+    PromoUsage = apps.get_model('parlour', 'PromoUsage')
+    PromoUsage.objects.filter(promo_purchases_count__gt=5).update(promo_purchases_count=5, is_active=False)
+
+
+def open_ledger(apps, schema_editor):
+    """One opening-balance entry per referred user with promo purchases before the ledger."""
+    PromoUsage = apps.get_model('parlour', 'PromoUsage')
+    ReferralEntry = apps.get_model('parlour', 'ReferralEntry')
+    ReferralEntry.objects.bulk_create(
+        [
+            ReferralEntry(user_id=user_id, agent_id=agent_id, kind='opening', units=count)
+            for user_id, agent_id, count in PromoUsage.objects.filter(promo_purchases_count__gt=0)
+            .values_list('user_id', 'agent_id', 'promo_purchases_count')
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parlour', '0042_product_active_created'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('order', 'Order'), ('opening', 'Opening balance')], default='order', max_length=10)),
+                ('units', models.PositiveSmallIntegerField(help_text='Promo-priced units counted against the limit')),
+                ('promo_sales', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Value of the promo-priced units at the price paid', max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'referral entries',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.RunPython(clamp_promo_counts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='promousage',
+            constraint=models.CheckConstraint(condition=models.Q(('promo_purchases_count__lte', 5)), name='promousage_count_within_limit'),
+        ),
+        migrations.AddField(
+            model_name='referralentry',
+            name='agent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='referral_entries', to='parlour.agent'),
+        ),
+        migrations.AddField(
+            model_name='referralentry',
+            name='order',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='referral_entry', to='parlour.order'),
+        ),
+        migrations.AddField(
+            model_name='referralentry',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referral_entries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='referralentry',
+            index=models.Index(fields=['agent', '-created_at'], name='referral_agent_created'),
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
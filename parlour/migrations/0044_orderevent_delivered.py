@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parlour', '0043_referral_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderevent',
+            name='delivered',
+            field=models.JSONField(blank=True, default=list, help_text='Channels already notified for this event'),
+        ),
+    ]
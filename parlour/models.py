@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import FileExtensionValidator
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -51,17 +52,41 @@ class StoreSettings(models.Model):
         settings, created = cls.objects.get_or_create(id=1)
         return settings
 
-    def get_ready_delivery_info(self):
-        """Returns next day delivery date and time for ready stock."""
-        from datetime import date, timedelta
-        today = date.today()
-        next_day = today + timedelta(days=1)
+    WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+    def ready_weekdays(self):
+        """Weekday numbers (Monday=0) listed in ready_delivery_days; Mon-Fri if none parse."""
+        days = {
+            self.WEEKDAYS.index(name.strip().title())
+            for name in (self.ready_delivery_days or '').split(',')
+            if name.strip().title() in self.WEEKDAYS
+        }
+        return days or {0, 1, 2, 3, 4}
 
-        # Skip to Monday if next day falls on weekend
-        if next_day.weekday() == 5:   # Saturday
-            next_day += timedelta(days=2)
-        elif next_day.weekday() == 6: # Sunday
+    def next_ready_date(self, from_date=None):
+        """First ready-stock delivery day after from_date (default today)."""
+        from datetime import date, timedelta
+        days = self.ready_weekdays()
+        next_day = (from_date or date.today()) + timedelta(days=1)
+        while next_day.weekday() not in days:
             next_day += timedelta(days=1)
+        return next_day
+
+    @staticmethod
+    def next_warehouse_date(from_date=None):
+        """The Friday after from_date (default today) — a week on if it is a Friday."""
+        from datetime import date, timedelta
+        today = from_date or date.today()
+
+        days_until_friday = (4 - today.weekday()) % 7
+        if days_until_friday == 0:
+            days_until_friday = 7  # If today is Friday, go to next Friday
+
+        return today + timedelta(days=days_until_friday)
+
+    def get_ready_delivery_info(self):
+        """Returns next day delivery date and time for ready stock."""
+        next_day = self.next_ready_date()
 
         return {
             'date': next_day,
@@ -72,14 +97,7 @@ class StoreSettings(models.Model):
 
     def get_warehouse_delivery_info(self):
         """Returns the next upcoming Friday delivery date and time."""
-        from datetime import date, timedelta
-        today = date.today()
-
-        days_until_friday = (4 - today.weekday()) % 7
-        if days_until_friday == 0:
-            days_until_friday = 7  # If today is Friday, go to next Friday
-
-        next_friday = today + timedelta(days=days_until_friday)
+        next_friday = self.next_warehouse_date()
 
         return {
             'date': next_friday,
@@ -262,6 +280,7 @@ class Product(models.Model):
     )
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES, default='U')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, help_text="Last change — used as sitemap lastmod")
     is_active = models.BooleanField(default=True, help_text="Product visible on site")
 
     def __str__(self):
@@ -271,64 +290,45 @@ class Product(models.Model):
         # ── Auto stock_type switching ──────────────────────────────
         # Only runs on full save(). For update_fields saves (reduce/restore_stock),
         # the switching logic is handled directly in those methods.
-        update_fields = kwargs.get('update_fields')
-        if update_fields is None:
-            # Full save — apply switching logic
+        self.apply_derived_fields(switch_stock_type=kwargs.get('update_fields') is None)
+        super().save(*args, **kwargs)
+
+    def apply_derived_fields(self, switch_stock_type=True):
+        """
+        Fill the fields save() derives: stock_type from intended_stock_type /
+        stock_quantity, and anchor / discount prices when left blank.
+        Also used by the bulk catalog import, which skips save().
+        """
+        if switch_stock_type:
             if self.intended_stock_type == 'ready':
                 self.stock_type = 'warehouse' if self.stock_quantity == 0 else 'ready'
             else:
                 self.stock_type = 'warehouse'
 
-        # Auto-calculate anchor_price if not manually set
-        if not self.anchor_price:
-            self.anchor_price = (self.price * Decimal('1.20')).quantize(Decimal('0.01'))
-
-        # Auto-calculate discount_price if not manually set
-        if not self.discount_price:
-            profit = self.get_profit_per_item()
-            if profit is not None:
-                self.discount_price = (self.price - (profit * Decimal('0.10'))).quantize(Decimal('0.01'))
-            else:
-                self.discount_price = (self.price * Decimal('0.95')).quantize(Decimal('0.01'))
-
-        super().save(*args, **kwargs)
+        # Auto-calculate anchor / discount prices if not manually set
+        if not self.anchor_price or not self.discount_price:
+            from .pricing import derived_prices
+            anchor, discount = derived_prices(self.price, self.get_profit_per_item())
+            self.anchor_price = self.anchor_price or anchor
+            self.discount_price = self.discount_price or discount
 
     # ── Pricing Helpers ───────────────────────────────────────────
+    # For pricing many products, or more than once per request, use
+    # parlour.pricing with promo_for_request() instead — these read the
+    # user's promo state on every call.
     def get_price_for_user(self, user):
         """
         Returns the correct price for a given user.
         Promo users (with active agent code, < 5 purchases) get discount_price.
         Everyone else gets normal price.
         """
-        if user and user.is_authenticated:
-            try:
-                promo = user.promousage
-                if promo.is_active and promo.promo_purchases_count < 5:
-                    return self.discount_price or self.price
-            except Exception:
-                pass
-        return self.price
+        from .pricing import promo_for_user, quote
+        return quote(self, promo_for_user(user)).price
 
     def get_display_prices(self, user=None):
         """Returns a dict with all price info for template rendering."""
-        actual_price = self.get_price_for_user(user)
-        has_discount = self.anchor_price and self.anchor_price > actual_price
-
-        promo_remaining = None
-        if user and user.is_authenticated:
-            try:
-                promo = user.promousage
-                if promo.is_active:
-                    promo_remaining = 5 - promo.promo_purchases_count
-            except Exception:
-                pass
-
-        return {
-            'price': actual_price,
-            'anchor_price': self.anchor_price if has_discount else None,
-            'has_discount': has_discount,
-            'promo_remaining': promo_remaining,
-        }
+        from .pricing import display_prices, promo_for_user
+        return display_prices(self, promo_for_user(user))
 
     # ── Stock Logic ───────────────────────────────────────────────
     def is_in_stock(self):
@@ -406,6 +406,10 @@ class Product(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Catalog API pages: live products, newest first, by keyset
+            models.Index(fields=['is_active', '-created_at', '-id'], name='product_active_created'),
+        ]
 
 
 class ProductImage(models.Model):
@@ -424,6 +428,30 @@ class ProductImage(models.Model):
         return f"Image for {self.product.name}"
 
 
+class Customer(models.Model):
+    """
+    One person who places orders, however they typed their details at
+    checkout. Orders are linked here by email, else by normalized phone, and
+    the customer by their account once they have one (parlour.customers).
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='customer'
+    )
+    name = models.CharField(max_length=200, blank=True)
+    email = models.EmailField(blank=True, db_index=True, help_text="Lowercased")
+    phone = models.CharField(
+        max_length=20, blank=True, db_index=True,
+        help_text="Normalized to 254XXXXXXXXX (parlour.phones)"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name or self.email or self.phone or f"Customer #{self.pk}"
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -440,11 +468,34 @@ class Order(models.Model):
     is_paid = models.BooleanField(default=False)
     expected_delivery_date = models.DateField(null=True, blank=True)
     delivery_location = models.CharField(max_length=200, blank=True)
+    # Set when the order is first saved; indexed by order_customer_created
+    customer = models.ForeignKey(
+        Customer, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='orders', db_index=False,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Order #{self.id} - {self.customer_name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Status as loaded, so a save can tell what it changed without
+        # re-reading the row (see parlour.order_lifecycle)
+        instance._loaded_status = instance.__dict__.get('order_status')
+        return instance
+
+    def clean(self):
+        from .order_lifecycle import InvalidTransition, check_transition
+
+        loaded = getattr(self, '_loaded_status', None)
+        if loaded and loaded != self.order_status:
+            try:
+                check_transition(loaded, self.order_status)
+            except InvalidTransition as e:
+                raise ValidationError({'order_status': str(e)})
+
     def get_total(self):
         return sum(item.get_subtotal() for item in self.orderitem_set.all())
 
@@ -464,11 +515,14 @@ class Order(models.Model):
             return total - cost
         return None
 
-    def get_pickup_info(self):
-        settings = StoreSettings.get_settings()
+    def get_pickup_info(self, store_settings=None):
+        settings = store_settings or StoreSettings.get_settings()
 
         # Use live stock_type — auto-warehouse products should show Friday delivery
-        has_warehouse = self.orderitem_set.filter(product__stock_type='warehouse').exists()
+        if 'orderitem_set' in getattr(self, '_prefetched_objects_cache', {}):
+            has_warehouse = any(item.product.stock_type == 'warehouse' for item in self.orderitem_set.all())
+        else:
+            has_warehouse = self.orderitem_set.filter(product__stock_type='warehouse').exists()
 
         if has_warehouse:
             delivery = settings.get_warehouse_delivery_info()
@@ -485,6 +539,12 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Finance month figures: delivered orders in a date range
+            models.Index(fields=['order_status', 'created_at'], name='order_status_created'),
+            # A customer's orders, newest first
+            models.Index(fields=['customer', '-created_at'], name='order_customer_created'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -527,6 +587,42 @@ class OrderItem(models.Model):
         return None
 
 
+class OrderEvent(models.Model):
+    """
+    Outbox row for an order status change: written alongside the change,
+    then announced to the customer (email + WhatsApp) by
+    parlour.order_lifecycle.deliver_pending() once the transaction commits.
+    Each message that goes out is recorded in delivered, so a retry only
+    sends the ones still missing.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    delivered = models.JSONField(default=list, blank=True, help_text="Channels already notified for this event")
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='orderevent_status_created'),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_status} → {self.to_status} ({self.status})"
+
+
 class EmailOTP(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     otp = models.CharField(max_length=6)
@@ -755,7 +851,8 @@ class Advertisement(models.Model):
         self.save(update_fields=['clicks'])
 
     def get_images(self):
-        return self.ad_images.all().order_by('order')
+        # AdImage is ordered by 'order' already; .all() keeps prefetched images usable
+        return self.ad_images.all()
 
 
 class AdImage(models.Model):
@@ -784,12 +881,54 @@ class AdImpression(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['session_key', 'advertisement']),
+            models.Index(fields=['advertisement', 'viewed_at'], name='adimpression_ad_viewed'),
+            models.Index(fields=['viewed_at'], name='adimpression_viewed'),
         ]
 
     def __str__(self):
         return f"Impression for {self.advertisement.title} at {self.viewed_at}"
 
 
+class AdDailyStat(models.Model):
+    """
+    One day of an ad's impressions for one device class, rolled up from
+    AdImpression by parlour.ad_stats.compact_impressions(). Raw impressions
+    are pruned after AD_IMPRESSION_RETENTION_DAYS; these rows are kept.
+    """
+    DEVICE_CLASSES = [
+        ('mobile', 'Mobile'),
+        ('tablet', 'Tablet'),
+        ('desktop', 'Desktop'),
+    ]
+
+    advertisement = models.ForeignKey(Advertisement, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    device_class = models.CharField(max_length=10, choices=DEVICE_CLASSES)
+    views = models.PositiveIntegerField(default=0)
+    unique_sessions = models.PositiveIntegerField(default=0)
+    clicks = models.PositiveIntegerField(default=0, help_text="Sessions that clicked through")
+
+    class Meta:
+        ordering = ['-date', 'advertisement']
+        verbose_name = "Ad Daily Stat"
+        verbose_name_plural = "Ad Daily Stats"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['advertisement', 'date', 'device_class'], name='unique_ad_daily_stat'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.advertisement.title} — {self.date} ({self.device_class})"
+
+    @property
+    def ctr(self):
+        return (self.clicks / self.views * 100) if self.views else 0
+
+
 class MpesaPayment(models.Model):
     order = models.ForeignKey(
         Order,
@@ -891,7 +1030,8 @@ class Agent(models.Model):
         return f"https://hokasparlour.adcent.online/ref/{self.referral_code}/"
 
     def total_users_referred(self):
-        return PromoUsage.objects.filter(agent=self).count()
+        from .referrals import agent_stats
+        return agent_stats(self.pk)['users']
 
 
 class PromoUsage(models.Model):
@@ -908,26 +1048,54 @@ class PromoUsage(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # pricing.PROMO_LIMIT — promo purchases are consumed by parlour.referrals
+            models.CheckConstraint(
+                condition=models.Q(promo_purchases_count__lte=5),
+                name='promousage_count_within_limit',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.username} → {self.agent.referral_code if self.agent else 'no agent'} ({self.promo_purchases_count}/5)"
 
     def remaining_promo_purchases(self):
         return max(0, 5 - self.promo_purchases_count)
 
-    def use_promo(self, quantity):
-        """
-        Called when a promo user places an order.
-        Increments counter and deactivates if limit reached.
-        """
-        self.promo_purchases_count += quantity
-        if self.promo_purchases_count >= 5:
-            self.promo_purchases_count = min(self.promo_purchases_count, 5)
-            self.is_active = False
-        self.save(update_fields=['promo_purchases_count', 'is_active'])
-        if self.agent:
-            Agent.objects.filter(pk=self.agent.pk).update(
-                total_referrals=models.F('total_referrals') + quantity
-            )
+
+class ReferralEntry(models.Model):
+    """
+    Append-only ledger of promo purchases, one row per order (see
+    parlour.referrals). PromoUsage.promo_purchases_count and
+    Agent.total_referrals are running totals of it.
+    """
+    KIND_CHOICES = [
+        ('order', 'Order'),
+        ('opening', 'Opening balance'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='referral_entries')
+    agent = models.ForeignKey(Agent, on_delete=models.SET_NULL, null=True, blank=True, related_name='referral_entries')
+    order = models.OneToOneField(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='referral_entry')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='order')
+    units = models.PositiveSmallIntegerField(help_text="Promo-priced units counted against the limit")
+    promo_sales = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal('0.00'),
+        help_text="Value of the promo-priced units at the price paid"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'referral entries'
+        indexes = [
+            models.Index(fields=['agent', '-created_at'], name='referral_agent_created'),
+        ]
+
+    def __str__(self):
+        source = f"order #{self.order_id}" if self.order_id else self.get_kind_display().lower()
+        return f"User #{self.user_id}: {self.units} promo unit(s) from {source}"
 
 
 class Wishlist(models.Model):
@@ -1110,12 +1278,10 @@ class Store(models.Model):
         return self.products.count()
 
     def get_total_revenue(self):
+        # Summed from the seller app's daily rollups, not from every order item
         from decimal import Decimal
-        total = Decimal('0.00')
-        for product in self.products.all():
-            for item in product.orderitem_set.all():
-                total += item.get_subtotal()
-        return total
+        total = self.daily_sales.aggregate(total=models.Sum('revenue'))['total']
+        return total if total is not None else Decimal('0.00')
 
 
 class SellerApplication(models.Model):
@@ -1195,9 +1361,7 @@ class SellerApplication(models.Model):
         self._send_rejection_email()
 
     def _send_approval_email(self, store):
-        from django.core.mail import EmailMessage
-        from django.conf import settings
-        from django.template.loader import render_to_string
+        from .email_utils import build_email, send_emails
 
         context = {
             'applicant_name': self.user.get_full_name() or self.user.username,
@@ -1206,41 +1370,78 @@ class SellerApplication(models.Model):
             'approved_on':    store.approved_at.strftime('%d %b %Y') if store.approved_at else 'Today',
             'dashboard_url':  'https://qunimart.com/seller/dashboard/',
         }
-        html = render_to_string('parlour/emails/seller_approved.html', context)
 
         try:
-            email_msg = EmailMessage(
+            send_emails([build_email(
+                'seller_approved', context,
                 subject=f"🎉 Congratulations! Your Qunimart Store is Live — {store.store_name}",
-                body=html,
-                from_email=settings.DEFAULT_FROM_EMAIL,
                 to=[self.email or self.user.email],
-            )
-            email_msg.content_subtype = "html"
-            email_msg.send(fail_silently=False)
+            )])
         except Exception as e:
             import logging
             logging.getLogger(__name__).error(f"Seller approval email error for {self.user.username}: {e}")
 
     def _send_rejection_email(self):
-        from django.core.mail import EmailMessage
-        from django.conf import settings
-        from django.template.loader import render_to_string
+        from .email_utils import build_email, send_emails
 
         context = {
             'applicant_name': self.user.get_full_name() or self.user.username,
             'admin_notes':    self.admin_notes,
         }
-        html = render_to_string('parlour/emails/seller_rejected.html', context)
 
         try:
-            email_msg = EmailMessage(
+            send_emails([build_email(
+                'seller_rejected', context,
                 subject="Your Qunimart Seller Application — Update",
-                body=html,
-                from_email=settings.DEFAULT_FROM_EMAIL,
                 to=[self.email or self.user.email],
-            )
-            email_msg.content_subtype = "html"
-            email_msg.send(fail_silently=False)
+            )])
         except Exception as e:
             import logging
-            logging.getLogger(__name__).error(f"Seller rejection email error for {self.user.username}: {e}")
\ No newline at end of file
+            logging.getLogger(__name__).error(f"Seller rejection email error for {self.user.username}: {e}")
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Scheduler — leader lease and job run history (see parlour/scheduler.py)
+# ─────────────────────────────────────────────────────────────────────────────
+
+class SchedulerLease(models.Model):
+    """
+    One row per lease name. Whichever scheduler process holds an unexpired
+    lease is the leader and the only one running jobs; the others wait for
+    it to lapse.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    holder = models.CharField(max_length=150, blank=True)
+    acquired_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} held by {self.holder or 'nobody'}"
+
+
+class JobRun(models.Model):
+    """One execution of a scheduled job, written by parlour.scheduler.run_job()."""
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('success', 'Success'),
+        ('failed', 'Failed'),
+    ]
+
+    job_id = models.CharField(max_length=100)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    rows = models.PositiveIntegerField(null=True, blank=True, help_text="Rows / items the job processed")
+    detail = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    host = models.CharField(max_length=150, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['job_id', '-started_at'], name='jobrun_job_started'),
+            models.Index(fields=['started_at'], name='jobrun_started'),
+        ]
+
+    def __str__(self):
+        return f"{self.job_id} at {self.started_at:%Y-%m-%d %H:%M} — {self.status}"
@@ -1,8 +1,13 @@
 import requests
 import base64
+import logging
 from datetime import datetime
 from django.conf import settings
 
+from .phones import normalize_phone
+
+logger = logging.getLogger(__name__)
+
 
 def get_mpesa_access_token():
     """Get OAuth access token from Safaricom"""
@@ -25,7 +30,7 @@ def get_mpesa_access_token():
         response.raise_for_status()
         return response.json().get('access_token')
     except Exception as e:
-        print(f"Error getting access token: {e}")
+        logger.error(f"Error getting M-Pesa access token: {e}")
         return None
 
 
@@ -52,7 +57,7 @@ def stk_push(phone_number, amount, order_id):
     password, timestamp = generate_password()
     
     # Format phone number (ensure it starts with 254)
-    phone = format_phone_number(phone_number)
+    phone = normalize_phone(phone_number)
     
     url = 'https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest'
     
@@ -92,19 +97,5 @@ def stk_push(phone_number, amount, order_id):
                 'message': result.get('ResponseDescription', 'STK Push failed')
             }
     except Exception as e:
-        print(f"STK Push error: {e}")
+        logger.error(f"STK Push error: {e}")
         return {'success': False, 'message': str(e)}
-
-
-def format_phone_number(phone):
-    """Format phone number to 254 format"""
-    phone = str(phone).strip().replace(' ', '').replace('-', '')
-    
-    if phone.startswith('+254'):
-        return phone[1:]  # Remove + sign
-    elif phone.startswith('0'):
-        return '254' + phone[1:]  # Replace leading 0 with 254
-    elif phone.startswith('254'):
-        return phone
-    else:
-        return '254' + phone
\ No newline at end of file
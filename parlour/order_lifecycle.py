@@ -0,0 +1,260 @@
+"""
+Order lifecycle: which status changes an order may make, applying them to
+one order or many, and telling the customer about them.
+
+A status change writes an OrderEvent row in the same transaction — the
+outbox. After commit the pending events are delivered off the request
+thread (status email, dispatch email, WhatsApp message); the
+deliver_order_events job sweeps up whatever a crash or a failed send left
+behind. Each channel is recorded on the event as it goes out, so a retry
+sends only what's missing. Single saves are noticed by the post_save receiver in
+parlour.signals, which compares against the status the order was loaded
+with (Order.from_db) rather than re-reading the row. bulk_transition()
+moves any number of orders with one UPDATE and one INSERT of events, and
+sends `orders_transitioned` for listeners that kept per-order state in
+sync through post_save (the seller ledger).
+"""
+import logging
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .background import run_in_background
+from .models import Order, OrderEvent, StoreSettings
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+PROCESSING = 'processing'
+DISPATCHED = 'dispatched'
+DELIVERED = 'delivered'
+
+# Allowed moves. Staff may step back a stage to correct a mistake, but a
+# delivered order stays delivered.
+TRANSITIONS = {
+    PENDING:    {PROCESSING, DISPATCHED, DELIVERED},
+    PROCESSING: {PENDING, DISPATCHED, DELIVERED},
+    DISPATCHED: {PROCESSING, DELIVERED},
+    DELIVERED:  set(),
+}
+
+STATUS_LABELS = dict(Order.STATUS_CHOICES)
+
+# Sent with order_ids, to_status and using after a bulk_transition()
+orders_transitioned = Signal()
+
+# Channels an event can go out on, as recorded in OrderEvent.delivered
+STATUS_EMAIL = 'status_email'
+DISPATCH_EMAIL = 'dispatch_email'
+WHATSAPP = 'whatsapp'
+
+# Delivery attempts before an event is left as failed
+MAX_ATTEMPTS = 5
+# An event claimed this long ago by a sender that never finished is retried
+CLAIM_TIMEOUT = timedelta(minutes=10)
+DELIVERY_BATCH_SIZE = 100
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, ())
+
+
+def check_transition(from_status, to_status):
+    if to_status not in TRANSITIONS:
+        raise InvalidTransition(f"Unknown order status: {to_status}")
+    if not can_transition(from_status, to_status):
+        raise InvalidTransition(
+            f"An order can't go from {STATUS_LABELS.get(from_status, from_status)} "
+            f"to {STATUS_LABELS[to_status]}."
+        )
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Applying transitions
+# ─────────────────────────────────────────────────────────────────────────────
+
+def transition(order, to_status, **changes):
+    """
+    Move one order to to_status, setting any other fields given in changes,
+    and save just those fields. The post_save receiver records the event.
+    """
+    check_transition(order.order_status, to_status)
+    order.order_status = to_status
+    for field, value in changes.items():
+        setattr(order, field, value)
+    order.save(update_fields=['order_status', *changes])
+    return order
+
+
+BulkResult = namedtuple('BulkResult', 'moved skipped')
+
+
+def bulk_transition(order_ids, to_status, using='default'):
+    """
+    Move every order in order_ids that is allowed to reach to_status: one
+    locking SELECT for the current statuses, one UPDATE, one INSERT of
+    events. Orders that can't make the move (or don't exist) are skipped.
+    """
+    if to_status not in TRANSITIONS:
+        raise InvalidTransition(f"Unknown order status: {to_status}")
+
+    with transaction.atomic(using=using):
+        current = dict(
+            Order.objects.using(using).select_for_update()
+            .filter(pk__in=order_ids).values_list('pk', 'order_status')
+        )
+        moved = [pk for pk, status in current.items() if can_transition(status, to_status)]
+        skipped = [pk for pk in order_ids if pk not in moved]
+        if not moved:
+            return BulkResult([], skipped)
+
+        Order.objects.using(using).filter(pk__in=moved).update(order_status=to_status)
+        OrderEvent.objects.using(using).bulk_create([
+            OrderEvent(order_id=pk, from_status=current[pk], to_status=to_status) for pk in moved
+        ])
+        orders_transitioned.send(sender=Order, order_ids=moved, to_status=to_status, using=using)
+        _deliver_after_commit(using)
+
+    logger.info(f"Moved {len(moved)} order(s) to {to_status}, skipped {len(skipped)}")
+    return BulkResult(moved, skipped)
+
+
+def record_save(order, created, update_fields=None, using='default'):
+    """post_save hook: queue an event if this save changed the order's status."""
+    if update_fields is not None and 'order_status' not in update_fields:
+        return
+    previous = getattr(order, '_loaded_status', None)
+    order._loaded_status = order.order_status
+    if created or previous is None or previous == order.order_status:
+        return
+    OrderEvent.objects.using(using).create(order=order, from_status=previous, to_status=order.order_status)
+    _deliver_after_commit(using)
+
+
+def _deliver_after_commit(using):
+    transaction.on_commit(lambda: run_in_background(deliver_pending), using=using)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Delivering events
+# ─────────────────────────────────────────────────────────────────────────────
+
+STATUS_WHATSAPP_MESSAGES = {
+    PROCESSING: (
+        "⚙️ *Order Update — Qunimart*\n\n"
+        "Hi {name}! Your order *#{id}* is now being *processed*. 🏪\n\n"
+        "We're preparing your items and will notify you once dispatched."
+    ),
+    DISPATCHED: (
+        "🚚 *Order Dispatched — Qunimart*\n\n"
+        "Hi {name}! Great news — your order *#{id}* is on its way! 🎉\n\n"
+        "📬 Delivering to: {address}\n\n"
+        "You'll receive it soon. Thank you for your patience! 💛"
+    ),
+    DELIVERED: (
+        "✅ *Order Delivered — Qunimart*\n\n"
+        "Hi {name}! Your order *#{id}* has been *delivered*. 📦\n\n"
+        "We hope you love your items! 😊\n"
+        "If you have any issues, feel free to reach us at {store_phone}.\n\n"
+        "Thank you for shopping with Qunimart! 🛍️💕"
+    ),
+}
+
+
+def _whatsapp_message(order, store_phone):
+    template = STATUS_WHATSAPP_MESSAGES.get(order.order_status)
+    if not template:
+        return None
+    return template.format(
+        name=order.customer_name,
+        id=order.id,
+        address=order.delivery_address,
+        store_phone=store_phone,
+    )
+
+
+def _mark_delivered(event, channel):
+    event.delivered = [*event.delivered, channel]
+    OrderEvent.objects.filter(pk=event.pk).update(delivered=event.delivered)
+
+
+def notify(event, store_phone=None):
+    """
+    Tell the customer about one event, skipping channels it already went
+    out on. The emails go first; if one fails this raises so the event is
+    retried. A failed WhatsApp send is logged only, as it always has been.
+    """
+    from hokaadmin.email_utils import send_order_dispatched_email, send_order_status_change_email
+    from whatsapphoka.service import send_whatsapp_message
+
+    order = event.order
+    # Word the messages for this event even if the order has moved on since
+    order.order_status = event.to_status
+
+    if STATUS_EMAIL not in event.delivered:
+        if not send_order_status_change_email(order):
+            raise RuntimeError(f"Status email to {order.email} failed")
+        _mark_delivered(event, STATUS_EMAIL)
+    if event.to_status == DISPATCHED and DISPATCH_EMAIL not in event.delivered:
+        if not send_order_dispatched_email(order):
+            raise RuntimeError(f"Dispatch email to {order.email} failed")
+        _mark_delivered(event, DISPATCH_EMAIL)
+
+    message = order.phone_number and _whatsapp_message(order, store_phone)
+    if message and WHATSAPP not in event.delivered:
+        result = send_whatsapp_message(order.phone_number, message)
+        logger.info(f"WhatsApp [status_{event.to_status} #{order.id}]: {result}")
+        _mark_delivered(event, WHATSAPP)
+
+
+def _claimable(now):
+    return Q(status='pending') | Q(status='sending', claimed_at__lt=now - CLAIM_TIMEOUT)
+
+
+def deliver_pending(limit=DELIVERY_BATCH_SIZE):
+    """
+    Deliver waiting events, oldest first. Each is claimed with a conditional
+    UPDATE, so concurrent runners never send the same one. Returns
+    (sent, failed).
+    """
+    ids = list(
+        OrderEvent.objects.filter(_claimable(timezone.now()))
+        .order_by('created_at').values_list('pk', flat=True)[:limit]
+    )
+    if not ids:
+        return 0, 0
+
+    try:
+        store_phone = StoreSettings.get_settings().store_phone
+    except Exception:
+        store_phone = '+254 700 000 000'
+
+    sent = failed = 0
+    for pk in ids:
+        now = timezone.now()
+        claimed = OrderEvent.objects.filter(_claimable(now), pk=pk).update(
+            status='sending', claimed_at=now, attempts=F('attempts') + 1,
+        )
+        if not claimed:
+            continue
+
+        event = OrderEvent.objects.select_related('order').get(pk=pk)
+        try:
+            notify(event, store_phone)
+        except Exception as e:
+            failed += 1
+            status = 'failed' if event.attempts >= MAX_ATTEMPTS else 'pending'
+            OrderEvent.objects.filter(pk=pk).update(status=status, last_error=str(e)[:2000])
+            logger.error(f"Order #{event.order_id} {event.to_status} notification failed (attempt {event.attempts}): {e}")
+        else:
+            sent += 1
+            OrderEvent.objects.filter(pk=pk).update(status='sent', sent_at=timezone.now(), last_error='')
+    return sent, failed
@@ -0,0 +1,205 @@
+"""
+One-time passcodes for signup email verification and WhatsApp linking.
+
+Codes live in the shared cache, never in the session or the database: only
+an HMAC of the code is stored, with a TTL and a cap on wrong guesses, and
+checked with a constant-time compare. Issuing is rate limited per identity
+(email / phone) and per client IP with sliding windows. Delivery is queued
+on parlour.background so the request returns without waiting for SMTP or
+the WhatsApp service.
+"""
+import hashlib
+import hmac
+import logging
+import secrets
+import sys
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .background import run_in_background
+
+logger = logging.getLogger(__name__)
+
+OTP_LENGTH = 6
+OTP_TTL = getattr(settings, 'OTP_TTL_SECONDS', 10 * 60)
+OTP_MAX_ATTEMPTS = getattr(settings, 'OTP_MAX_ATTEMPTS', 5)
+
+# Codes never go into log records; this prints an undeliverable one for local dev
+OTP_DEV_ECHO = getattr(settings, 'OTP_DEV_ECHO', False)
+
+# (max sends, window seconds)
+OTP_IDENTITY_LIMIT = getattr(settings, 'OTP_IDENTITY_RATE_LIMIT', (3, 10 * 60))
+OTP_IP_LIMIT = getattr(settings, 'OTP_IP_RATE_LIMIT', (10, 60 * 60))
+
+PURPOSE_SIGNUP = 'signup'
+PURPOSE_WHATSAPP = 'whatsapp'
+
+
+class OTPRateLimited(Exception):
+    def __init__(self, retry_after):
+        self.retry_after = max(int(retry_after), 1)
+        super().__init__(f"Too many codes requested — retry in {self.retry_after}s")
+
+    @property
+    def retry_minutes(self):
+        return max(1, -(-self.retry_after // 60))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Rate limiting — sliding window of send timestamps per key
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _ratelimit_key(scope, value):
+    digest = hashlib.sha256(str(value).lower().encode()).hexdigest()[:32]
+    return f"otp:rl:{scope}:{digest}"
+
+
+def _check_window(key, limit, window, now):
+    """Timestamps still inside the window; raises if the window is full."""
+    stamps = [t for t in cache.get(key, []) if t > now - window]
+    if len(stamps) >= limit:
+        raise OTPRateLimited(stamps[0] + window - now)
+    return stamps
+
+
+def _hit(purpose, identity, ip):
+    now = time.time()
+    windows = [(_ratelimit_key(purpose, identity), *OTP_IDENTITY_LIMIT)]
+    if ip:
+        windows.append((_ratelimit_key('ip', ip), *OTP_IP_LIMIT))
+
+    # Check every window before recording in any of them
+    checked = [(key, window, _check_window(key, limit, window, now)) for key, limit, window in windows]
+    for key, window, stamps in checked:
+        cache.set(key, stamps + [now], window)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Store
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _code_key(purpose, identity):
+    digest = hashlib.sha256(str(identity).lower().encode()).hexdigest()[:32]
+    return f"otp:code:{purpose}:{digest}"
+
+
+def _digest(purpose, identity, code):
+    message = f"{purpose}:{str(identity).lower()}:{code}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def generate_code():
+    return ''.join(secrets.choice('0123456789') for _ in range(OTP_LENGTH))
+
+
+def issue(purpose, identity, ip=None):
+    """
+    Create a fresh code for (purpose, identity), replacing any earlier one.
+    Raises OTPRateLimited when the identity or IP has asked too often.
+    """
+    _hit(purpose, identity, ip)
+    code = generate_code()
+    cache.set(_code_key(purpose, identity), {'digest': _digest(purpose, identity, code), 'attempts': 0}, OTP_TTL)
+    return code
+
+
+def verify(purpose, identity, code):
+    """
+    True if code is the live code for (purpose, identity). A correct code
+    is consumed; after OTP_MAX_ATTEMPTS wrong ones the code is dropped.
+    """
+    key = _code_key(purpose, identity)
+    entry = cache.get(key)
+    if not entry:
+        return False
+
+    if hmac.compare_digest(entry['digest'], _digest(purpose, identity, (code or '').strip())):
+        cache.delete(key)
+        return True
+
+    entry['attempts'] += 1
+    if entry['attempts'] >= OTP_MAX_ATTEMPTS:
+        cache.delete(key)
+    else:
+        cache.set(key, entry, OTP_TTL)
+    return False
+
+
+def has_live_code(purpose, identity):
+    return cache.get(_code_key(purpose, identity)) is not None
+
+
+def discard(purpose, identity):
+    cache.delete(_code_key(purpose, identity))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Delivery — queued, never on the request thread
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _dev_echo(identity, code):
+    if OTP_DEV_ECHO:
+        print(f"[dev] OTP for {identity}: {code}", file=sys.stderr)
+
+
+def _deliver_email(email, username, code):
+    from .email_utils import build_email
+
+    context = {'username': username, 'otp': code, 'ttl_minutes': OTP_TTL // 60}
+    message = build_email('otp', context, subject="Your OTP Verification Code - Qunimart", to=[email])
+    try:
+        message.send(fail_silently=False)
+        logger.info(f"OTP email sent to {email}")
+    except Exception as e:
+        logger.error(f"Failed to send OTP email to {email}: {e}")
+        _dev_echo(email, code)
+
+
+def _whatsapp_message(name, code):
+    return (
+        f"Hi {name}! "
+        f"Your Qunimart verification code is: *{code}*\n\n"
+        f"This code expires in {OTP_TTL // 60} minutes. Do not share it with anyone."
+    )
+
+
+def _whatsapp_result(phone, code, result):
+    if not result.get('success'):
+        logger.error(f"Failed to send WhatsApp OTP to {phone}: {result.get('error')}")
+        _dev_echo(phone, code)
+        return False
+    return True
+
+
+def _deliver_whatsapp(phone, name, code):
+    from whatsapphoka.service import send_whatsapp_message
+
+    result = send_whatsapp_message(phone, _whatsapp_message(name, code))
+    _whatsapp_result(phone, code, result)
+
+
+def send_email_code(email, username, code):
+    run_in_background(_deliver_email, email, username, code)
+
+
+def send_whatsapp_code(phone, name, code):
+    run_in_background(_deliver_whatsapp, phone, name, code)
+
+
+async def asend_whatsapp_code(phone, name, code):
+    """Send the code from an async view, awaiting the WhatsApp service. Returns True if it was accepted."""
+    from whatsapphoka.service import asend_whatsapp_message
+
+    result = await asend_whatsapp_message(phone, _whatsapp_message(name, code))
+    return _whatsapp_result(phone, code, result)
+
+
+def client_ip(request):
+    # Behind the proxy the last X-Forwarded-For hop is the one it added;
+    # earlier entries are whatever the client chose to send
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded:
+        return forwarded.split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR')
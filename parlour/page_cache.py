@@ -0,0 +1,195 @@
+"""
+Shared-cache layer for anonymous storefront pages.
+
+Anonymous GETs of the decorated views are served from the default cache.
+Each cached page depends on a set of tags ('product', 'ads', 'category',
+'settings'); saving or deleting a model bumps its tag's version, which
+changes the cache key of every page that depends on it. A version records
+when it was issued, so the same counters date the catalog API's responses
+(see parlour.api).
+
+Pages are rendered with a placeholder instead of the CSRF token and the
+current visitor's token is swapped in on the way out, so one cached copy
+can be served to everyone.
+"""
+import hashlib
+import logging
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_TIMEOUT = getattr(settings, 'STOREFRONT_PAGE_CACHE_TIMEOUT', 60 * 10)
+CSRF_PLACEHOLDER = 'storefront-csrf-token-placeholder'
+
+TAG_PRODUCT = 'product'
+TAG_ADS = 'ads'
+TAG_CATEGORY = 'category'
+TAG_SETTINGS = 'settings'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Tag versions
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _tag_key(tag):
+    return f"storefront:tag:{tag}"
+
+
+def _new_version():
+    return f"{int(time.time())}.{uuid.uuid4().hex[:8]}"
+
+
+def version_time(version):
+    """When a tag version was issued (aware UTC datetime), or None if it doesn't say."""
+    issued, dot, _ = str(version).partition('.')
+    if not dot or not issued.isdigit():
+        return None
+    return datetime.fromtimestamp(int(issued), tz=dt_timezone.utc)
+
+
+def tag_versions(*tags):
+    """Current version string for each tag, creating missing ones."""
+    keys = {_tag_key(tag): tag for tag in tags}
+    found = cache.get_many(keys.keys())
+    versions = {}
+    for key, tag in keys.items():
+        version = found.get(key)
+        if version is None:
+            version = _new_version()
+            cache.add(key, version, None)
+            version = cache.get(key, version)
+        versions[tag] = version
+    return versions
+
+
+def tag_version(tag):
+    return tag_versions(tag)[tag]
+
+
+def invalidate(*tags):
+    """Give each tag a new version; pages cached under the old one expire unused."""
+    cache.set_many({_tag_key(tag): _new_version() for tag in tags}, None)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Request helpers
+# ─────────────────────────────────────────────────────────────────────────────
+
+def device_class(request):
+    """'mobile', 'tablet' or 'desktop' from the User-Agent (cached on the request)."""
+    cached = getattr(request, '_device_class', None)
+    if cached:
+        return cached
+
+    result = device_class_for_agent(request.META.get('HTTP_USER_AGENT', ''))
+    request._device_class = result
+    return result
+
+
+def device_class_for_agent(user_agent):
+    """Same classification for a stored User-Agent string (ad analytics)."""
+    user_agent = (user_agent or '').lower()
+    if any(x in user_agent for x in ['ipad', 'tablet']):
+        return 'tablet'
+    if any(x in user_agent for x in ['mobile', 'android', 'iphone', 'phone']):
+        return 'mobile'
+    return 'desktop'
+
+
+def _is_cacheable(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # Pending flash messages are rendered into the page — never cache those
+    if 'messages' in request.COOKIES or '_messages' in request.session:
+        return False
+    return True
+
+
+def _page_key(request, tags, vary_on_device, query_params):
+    cart = request.session.get('cart', {})
+    # Only the parameters the view reads: tracking or junk query strings share the page's entry
+    query = sorted((name, request.GET.get(name)) for name in query_params if request.GET.get(name))
+    parts = [
+        request.build_absolute_uri(request.path),
+        urlencode(query),
+        str(timezone.localdate()),
+        str(sum(item['quantity'] for item in cart.values())),
+    ]
+    if vary_on_device:
+        parts.append(device_class(request))
+    parts.extend(f"{tag}={version}" for tag, version in sorted(tag_versions(*tags).items()))
+
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f"storefront:page:{digest}"
+
+
+def _fill_csrf(request, response):
+    placeholder = CSRF_PLACEHOLDER.encode()
+    if placeholder in response.content:
+        response.content = response.content.replace(placeholder, get_token(request).encode())
+    return response
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Decorator
+# ─────────────────────────────────────────────────────────────────────────────
+
+def cache_anonymous_page(*tags, timeout=None, vary_on_device=False, query_params=(), on_hit=None):
+    """
+    Serve anonymous GETs of a view from the shared cache.
+
+    tags            invalidate the page when any of these tags is bumped
+    vary_on_device  keep separate copies for mobile / tablet / desktop
+    query_params    the GET parameters the view reads; the rest of the
+                    query string doesn't change the cached copy
+    on_hit          callable(request, meta) for side effects that must still
+                    happen on a cache hit; meta is whatever the view set on
+                    response.page_cache_meta
+    """
+    timeout = PAGE_CACHE_TIMEOUT if timeout is None else timeout
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _is_cacheable(request):
+                return view(request, *args, **kwargs)
+
+            key = _page_key(request, tags, vary_on_device, query_params)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type, meta = cached
+                if on_hit:
+                    try:
+                        on_hit(request, meta)
+                    except Exception as e:
+                        logger.error(f"Page cache on_hit failed for {request.path}: {e}")
+                response = HttpResponse(content, content_type=content_type)
+                response['X-Page-Cache'] = 'hit'
+                return _fill_csrf(request, response)
+
+            request._storefront_page_render = True
+            response = view(request, *args, **kwargs)
+
+            if response.status_code == 200 and not response.streaming:
+                cache.set(
+                    key,
+                    (response.content, response['Content-Type'], getattr(response, 'page_cache_meta', None)),
+                    timeout,
+                )
+                response['X-Page-Cache'] = 'miss'
+            return _fill_csrf(request, response)
+
+        return wrapper
+    return decorator
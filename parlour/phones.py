@@ -0,0 +1,33 @@
+"""
+Phone numbers in one canonical form.
+
+normalize_phone() turns any way a Kenyan number is typed — 0712 345 678,
++254712345678, 254-712-345678, 712345678, +254 0712... — into its digits
+in international form, 254712345678. That is what the WhatsApp service and
+Daraja expect, what Customer.phone stores, and what two numbers are compared
+by. e164() adds the leading + for Lipana. Numbers from elsewhere are left as
+their digits.
+"""
+
+
+def normalize_phone(phone):
+    """Digits in 254XXXXXXXXX form for a Kenyan number; other numbers as bare digits."""
+    digits = ''.join(ch for ch in str(phone or '') if ch.isdigit())
+    if digits.startswith('2540') and len(digits) == 13:
+        return '254' + digits[4:]
+    if digits.startswith('0'):
+        return '254' + digits[1:]
+    if len(digits) == 9 and digits[0] in '17':
+        return '254' + digits
+    return digits
+
+
+def e164(phone):
+    """normalize_phone() with the leading +, or '' for no number."""
+    digits = normalize_phone(phone)
+    return f"+{digits}" if digits else ''
+
+
+def same_number(a, b):
+    a = normalize_phone(a)
+    return bool(a) and a == normalize_phone(b)
@@ -0,0 +1,278 @@
+"""
+Product pricing.
+
+A user's promo state is read once per request into a PromoContext (one
+PromoUsage lookup, cached on the request and exposed to templates as
+`promo`). Products are priced against it with quote() / quote_products(),
+which return immutable Quotes. A cart is priced with quote_cart(), which
+gives promo prices to at most the user's remaining promo purchases and
+charges the rest at list price. Each cart line carries a signed token
+binding the product, its prices, how many units are promo-priced and the
+user, so the session cart stores tokens rather than bare price strings:
+cart and checkout re-quote every line from the database in one query, and
+the order-creation paths only accept line prices whose token verifies,
+falling back to the product's list price otherwise. They also re-check the
+promo (PromoBudget), so a promo used up since the quote isn't honoured.
+
+The derived catalogue prices (anchor and promo discount) are also worked
+out here; Product.apply_derived_fields() calls derived_prices().
+"""
+import logging
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from django.core import signing
+
+logger = logging.getLogger(__name__)
+
+# Promo-priced products per referred user
+PROMO_LIMIT = 5
+
+# Crossed-out "original" price, as a multiple of the selling price
+ANCHOR_MARKUP = Decimal('1.20')
+# Share of the per-item profit given back as the promo discount
+PROMO_PROFIT_SHARE = Decimal('0.10')
+# Promo price when the product's profit can't be worked out
+FALLBACK_PROMO_RATE = Decimal('0.95')
+
+CENTS = Decimal('0.01')
+
+_TOKEN_SALT = 'parlour.pricing.quote'
+# Quotes older than this are re-priced rather than honoured
+QUOTE_MAX_AGE = 60 * 60 * 24
+
+
+def derived_prices(price, profit):
+    """(anchor_price, discount_price) for a selling price and per-item profit (None if unknown)."""
+    anchor = (price * ANCHOR_MARKUP).quantize(CENTS)
+    if profit is not None:
+        discount = (price - profit * PROMO_PROFIT_SHARE).quantize(CENTS)
+    else:
+        discount = (price * FALLBACK_PROMO_RATE).quantize(CENTS)
+    return anchor, discount
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Promo state — once per request
+# ─────────────────────────────────────────────────────────────────────────────
+
+class PromoContext:
+    """A user's promo standing. Attributes only, so templates can use it freely."""
+    __slots__ = ('user_id', 'active', 'remaining', 'purchases')
+
+    def __init__(self, user_id=None, usage=None):
+        self.user_id = user_id
+        self.purchases = usage.promo_purchases_count if usage else 0
+        self.active = bool(usage and usage.is_active and usage.promo_purchases_count < PROMO_LIMIT)
+        # Shown while the promo is switched on, even once it's used up
+        self.remaining = max(0, PROMO_LIMIT - usage.promo_purchases_count) if usage and usage.is_active else None
+
+    def __bool__(self):
+        return self.active
+
+    @property
+    def cache_key(self):
+        return f"{int(self.active)}.{self.remaining}"
+
+
+NO_PROMO = PromoContext()
+
+
+def promo_for_user(user):
+    from .models import PromoUsage
+
+    if user is None or not user.is_authenticated:
+        return NO_PROMO
+    usage = PromoUsage.objects.filter(user_id=user.pk).first()
+    return PromoContext(user.pk, usage)
+
+
+def promo_for_request(request):
+    """The request user's PromoContext, computed on first use."""
+    promo = getattr(request, '_promo_context', None)
+    if promo is None:
+        promo = request._promo_context = promo_for_user(getattr(request, 'user', None))
+    return promo
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Quotes
+# ─────────────────────────────────────────────────────────────────────────────
+
+class Quote(namedtuple('Quote', 'product_id price list_price anchor_price is_promo user_id')):
+    """The unit price one user pays for one product."""
+    __slots__ = ()
+
+    @property
+    def has_discount(self):
+        return bool(self.anchor_price and self.anchor_price > self.price)
+
+
+def quote(product, promo=NO_PROMO):
+    price = product.price
+    if promo.active and product.discount_price:
+        price = product.discount_price
+    return Quote(product.id, price, product.price, product.anchor_price, price < product.price, promo.user_id)
+
+
+def quote_products(products, promo=NO_PROMO):
+    """{product id: Quote} for a list of products, in one pass."""
+    return {product.id: quote(product, promo) for product in products}
+
+
+def display_prices(product, promo=NO_PROMO):
+    """Price info for the product page."""
+    q = quote(product, promo)
+    return {
+        'price': q.price,
+        'anchor_price': q.anchor_price if q.has_discount else None,
+        'has_discount': q.has_discount,
+        'promo_remaining': promo.remaining,
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Order time
+# ─────────────────────────────────────────────────────────────────────────────
+
+class PromoBudget:
+    """A user's remaining promo purchases at order time, shared by the lines of one order."""
+
+    def __init__(self, user_id=None):
+        from .models import PromoUsage
+
+        usage = PromoUsage.objects.filter(user_id=user_id).first() if user_id else None
+        promo = PromoContext(user_id, usage)
+        self.user_id = user_id
+        self.remaining = promo.remaining if promo.active else 0
+
+    def take(self, quantity):
+        taken = min(quantity, self.remaining)
+        self.remaining -= taken
+        return taken
+
+
+def _read_token(token, product, user_id):
+    """(list price, promo price, promo units) from a cart line's token, or None if it doesn't verify."""
+    try:
+        fields = signing.loads(token, salt=_TOKEN_SALT, max_age=QUOTE_MAX_AGE)
+        if len(fields) == 3:
+            # A token from before promo units were capped: only the unit price
+            product_id, price, quoted_user = fields
+            promo_price, promo_units = Decimal(price), None
+            list_price = max(promo_price, product.price)
+        else:
+            product_id, list_price, promo_price, promo_units, quoted_user = fields
+            list_price, promo_price = Decimal(list_price), Decimal(promo_price)
+        if product_id == product.id and quoted_user == user_id:
+            return list_price, promo_price, promo_units
+    except (signing.BadSignature, ValueError, TypeError, InvalidOperation):
+        pass
+    return None
+
+
+def verified_prices(line, product, budget):
+    """
+    [(quantity, unit price), ...] for a cart line at order time. A genuine,
+    recent token for this product and user gives its quoted prices, with
+    promo prices for no more units than it quoted and the budget has left;
+    everything else is charged the product's current list price.
+    """
+    quantity = line['quantity']
+    token = line.get('quote')
+    quoted = _read_token(token, product, budget.user_id) if token else None
+    if quoted is None:
+        logger.warning(f"Cart line for product #{product.id} has no valid quote — charging list price")
+        return [(quantity, product.price)]
+
+    list_price, promo_price, promo_units = quoted
+    if promo_price >= list_price:
+        return [(quantity, list_price)]
+    promo = budget.take(quantity if promo_units is None else min(promo_units, quantity))
+    return [(units, price) for units, price in ((promo, promo_price), (quantity - promo, list_price)) if units]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Session cart
+# ─────────────────────────────────────────────────────────────────────────────
+
+# quote: the unit Quote; promo_quantity: how many units get quote.price, the rest pay list price
+CartLine = namedtuple('CartLine', 'key product quantity size quote promo_quantity subtotal')
+
+
+class CartQuote:
+    def __init__(self, lines, missing, changed, resplit):
+        self.lines = lines
+        self.missing = missing    # cart keys whose product is gone
+        self.changed = changed    # cart keys whose price moved since it was added
+        self.resplit = resplit    # cart keys whose number of promo-priced units changed
+        self.total = sum((line.subtotal for line in lines), Decimal('0.00'))
+        self.quantity = sum(line.quantity for line in lines)
+
+
+def quote_cart(cart, promo=NO_PROMO):
+    """
+    Re-price every line of a session cart against the database — one
+    product query. Promo prices go to the first promo.remaining units, in
+    cart order; the rest of the cart pays list price.
+    """
+    from .models import Product
+
+    products = Product.objects.in_bulk([item['product_id'] for item in cart.values()])
+    budget = promo.remaining if promo.active else 0
+    lines, missing, changed, resplit = [], [], [], []
+    for key, item in cart.items():
+        product = products.get(int(item['product_id']))
+        if product is None:
+            missing.append(key)
+            continue
+        quantity = item['quantity']
+        q = quote(product, promo)
+        promo_quantity = 0
+        if q.is_promo:
+            promo_quantity = min(quantity, budget)
+            budget -= promo_quantity
+            if not promo_quantity:
+                q = q._replace(price=q.list_price, is_promo=False)
+        if str(q.price) != str(item.get('price')):
+            changed.append(key)
+        elif promo_quantity != item.get('promo_quantity'):
+            resplit.append(key)
+        subtotal = q.price * promo_quantity + q.list_price * (quantity - promo_quantity) if q.is_promo else q.price * quantity
+        lines.append(CartLine(key, product, quantity, item['size'], q, promo_quantity, subtotal))
+    return CartQuote(lines, missing, changed, resplit)
+
+
+def line_token(q, promo_quantity):
+    """Signed (product, list price, quoted price, promo units, user) for one cart line."""
+    return signing.dumps(
+        [q.product_id, str(q.list_price), str(q.price), promo_quantity, q.user_id], salt=_TOKEN_SALT,
+    )
+
+
+def cart_item(product, quantity, size, q, promo_quantity=None):
+    """
+    The session representation of one cart line. promo_quantity defaults to
+    every unit of a promo quote; quote_cart() caps it.
+    """
+    if promo_quantity is None:
+        promo_quantity = quantity if q.is_promo else 0
+    return {
+        'product_id': product.id,
+        'name': product.name,
+        'price': str(q.price),
+        'original_price': str(q.list_price),
+        'is_promo_price': q.is_promo,
+        'promo_quantity': promo_quantity,
+        'quote': line_token(q, promo_quantity),
+        'quantity': quantity,
+        'size': size,
+    }
+
+
+def refresh_cart(cart, cart_quote):
+    """The session cart rebuilt from a CartQuote: current prices and fresh tokens."""
+    return {
+        line.key: cart_item(line.product, line.quantity, line.size, line.quote, line.promo_quantity)
+        for line in cart_quote.lines
+    }
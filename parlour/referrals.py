@@ -0,0 +1,202 @@
+"""
+Referral accounting: promo purchases and the agents they're credited to.
+
+A referred user gets pricing.PROMO_LIMIT products at the promo price. Those
+purchases are counted when an order is materialized from a successful
+checkout — never at checkout itself, so an abandoned payment costs nothing.
+record_order() is called by every order-creation path. It consumes the
+order's promo-priced units from the user's PromoUsage with one conditional
+UPDATE (compare-and-set on the count, which a check constraint keeps within
+the limit), and appends a ReferralEntry for the order. The entry's
+unique order makes a repeated call a no-op. Agent.total_referrals is
+moved by the same amount with an F() update.
+
+The ledger is the source of truth; the two counters are running totals of
+it that reconcile() (`manage.py reconcile_referrals`) rebuilds. The agent
+dashboard reads agent_stats(), one aggregate query cached per agent until
+the agent's referrals change.
+"""
+import logging
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Agent, OrderItem, PromoUsage, ReferralEntry
+from .pricing import PROMO_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# Compare-and-set attempts before giving up on a contended PromoUsage row
+CONSUME_ATTEMPTS = 5
+
+STATS_CACHE_TIMEOUT = 60 * 60
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Recording orders
+# ─────────────────────────────────────────────────────────────────────────────
+
+def promo_unit_prices(order):
+    """
+    The unit price of every promo-priced unit in an order, highest first.
+    A unit is promo-priced when it was charged below the product's list
+    price — the same test as pricing.Quote.is_promo.
+    """
+    prices = []
+    items = OrderItem.objects.filter(order=order).values_list('quantity', 'price', 'product__price')
+    for quantity, price, list_price in items:
+        if price < list_price:
+            prices.extend([price] * quantity)
+    return sorted(prices, reverse=True)
+
+
+def _consume(user_id, units):
+    """
+    Take up to `units` promo purchases from the user's PromoUsage.
+    Returns (agent id, units taken), or None when nothing was left to take.
+    """
+    for _ in range(CONSUME_ATTEMPTS):
+        usage = (
+            PromoUsage.objects.filter(user_id=user_id, is_active=True)
+            .values('pk', 'agent_id', 'promo_purchases_count').first()
+        )
+        if usage is None:
+            return None
+        used = usage['promo_purchases_count']
+        taken = min(units, PROMO_LIMIT - used)
+        if taken <= 0:
+            return None
+        # Only applies if nobody else consumed in between; otherwise re-read and retry
+        updated = PromoUsage.objects.filter(
+            pk=usage['pk'], is_active=True, promo_purchases_count=used,
+        ).update(
+            promo_purchases_count=used + taken,
+            is_active=used + taken < PROMO_LIMIT,
+        )
+        if updated:
+            return usage['agent_id'], taken
+    logger.warning(f"Gave up consuming promo purchases for user #{user_id} after {CONSUME_ATTEMPTS} attempts")
+    return None
+
+
+def record_order(order, user_id):
+    """
+    Count a newly created order's promo purchases against its user's promo
+    and credit them to the referring agent. Returns the ReferralEntry, or
+    None when there was nothing to record.
+    """
+    if not user_id:
+        return None
+    prices = promo_unit_prices(order)
+    if not prices:
+        return None
+
+    try:
+        with transaction.atomic():
+            consumed = _consume(user_id, len(prices))
+            if consumed is None:
+                return None
+            agent_id, taken = consumed
+            # Raises IntegrityError, rolling back the consumption, if the order is already recorded
+            entry = ReferralEntry.objects.create(
+                user_id=user_id,
+                agent_id=agent_id,
+                order=order,
+                units=taken,
+                promo_sales=sum(prices[:taken], Decimal('0.00')),
+            )
+            if agent_id:
+                Agent.objects.filter(pk=agent_id).update(total_referrals=F('total_referrals') + taken)
+    except IntegrityError:
+        logger.info(f"Order #{order.pk} already has a referral entry")
+        return None
+
+    if agent_id:
+        transaction.on_commit(lambda: invalidate_agent(agent_id))
+    logger.info(f"Order #{order.pk}: {taken} promo unit(s) for user #{user_id}, agent #{agent_id}")
+    return entry
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Agent dashboard aggregates
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _stats_key(agent_id):
+    return f"referrals:agent:{agent_id}"
+
+
+def invalidate_agent(agent_id):
+    if agent_id:
+        cache.delete(_stats_key(agent_id))
+
+
+def agent_stats(agent_id):
+    """
+    {'users', 'active', 'completed', 'units', 'orders', 'sales'} for one agent:
+    users referred, those with promo purchases left and used up, promo units
+    sold, orders and promo sales. Cached until the agent's referrals change.
+    """
+    key = _stats_key(agent_id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = PromoUsage.objects.filter(agent_id=agent_id).aggregate(
+            users=Count('pk'),
+            active=Count('pk', filter=Q(is_active=True)),
+            completed=Count('pk', filter=Q(is_active=False)),
+        )
+        stats.update(ReferralEntry.objects.filter(agent_id=agent_id).aggregate(
+            units=Coalesce(Sum('units'), 0),
+            orders=Count('order'),
+            sales=Coalesce(Sum('promo_sales'), Decimal('0.00')),
+        ))
+        cache.set(key, stats, STATS_CACHE_TIMEOUT)
+    return stats
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Reconciliation
+# ─────────────────────────────────────────────────────────────────────────────
+
+def reconcile(dry_run=False):
+    """
+    Rebuild PromoUsage.promo_purchases_count / is_active and
+    Agent.total_referrals from the ledger. Returns (usages fixed, agents fixed).
+    """
+    units_by_user = dict(
+        ReferralEntry.objects.values('user_id').annotate(total=Sum('units')).values_list('user_id', 'total')
+    )
+    units_by_agent = dict(
+        ReferralEntry.objects.exclude(agent=None)
+        .values('agent_id').annotate(total=Sum('units')).values_list('agent_id', 'total')
+    )
+
+    usages = []
+    for usage in PromoUsage.objects.only('pk', 'user_id', 'agent_id', 'promo_purchases_count', 'is_active'):
+        count = min(units_by_user.get(usage.user_id, 0), PROMO_LIMIT)
+        is_active = count < PROMO_LIMIT
+        if (usage.promo_purchases_count, usage.is_active) != (count, is_active):
+            logger.info(
+                f"PromoUsage #{usage.pk}: {usage.promo_purchases_count} → {count} promo purchase(s), "
+                f"{'active' if is_active else 'used up'}"
+            )
+            usage.promo_purchases_count, usage.is_active = count, is_active
+            usages.append(usage)
+
+    agents = []
+    for agent in Agent.objects.only('pk', 'total_referrals'):
+        total = units_by_agent.get(agent.pk, 0)
+        if agent.total_referrals != total:
+            logger.info(f"Agent #{agent.pk}: total_referrals {agent.total_referrals} → {total}")
+            agent.total_referrals = total
+            agents.append(agent)
+
+    if not dry_run:
+        with transaction.atomic():
+            PromoUsage.objects.bulk_update(usages, ['promo_purchases_count', 'is_active'], batch_size=500)
+            Agent.objects.bulk_update(agents, ['total_referrals'], batch_size=500)
+        for agent_id in {usage.agent_id for usage in usages} | {agent.pk for agent in agents}:
+            invalidate_agent(agent_id)
+    return len(usages), len(agents)
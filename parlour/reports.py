@@ -0,0 +1,201 @@
+"""
+Order reports — daily, weekly and monthly.
+
+A report is one pass over one query: the period's orders annotated with
+their item count and total, with the items and products prefetched for the
+items column. Rows are streamed with iterator(), so the prefetch runs once
+per chunk and memory stays flat on a busy day. The same pass writes the CSV
+attachment (every order), adds up the headline figures and keeps the first
+REPORT_EMAIL_ROW_LIMIT rows for the email body. Reports read from the
+replica when one is configured (hokasparlour.db_router).
+"""
+import calendar
+import csv
+import io
+import logging
+from collections import Counter
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models
+from django.db.models import F, Prefetch, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from hokasparlour.db_router import reporting
+
+from .email_utils import build_email, send_emails
+from .models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+MONEY = models.DecimalField(max_digits=12, decimal_places=2)
+ZERO = Decimal('0.00')
+
+DAILY = 'daily'
+WEEKLY = 'weekly'
+MONTHLY = 'monthly'
+PERIODS = (DAILY, WEEKLY, MONTHLY)
+
+RECIPIENTS = getattr(settings, 'ORDER_REPORT_RECIPIENTS', ['hokasparlour@gmail.com'])
+
+# Orders listed in the email itself; the CSV always has all of them
+EMAIL_ROW_LIMIT = getattr(settings, 'REPORT_EMAIL_ROW_LIMIT', 200)
+
+CHUNK_SIZE = 500
+
+CSV_HEADER = [
+    'order_id', 'created_at', 'customer_name', 'phone_number', 'email',
+    'items', 'item_count', 'total', 'is_paid', 'order_status', 'delivery_location',
+]
+
+
+def period_bounds(period, day):
+    """(first day, day after the last) of the daily / weekly / monthly period containing day."""
+    if period == DAILY:
+        return day, day + timedelta(days=1)
+    if period == WEEKLY:
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    if period == MONTHLY:
+        start = day.replace(day=1)
+        return start, start + timedelta(days=calendar.monthrange(day.year, day.month)[1])
+    raise ValueError(f"Unknown report period: {period}")
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def report_queryset(start, end):
+    """Orders placed in [start, end) with item_count and total annotated, items prefetched."""
+    return (
+        Order.objects.filter(created_at__gte=_day_start(start), created_at__lt=_day_start(end))
+        .annotate(
+            item_count=Coalesce(Sum('orderitem__quantity'), 0),
+            total=Coalesce(
+                Sum(F('orderitem__price') * F('orderitem__quantity'), output_field=MONEY),
+                ZERO,
+                output_field=MONEY,
+            ),
+        )
+        .prefetch_related(Prefetch(
+            'orderitem_set',
+            queryset=OrderItem.objects.select_related('product').only(
+                'order_id', 'quantity', 'size', 'product__name',
+            ),
+        ))
+        .order_by('-created_at')
+    )
+
+
+def _items_summary(order):
+    return ", ".join(f"{item.product.name} x{item.quantity} ({item.size})" for item in order.orderitem_set.all())
+
+
+class OrderReport:
+    def __init__(self, period, start, end):
+        self.period = period
+        self.start = start
+        self.end = end
+        self.rows = []
+        self.truncated = False
+        self.total_orders = 0
+        self.paid_orders = 0
+        self.items_sold = 0
+        self.total_revenue = ZERO
+        self.paid_revenue = ZERO
+        self.by_status = Counter()
+        self.csv = ''
+
+    @property
+    def last_day(self):
+        return self.end - timedelta(days=1)
+
+    @property
+    def label(self):
+        if self.period == DAILY:
+            return self.start.strftime('%B %d, %Y')
+        if self.period == MONTHLY:
+            return self.start.strftime('%B %Y')
+        return f"{self.start.strftime('%b %d')} – {self.last_day.strftime('%b %d, %Y')}"
+
+    @property
+    def title(self):
+        return f"{self.period.title()} Orders Report"
+
+    @property
+    def filename(self):
+        return f"orders-{self.period}-{self.start.isoformat()}.csv"
+
+
+@reporting()
+def build_report(period, day=None):
+    """The OrderReport for the period containing day (default today)."""
+    day = day or timezone.localdate()
+    start, end = period_bounds(period, day)
+    report = OrderReport(period, start, end)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+
+    for order in report_queryset(start, end).iterator(chunk_size=CHUNK_SIZE):
+        items = _items_summary(order)
+        created_at = timezone.localtime(order.created_at)
+        writer.writerow([
+            order.id, created_at.strftime('%Y-%m-%d %H:%M'), order.customer_name, order.phone_number,
+            order.email, items, order.item_count, order.total, 'yes' if order.is_paid else 'no',
+            order.order_status, order.delivery_location,
+        ])
+
+        report.total_orders += 1
+        report.items_sold += order.item_count
+        report.total_revenue += order.total
+        report.by_status[order.order_status] += 1
+        if order.is_paid:
+            report.paid_orders += 1
+            report.paid_revenue += order.total
+
+        if len(report.rows) < EMAIL_ROW_LIMIT:
+            report.rows.append({'order': order, 'items': items, 'total': order.total})
+        else:
+            report.truncated = True
+
+    report.csv = buffer.getvalue()
+    return report
+
+
+def build_report_email(report, to=None):
+    context = {
+        'report': report,
+        'rows': report.rows,
+        'status_counts': [
+            (label, report.by_status.get(code, 0)) for code, label in Order.STATUS_CHOICES
+        ],
+    }
+    message = build_email(
+        'order_report', context,
+        subject=f"📦 {report.title} — {report.label} ({report.total_orders} orders)",
+        to=to or RECIPIENTS,
+    )
+    message.attach(report.filename, report.csv, 'text/csv')
+    return message
+
+
+def send_report(period, day=None, to=None):
+    """Build and email one report. Returns the report."""
+    report = build_report(period, day)
+    send_emails([build_report_email(report, to)])
+    logger.info(
+        f"{report.title} sent for {report.label}: {report.total_orders} orders, KSH {report.total_revenue}"
+    )
+    return report
+
+
+def previous_period_day(period, today=None):
+    """A day inside the last complete week / month before today."""
+    today = today or timezone.localdate()
+    start, _ = period_bounds(period, today)
+    return start - timedelta(days=1)
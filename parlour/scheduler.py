@@ -1,141 +1,359 @@
+"""
+Periodic maintenance jobs.
+
+The scheduler runs in its own process — `manage.py run_scheduler` — rather
+than inside the web workers. Several of those processes may be up at once:
+they elect a leader through a lease row in the database (SchedulerLease),
+taken and renewed with a conditional UPDATE, and only the leader runs jobs.
+A standby takes over once the leader stops renewing. Jobs live in the
+DjangoJobStore, so next run times survive a restart or a change of leader
+and a run missed during the handover is caught up once.
+
+Every run goes through run_job(), which records a JobRun with its duration,
+the rows the job processed and the error if it failed. Job functions return
+a row count, or (rows, detail).
+"""
 import logging
-from django.utils import timezone
-from django.core.mail import EmailMessage
-from django.conf import settings
+import os
+import pickle
+import socket
+import threading
+import time
+import traceback
+from collections import namedtuple
+from datetime import timedelta
+
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections
+from django.db.models import Q
+from django.utils import timezone
 from django_apscheduler.jobstores import DjangoJobStore
+from django_apscheduler.models import DjangoJob
+
+from hokasparlour.db_router import pin_scope
+
+from .logging_utils import reset_request_id, set_request_id
+from .models import JobRun, SchedulerLease
 
 logger = logging.getLogger(__name__)
 
+LEASE_NAME = 'scheduler'
+LEASE_SECONDS = getattr(settings, 'SCHEDULER_LEASE_SECONDS', 60)
+HEARTBEAT_SECONDS = max(LEASE_SECONDS // 3, 1)
+JOB_RUN_RETENTION_DAYS = getattr(settings, 'JOB_RUN_RETENTION_DAYS', 30)
+
+# A run missed while no process was leader still fires if the new leader
+# comes up within this window
+MISFIRE_GRACE_SECONDS = 60 * 60
+
+# Identifies this process as a lease holder
+HOLDER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Jobs
+# ─────────────────────────────────────────────────────────────────────────────
 
 def send_daily_orders_email():
-    from .models import Order, OrderItem
+    from .reports import DAILY, send_report
+
+    report = send_report(DAILY)
+    return report.total_orders, f"KSH {report.total_revenue}"
+
+
+def send_weekly_orders_email():
+    from .reports import WEEKLY, previous_period_day, send_report
+
+    report = send_report(WEEKLY, previous_period_day(WEEKLY))
+    return report.total_orders, f"{report.label}: KSH {report.total_revenue}"
+
+
+def send_monthly_orders_email():
+    from .reports import MONTHLY, previous_period_day, send_report
+
+    report = send_report(MONTHLY, previous_period_day(MONTHLY))
+    return report.total_orders, f"{report.label}: KSH {report.total_revenue}"
+
+
+def refresh_sitemaps():
+    from hokasparlour.sitemaps import build_sitemaps
+
+    chunks = build_sitemaps()
+    return chunks, f"{chunks} product sitemap chunk(s)"
+
+
+def refresh_restock_alerts():
+    from finance.snapshots import refresh_restock_alerts as refresh
+
+    created, dismissed = refresh()
+    if created or dismissed:
+        logger.info(f"Restock alerts: {created} created, {dismissed} auto-dismissed")
+    return created + dismissed, f"{created} created, {dismissed} dismissed"
+
+
+def close_finance_months():
+    from finance.snapshots import close_pending_months
+
+    closed = close_pending_months()
+    return len(closed), ", ".join(str(snapshot) for snapshot in closed)[:255]
+
+
+def compact_ad_impressions():
+    from parlour.ad_stats import compact_and_prune
+
+    days, pruned = compact_and_prune()
+    return pruned, f"{days} day(s) rolled up, {pruned} raw row(s) pruned"
+
+
+def deliver_order_events():
+    from .order_lifecycle import deliver_pending
+
+    sent, failed = deliver_pending()
+    return sent + failed, f"{sent} sent, {failed} failed"
+
+
+def link_order_customers():
+    from .customers import backfill
+
+    linked, created = backfill()
+    return linked, f"{created} customer(s) created"
+
 
-    today = timezone.now().date()
-    orders = Order.objects.filter(created_at__date=today).prefetch_related('orderitem_set__product').order_by('-created_at')
+def prune_job_runs():
+    cutoff = timezone.now() - timedelta(days=JOB_RUN_RETENTION_DAYS)
+    deleted, _ = JobRun.objects.filter(started_at__lt=cutoff).delete()
+    return deleted, f"runs older than {JOB_RUN_RETENTION_DAYS} days"
 
-    total_orders = orders.count()
-    total_revenue = sum(o.get_total() for o in orders)
-    paid_orders = orders.filter(is_paid=True).count()
 
-    if total_orders == 0:
-        orders_html = '''
-        <div style="text-align:center; padding:40px; color:#999;">
-            <p style="font-size:18px;">No orders were placed today.</p>
-        </div>
-        '''
+Job = namedtuple('Job', 'id func cron name')
+
+JOBS = [
+    Job('daily_orders_email', send_daily_orders_email, {'hour': 19, 'minute': 0},
+        "Send daily orders report at 7PM"),
+    Job('weekly_orders_email', send_weekly_orders_email, {'day_of_week': 'mon', 'hour': 7, 'minute': 0},
+        "Send last week's orders report on Monday morning"),
+    Job('monthly_orders_email', send_monthly_orders_email, {'day': 1, 'hour': 7, 'minute': 30},
+        "Send last month's orders report on the 1st"),
+    Job('refresh_sitemaps', refresh_sitemaps, {'minute': 15},
+        "Regenerate sitemap files hourly"),
+    Job('refresh_restock_alerts', refresh_restock_alerts, {'minute': '*/15'},
+        "Refresh finance restock alerts every 15 minutes"),
+    Job('close_finance_months', close_finance_months, {'hour': 0, 'minute': 30},
+        "Freeze finance snapshots for closed months"),
+    Job('compact_ad_impressions', compact_ad_impressions, {'hour': 0, 'minute': 45},
+        "Roll up yesterday's ad impressions and prune old raw rows"),
+    Job('deliver_order_events', deliver_order_events, {'minute': '*/5'},
+        "Retry order status notifications that didn't go out"),
+    Job('link_order_customers', link_order_customers, {'hour': 1, 'minute': 30},
+        "Link orders that have no customer yet"),
+    Job('prune_job_runs', prune_job_runs, {'hour': 1, 'minute': 0},
+        "Delete old job run history"),
+]
+
+JOBS_BY_ID = {job.id: job for job in JOBS}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Running and recording
+# ─────────────────────────────────────────────────────────────────────────────
+
+def execute(job_id):
+    """Run one catalog job now and record it as a JobRun. Returns the run."""
+    job = JOBS_BY_ID[job_id]
+    close_old_connections()
+    run = JobRun.objects.create(job_id=job_id, started_at=timezone.now(), host=HOLDER)
+    # Log lines from this run share a correlation id, as a request's do
+    token = set_request_id(f"job-{job_id}-{run.pk}")
+    started = time.monotonic()
+    try:
+        # A run starts unpinned, whatever earlier runs on this thread wrote
+        with pin_scope():
+            result = job.func()
+    except Exception as e:
+        logger.error(f"Scheduled job {job_id} failed: {e}", exc_info=True)
+        run.status = 'failed'
+        run.detail = str(e)[:255]
+        run.error = traceback.format_exc()
     else:
-        rows = ""
-        for order in orders:
-            items_list = ", ".join(
-                f"{item.product.name} x{item.quantity} ({item.size})"
-                for item in order.orderitem_set.all()
-            )
-            paid_badge = (
-                '<span style="background:#28a745;color:white;padding:3px 10px;border-radius:12px;font-size:11px;">Paid</span>'
-                if order.is_paid else
-                '<span style="background:#dc3545;color:white;padding:3px 10px;border-radius:12px;font-size:11px;">Not Paid</span>'
-            )
-            rows += f"""
-            <tr style="border-bottom:1px solid #eee;">
-                <td style="padding:12px 8px;color:#333;">#{order.id}</td>
-                <td style="padding:12px 8px;color:#333;">{order.customer_name}</td>
-                <td style="padding:12px 8px;color:#333;">{order.phone_number}</td>
-                <td style="padding:12px 8px;color:#333;">{items_list}</td>
-                <td style="padding:12px 8px;color:#333;">KSH {order.get_total()}</td>
-                <td style="padding:12px 8px;">{paid_badge}</td>
-                <td style="padding:12px 8px;color:#333;">{order.order_status.title()}</td>
-                <td style="padding:12px 8px;color:#999;font-size:12px;">{order.created_at.strftime('%I:%M %p')}</td>
-            </tr>
-            """
-
-        orders_html = f"""
-        <table style="width:100%;border-collapse:collapse;font-size:14px;">
-            <thead>
-                <tr style="background:linear-gradient(135deg,#667eea 0%,#764ba2 100%);color:white;">
-                    <th style="padding:12px 8px;text-align:left;">#</th>
-                    <th style="padding:12px 8px;text-align:left;">Customer</th>
-                    <th style="padding:12px 8px;text-align:left;">Phone</th>
-                    <th style="padding:12px 8px;text-align:left;">Items</th>
-                    <th style="padding:12px 8px;text-align:left;">Total</th>
-                    <th style="padding:12px 8px;text-align:left;">Payment</th>
-                    <th style="padding:12px 8px;text-align:left;">Status</th>
-                    <th style="padding:12px 8px;text-align:left;">Time</th>
-                </tr>
-            </thead>
-            <tbody>
-                {rows}
-            </tbody>
-        </table>
-        """
-
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head></head>
-    <body style="font-family:Arial,sans-serif;background:#f5f5f5;margin:0;padding:20px;">
-        <div style="max-width:900px;margin:0 auto;background:white;border-radius:16px;overflow:hidden;box-shadow:0 4px 12px rgba(0,0,0,0.1);">
-            
-            <div style="background:linear-gradient(135deg,#667eea 0%,#764ba2 100%);color:white;padding:40px 30px;text-align:center;">
-                <div style="font-size:32px;font-weight:800;margin-bottom:10px;">Qunimart<span style="color:#ffd700;">PARLOUR</span></div>
-                <h1 style="margin:0;font-size:22px;">📦 Daily Orders Report</h1>
-                <p style="margin:10px 0 0 0;opacity:0.9;">{today.strftime('%A, %B %d, %Y')}</p>
-            </div>
-
-            <div style="padding:30px;">
-
-                <div style="display:flex;gap:15px;margin-bottom:30px;flex-wrap:wrap;">
-                    <div style="flex:1;min-width:150px;background:#f8f9fa;padding:20px;border-radius:12px;border-left:4px solid #667eea;text-align:center;">
-                        <div style="font-size:32px;font-weight:800;color:#667eea;">{total_orders}</div>
-                        <div style="color:#666;font-size:14px;">Total Orders</div>
-                    </div>
-                    <div style="flex:1;min-width:150px;background:#f8f9fa;padding:20px;border-radius:12px;border-left:4px solid #28a745;text-align:center;">
-                        <div style="font-size:32px;font-weight:800;color:#28a745;">{paid_orders}</div>
-                        <div style="color:#666;font-size:14px;">Paid Orders</div>
-                    </div>
-                    <div style="flex:1;min-width:150px;background:#f8f9fa;padding:20px;border-radius:12px;border-left:4px solid #ffc107;text-align:center;">
-                        <div style="font-size:28px;font-weight:800;color:#ffc107;">KSH {total_revenue}</div>
-                        <div style="color:#666;font-size:14px;">Total Revenue</div>
-                    </div>
-                </div>
-
-                <h2 style="color:#333;border-bottom:2px solid #667eea;padding-bottom:10px;">Order Details</h2>
-                {orders_html}
-
-            </div>
-
-            <div style="background:#f8f9fa;padding:20px;text-align:center;border-top:1px solid #eee;">
-                <p style="color:#666;margin:5px 0;font-size:14px;">Qunimart — Automated Daily Report</p>
-                <p style="color:#999;margin:5px 0;font-size:12px;">© 2026 Qunimart. All rights reserved.</p>
-            </div>
-        </div>
-    </body>
-    </html>
+        rows, detail = result if isinstance(result, tuple) else (result, '')
+        run.status = 'success'
+        run.rows = rows
+        run.detail = detail or ''
+    run.finished_at = timezone.now()
+    run.duration_ms = int((time.monotonic() - started) * 1000)
+    try:
+        run.save(update_fields=['status', 'rows', 'detail', 'error', 'finished_at', 'duration_ms'])
+    except DatabaseError as e:
+        logger.error(f"Error recording run of {job_id}: {e}")
+    finally:
+        reset_request_id(token)
+        close_old_connections()
+    return run
+
+
+def run_job(job_id):
+    """Scheduler entry point: runs the job only while this process is leader."""
+    if not holds_lease():
+        logger.warning(f"Skipping {job_id}: {HOLDER} no longer holds the scheduler lease")
+        return None
+    return execute(job_id)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Leader lease
+# ─────────────────────────────────────────────────────────────────────────────
+
+def acquire_lease(holder=HOLDER):
     """
+    Take the lease if it is free or expired, or renew it if holder already
+    has it. The conditional UPDATE is atomic, so of several processes
+    racing for an expired lease exactly one wins. Returns True for the leader.
+    """
+    now = timezone.now()
+    try:
+        SchedulerLease.objects.get_or_create(name=LEASE_NAME)
+    except IntegrityError:
+        pass  # another process created it first
 
-    email = EmailMessage(
-        subject=f"📦 Daily Orders Report — {today.strftime('%B %d, %Y')} ({total_orders} orders)",
-        body=html,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        to=['hokasparlour@gmail.com'],
+    lease = SchedulerLease.objects.filter(name=LEASE_NAME)
+    expires_at = now + timedelta(seconds=LEASE_SECONDS)
+    if lease.filter(holder=holder, expires_at__gt=now).update(expires_at=expires_at):
+        return True
+    return bool(
+        lease.filter(Q(expires_at__isnull=True) | Q(expires_at__lte=now))
+        .update(holder=holder, acquired_at=now, expires_at=expires_at)
     )
-    email.content_subtype = "html"
-    email.send(fail_silently=False)
-    logger.info(f"Daily orders email sent: {total_orders} orders, KSH {total_revenue}")
 
 
-def start():
-    scheduler = BackgroundScheduler(timezone=str(timezone.get_current_timezone()))
-    scheduler.add_jobstore(DjangoJobStore(), "default")
+def holds_lease(holder=HOLDER):
+    return SchedulerLease.objects.filter(
+        name=LEASE_NAME, holder=holder, expires_at__gt=timezone.now()
+    ).exists()
+
+
+def release_lease(holder=HOLDER):
+    SchedulerLease.objects.filter(name=LEASE_NAME, holder=holder).update(holder='', expires_at=None)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Scheduler process
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _definition(trigger, name, args):
+    """What a stored job must match to be left alone: its schedule, name and arguments."""
+    return repr(trigger), name, tuple(args)
+
 
-    scheduler.add_job(
-        send_daily_orders_email,
-        trigger=CronTrigger(hour=19, minute=0),  # 7:00 PM daily
-        id="daily_orders_email",
-        name="Send daily orders report at 7PM",
-        replace_existing=True,
+def _stored_definitions():
+    """{job id: definition} for the jobs already in the DjangoJobStore."""
+    stored = {}
+    for job_id, job_state in DjangoJob.objects.values_list('id', 'job_state'):
+        try:
+            state = pickle.loads(job_state)
+            stored[job_id] = _definition(state['trigger'], state['name'], state['args'])
+        except Exception as e:
+            logger.warning(f"Unreadable stored job {job_id}, replacing it: {e}")
+    return stored
+
+
+def _start_scheduler():
+    tz = timezone.get_current_timezone()
+    scheduler = BackgroundScheduler(
+        timezone=str(tz),
+        job_defaults={'coalesce': True, 'max_instances': 1, 'misfire_grace_time': MISFIRE_GRACE_SECONDS},
     )
+    scheduler.add_jobstore(DjangoJobStore(), "default")
+
+    # Jobs dropped from the catalog would otherwise linger in the store
+    DjangoJob.objects.exclude(id__in=JOBS_BY_ID).delete()
+
+    # A job that is already stored keeps its stored next run time, so a run
+    # missed during the handover still fires within MISFIRE_GRACE_SECONDS;
+    # add_job would recompute it from the trigger. Only new or changed jobs
+    # are (re)added.
+    stored = _stored_definitions()
+    for job in JOBS:
+        trigger = CronTrigger(timezone=tz, **job.cron)
+        if stored.get(job.id) == _definition(trigger, job.name, [job.id]):
+            continue
+        scheduler.add_job(
+            run_job,
+            trigger=trigger,
+            args=[job.id],
+            id=job.id,
+            name=job.name,
+            replace_existing=True,
+        )
 
     scheduler.start()
-    logger.info("Scheduler started — daily orders email at 7:00 PM")
\ No newline at end of file
+    return scheduler
+
+
+def run(stop=None):
+    """
+    Contend for the lease until stop is set, running the scheduler whenever
+    this process is leader. The lease is renewed from this loop, not from a
+    job, so a long job doesn't let it lapse.
+    """
+    stop = stop or threading.Event()
+    scheduler = None
+    try:
+        while not stop.is_set():
+            try:
+                leader = acquire_lease()
+            except DatabaseError as e:
+                logger.error(f"Error renewing scheduler lease: {e}")
+                close_old_connections()
+                leader = False
+
+            if leader and scheduler is None:
+                scheduler = _start_scheduler()
+                logger.info(f"Scheduler started on {HOLDER} — {len(JOBS)} jobs")
+            elif not leader and scheduler is not None:
+                logger.warning(f"Scheduler lease lost by {HOLDER}; stopping jobs")
+                scheduler.shutdown(wait=False)
+                scheduler = None
+
+            stop.wait(HEARTBEAT_SECONDS)
+    finally:
+        if scheduler is not None:
+            scheduler.shutdown(wait=True)
+        try:
+            release_lease()
+        except DatabaseError as e:
+            logger.error(f"Error releasing scheduler lease: {e}")
+        logger.info(f"Scheduler stopped on {HOLDER}")
+
+
+def start():
+    """Contend for the lease on a daemon thread — used under runserver."""
+    thread = threading.Thread(target=run, name='scheduler', daemon=True)
+    thread.start()
+    return thread
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Status — for the staff dashboard
+# ─────────────────────────────────────────────────────────────────────────────
+
+def job_status():
+    """Catalog jobs with their next run time and latest run."""
+    next_runs = dict(DjangoJob.objects.values_list('id', 'next_run_time'))
+    since = timezone.now() - timedelta(days=1)
+    status = []
+    for job in JOBS:
+        runs = JobRun.objects.filter(job_id=job.id)
+        status.append({
+            'job': job,
+            'next_run_time': next_runs.get(job.id),
+            'last_run': runs.first(),
+            'last_success': runs.filter(status='success').first(),
+            'failures_24h': runs.filter(status='failed', started_at__gte=since).count(),
+        })
+    return status
+
+
+def lease_status():
+    return SchedulerLease.objects.filter(name=LEASE_NAME).first()
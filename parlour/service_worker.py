@@ -0,0 +1,112 @@
+"""
+The storefront service worker, generated from templates/sw.js.
+
+The worker precaches the app shell — SHELL_ASSETS plus the offline page —
+under a cache named for a hash of their contents, so a deploy that changes
+any of them installs a fresh precache and drops the old one, and a deploy
+that doesn't leaves visitors' caches alone. Static URLs come from the
+staticfiles storage, so they are the hashed names once the storage hashes.
+
+At runtime the worker keeps:
+
+  * hashed static files cache-first (their names change when they do),
+  * product images and catalog API data stale-while-revalidate, in caches
+    capped by entry count and age,
+  * everything personal — cart, checkout, payments, account, staff pages —
+    network-only, never written to a cache.
+
+The precache manifest is worked out once per process; a deploy restarts it.
+"""
+import hashlib
+import json
+import logging
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.http import HttpResponse
+from django.template.loader import get_template, render_to_string
+from django.templatetags.static import static
+from django.urls import reverse
+from django.views.decorators.cache import never_cache
+
+logger = logging.getLogger(__name__)
+
+# Static files every page needs, relative to STATIC_URL
+SHELL_ASSETS = [
+    'css/storefront.css',
+    'manifest.json',
+    'favicon/favicon.png',
+    'icons/icon-192x192.png',
+    'icons/icon-512x512.png',
+]
+
+OFFLINE_TEMPLATE = 'parlour/offline.html'
+
+# Runtime caches: (max entries, max age in seconds)
+IMAGE_CACHE_LIMITS = (120, 60 * 60 * 24 * 7)
+CATALOG_CACHE_LIMITS = (60, 60 * 60 * 24)
+
+# URL path prefixes the worker never caches or answers from a cache
+NETWORK_ONLY_PREFIXES = [
+    '/cart/', '/add-to-cart/', '/remove-from-cart/', '/checkout/',
+    '/mpesa-payment/', '/confirm-mpesa-payment/', '/lipana-webhook/',
+    '/check-payment-status/', '/payment-processing/', '/payment-failed/',
+    '/process-cash-order/', '/order-confirmation/', '/order-tracking/',
+    '/login/', '/signup/', '/verify-otp/', '/logout/', '/accounts/', '/account/',
+    '/profile/', '/for-you/', '/wishlist/', '/orders/', '/ads/', '/ad/',
+    '/hoka/', '/admin-dashboard/', '/finance/', '/seller/', '/whatsapp/',
+    '/hoka-secure-panel-2024/', '/clear-whatsapp-popup/',
+]
+
+
+def _file_hash(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def precache_manifest():
+    """([{'url', 'revision'}, ...], version) for the app shell."""
+    entries = []
+    for name in SHELL_ASSETS:
+        path = finders.find(name)
+        if not path:
+            logger.warning(f"Service worker shell asset not found: {name}")
+            continue
+        try:
+            url = static(name)
+        except ValueError as e:
+            # Missing from the staticfiles manifest — collectstatic not run
+            logger.warning(f"Service worker shell asset not collected: {name}: {e}")
+            continue
+        entries.append({'url': url, 'revision': _file_hash(path)[:12]})
+
+    offline = get_template(OFFLINE_TEMPLATE).origin.name
+    entries.append({'url': reverse('offline'), 'revision': _file_hash(offline)[:12]})
+
+    version = hashlib.md5(
+        '|'.join(f"{entry['url']}={entry['revision']}" for entry in entries).encode()
+    ).hexdigest()[:12]
+    return entries, version
+
+
+@never_cache
+def service_worker(request):
+    entries, version = precache_manifest()
+    config = {
+        'version': version,
+        'precache': entries,
+        'offlineUrl': reverse('offline'),
+        'staticUrl': settings.STATIC_URL,
+        'mediaUrl': settings.MEDIA_URL,
+        'catalogUrl': '/api/v1/',
+        'imageLimits': IMAGE_CACHE_LIMITS,
+        'catalogLimits': CATALOG_CACHE_LIMITS,
+        'networkOnly': NETWORK_ONLY_PREFIXES,
+    }
+    content = render_to_string('sw.js', {'config': json.dumps(config, indent=2)})
+    return HttpResponse(content, content_type='application/javascript')
@@ -1,9 +1,15 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.db import transaction
 from django.dispatch import receiver
+from django.utils import timezone
 from django.contrib.auth.models import User
-from parlour.models import Order, OrderItem
-from .models import Profile, Agent, PromoUsage
-from decimal import Decimal
+from django.contrib.auth.signals import user_logged_in
+from parlour.models import Order
+from .models import (
+    Profile, Agent, PromoUsage, Product, ProductImage, Category, Color,
+    Advertisement, AdImage, StoreSettings,
+)
+from . import customers, order_lifecycle, page_cache, referrals, wishlists
 from allauth.account.signals import user_signed_up
 import logging
 
@@ -25,25 +31,18 @@ def _send_whatsapp(phone: str, message: str, label: str = ""):
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# Sales Record — fires on new order
+# Customer identity — link each new order to its Customer
 # ─────────────────────────────────────────────────────────────────────────────
 
-@receiver(post_save, sender=Order)
-def create_sales_record(sender, instance, created, **kwargs):
-    if created:
-        try:
-            from .models import SalesRecord
-            total_items = sum(item.quantity for item in instance.orderitem_set.all())
-            total_amount = instance.get_total()
-            profit_estimate = Decimal(str(total_amount)) * Decimal('0.3')
-            SalesRecord.objects.create(
-                order=instance,
-                total_items=total_items,
-                total_amount=total_amount,
-                profit_estimate=profit_estimate
-            )
-        except Exception as e:
-            logger.error(f"Error creating sales record: {e}")
+@receiver(pre_save, sender=Order)
+def link_order_customer(sender, instance, raw=False, **kwargs):
+    if raw or not instance._state.adding or instance.customer_id is not None:
+        return
+    try:
+        customers.link_order(instance)
+    except Exception as e:
+        # Left for the link_order_customers job
+        logger.error(f"Could not link new order for {instance.email} to a customer: {e}")
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -88,109 +87,17 @@ def send_order_confirmation_whatsapp(sender, instance, created, **kwargs):
         logger.error(f"Error building order confirmation WhatsApp for #{instance.id}: {e}")
 
 
-# ─────────────────────────────────────────────────────────────────────────────
-# Product Stats — fires on new order item
-# ─────────────────────────────────────────────────────────────────────────────
-
-@receiver(post_save, sender=OrderItem)
-def update_product_stats(sender, instance, created, **kwargs):
-    if created:
-        try:
-            from .models import ProductStats
-            stats, _ = ProductStats.objects.get_or_create(
-                product=instance.product,
-                defaults={
-                    'total_sold': 0,
-                    'total_revenue': Decimal('0.00')
-                }
-            )
-            stats.total_sold += instance.quantity
-            subtotal = instance.get_subtotal()
-            if isinstance(subtotal, str):
-                subtotal = Decimal(subtotal)
-            elif not isinstance(subtotal, Decimal):
-                subtotal = Decimal(str(subtotal))
-            stats.total_revenue += subtotal
-            stats.last_sold_date = instance.order.created_at
-            stats.save()
-        except Exception as e:
-            logger.error(f"Error updating product stats: {e}")
-
-
-# ─────────────────────────────────────────────────────────────────────────────
-# Email + WhatsApp Status Updates — fires when order_status changes
-# ─────────────────────────────────────────────────────────────────────────────
-
-STATUS_WHATSAPP_MESSAGES = {
-    'processing': (
-        "⚙️ *Order Update — Qunimart*\n\n"
-        "Hi {name}! Your order *#{id}* is now being *processed*. 🏪\n\n"
-        "We're preparing your items and will notify you once dispatched."
-    ),
-    'dispatched': (
-        "🚚 *Order Dispatched — Qunimart*\n\n"
-        "Hi {name}! Great news — your order *#{id}* is on its way! 🎉\n\n"
-        "📬 Delivering to: {address}\n\n"
-        "You'll receive it soon. Thank you for your patience! 💛"
-    ),
-    'delivered': (
-        "✅ *Order Delivered — Qunimart*\n\n"
-        "Hi {name}! Your order *#{id}* has been *delivered*. 📦\n\n"
-        "We hope you love your items! 😊\n"
-        "If you have any issues, feel free to reach us at {store_phone}.\n\n"
-        "Thank you for shopping with Qunimart! 🛍️💕"
-    ),
-}
+# Sales records and product stats are maintained by hokaadmin.signals
+# (batched per transaction, see hokaadmin/stats.py).
 
 
-@receiver(pre_save, sender=Order)
-def send_order_status_email(sender, instance, **kwargs):
-    if not instance.pk:
-        return
-
-    try:
-        old_instance = Order.objects.get(pk=instance.pk)
-    except Order.DoesNotExist:
-        return
-
-    status_changed = old_instance.order_status != instance.order_status
+# ─────────────────────────────────────────────────────────────────────────────
+# Status changes — recorded in the order outbox, announced after commit
+# ─────────────────────────────────────────────────────────────────────────────
 
-    # ── Emails (unchanged from your original) ────────────────────
-    if status_changed:
-        try:
-            from .email_utils import send_order_status_change_email
-            send_order_status_change_email(instance)
-        except ImportError:
-            logger.warning("send_order_status_change_email not found in email_utils")
-
-        if instance.order_status == 'dispatched':
-            try:
-                from .email_utils import send_order_dispatched_email
-                send_order_dispatched_email(instance)
-            except ImportError:
-                logger.warning("send_order_dispatched_email not found in email_utils")
-
-    # ── WhatsApp Status Update ────────────────────────────────────
-    if status_changed and instance.phone_number:
-        template = STATUS_WHATSAPP_MESSAGES.get(instance.order_status)
-        if template:
-            try:
-                from parlour.models import StoreSettings
-                store_phone = StoreSettings.get_settings().store_phone
-            except Exception:
-                store_phone = '+254 700 000 000'
-
-            message = template.format(
-                name=instance.customer_name,
-                id=instance.id,
-                address=instance.delivery_address,
-                store_phone=store_phone,
-            )
-            _send_whatsapp(
-                instance.phone_number,
-                message,
-                label=f"status_{instance.order_status} #{instance.id}"
-            )
+@receiver(post_save, sender=Order)
+def record_order_transition(sender, instance, created, update_fields, using, **kwargs):
+    order_lifecycle.record_save(instance, created, update_fields, using=using)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -238,3 +145,71 @@ def on_user_signed_up(request, user, **kwargs):
         logger.info(f"No referral code — show_promo_popup=True set for {user.username}")
 
 
+@receiver([post_save, post_delete], sender=PromoUsage)
+def invalidate_agent_stats(sender, instance, **kwargs):
+    agent_id = instance.agent_id
+    transaction.on_commit(lambda: referrals.invalidate_agent(agent_id))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Login — move a guest's session wishlist onto the account, claim past orders
+# ─────────────────────────────────────────────────────────────────────────────
+
+@receiver(user_logged_in)
+def claim_customer(sender, request, user, **kwargs):
+    try:
+        customers.claim(user)
+    except Exception as e:
+        logger.error(f"Error linking customer for {user.username}: {e}", exc_info=True)
+
+
+@receiver(user_logged_in)
+def merge_guest_wishlist(sender, request, user, **kwargs):
+    if request is None or not hasattr(request, 'session'):
+        return
+    try:
+        merged = wishlists.merge_session(request, user)
+        if merged:
+            logger.info(f"Merged {merged} guest wishlist item(s) into {user.username}'s wishlist")
+    except Exception as e:
+        logger.error(f"Error merging guest wishlist for {user.username}: {e}", exc_info=True)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Storefront cache invalidation — bump the tags of whatever changed
+# ─────────────────────────────────────────────────────────────────────────────
+
+CACHE_TAGS_BY_MODEL = {
+    Product:       (page_cache.TAG_PRODUCT,),
+    ProductImage:  (page_cache.TAG_PRODUCT,),
+    Color:         (page_cache.TAG_PRODUCT,),
+    Category:      (page_cache.TAG_CATEGORY,),
+    Advertisement: (page_cache.TAG_ADS,),
+    AdImage:       (page_cache.TAG_ADS,),
+    StoreSettings: (page_cache.TAG_SETTINGS,),
+}
+
+# Counter-only saves that don't change what a page shows
+_COUNTER_FIELDS = {'views', 'clicks'}
+
+
+def invalidate_storefront_cache(sender, instance, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= _COUNTER_FIELDS:
+        return
+    tags = CACHE_TAGS_BY_MODEL[sender]
+    transaction.on_commit(lambda: page_cache.invalidate(*tags))
+
+
+for _model in CACHE_TAGS_BY_MODEL:
+    post_save.connect(invalidate_storefront_cache, sender=_model)
+    post_delete.connect(invalidate_storefront_cache, sender=_model)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Sitemap lastmod — image changes count as a product change
+# ─────────────────────────────────────────────────────────────────────────────
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def touch_product_on_image_change(sender, instance, **kwargs):
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
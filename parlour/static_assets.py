@@ -0,0 +1,276 @@
+"""
+Third-party CSS and JS, served from our own static files.
+
+VENDOR_ASSETS pins every library the templates load. `manage.py
+vendor_static` downloads each one into static/vendor/, along with the fonts
+and images its CSS points at. Tailwind is built rather than downloaded: the
+standalone CLI compiles just the classes the templates use into one
+minified stylesheet, in place of the CDN script that compiles them in every
+visitor's browser.
+
+Templates include a library with {% vendor 'name' %} (parlour.templatetags
+.vendor). It links the vendored copy, which collectstatic hashes and
+compresses like any other static file, and falls back to the pinned CDN
+URL for a library that hasn't been vendored yet. `manage.py check_static`
+fails while any library is still on its fallback.
+"""
+import json
+import logging
+import os
+import platform
+import re
+import subprocess
+import tempfile
+from collections import namedtuple
+from functools import lru_cache
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.template.utils import get_app_template_dirs
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+logger = logging.getLogger(__name__)
+
+# path     where the library lives, relative to STATIC_URL
+# source   URL it is downloaded from; None when vendor_static builds it
+# cdn      fallback URL while it isn't vendored
+# kind     'css' or 'js' — how path is included
+# cdn_kind how cdn is included
+VendorAsset = namedtuple('VendorAsset', 'path source cdn kind cdn_kind')
+
+TAILWIND_VERSION = '3.4.17'
+TAILWIND_CLI_URL = f"https://github.com/tailwindlabs/tailwindcss/releases/download/v{TAILWIND_VERSION}/tailwindcss-{{platform}}"
+
+# Files whose class names Tailwind keeps, relative to BASE_DIR
+TAILWIND_CONTENT = [
+    '*/templates/**/*.html',
+    'static/js/**/*.js',
+]
+
+_FONT_AWESOME = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css'
+_CHART_JS = 'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js'
+_REMIXICON = 'https://cdn.jsdelivr.net/npm/remixicon@4.2.0/fonts/remixicon.css'
+
+VENDOR_ASSETS = {
+    'tailwind': VendorAsset(
+        f'vendor/tailwind/{TAILWIND_VERSION}/tailwind.min.css', None,
+        f'https://cdn.tailwindcss.com/{TAILWIND_VERSION}', 'css', 'js',
+    ),
+    'font-awesome': VendorAsset('vendor/font-awesome/6.0.0-beta3/css/all.min.css', _FONT_AWESOME, _FONT_AWESOME, 'css', 'css'),
+    'chart.js': VendorAsset('vendor/chart.js/4.4.1/chart.umd.min.js', _CHART_JS, _CHART_JS, 'js', 'js'),
+    'remixicon': VendorAsset('vendor/remixicon/4.2.0/remixicon.css', _REMIXICON, _REMIXICON, 'css', 'css'),
+}
+
+# External stylesheets and scripts that are fine to load from elsewhere
+EXTERNAL_ALLOWED_HOSTS = {
+    'fonts.googleapis.com',      # Web fonts CSS, served per browser
+    'www.googletagmanager.com',  # Analytics
+}
+
+
+def vendor_root():
+    """The static directory vendor_static writes into."""
+    return str(settings.STATICFILES_DIRS[0])
+
+
+def local_path(asset):
+    return os.path.join(vendor_root(), *asset.path.split('/'))
+
+
+@lru_cache(maxsize=None)
+def is_vendored(name):
+    return bool(finders.find(VENDOR_ASSETS[name].path))
+
+
+def _tag(kind, url):
+    if kind == 'css':
+        return format_html('<link rel="stylesheet" href="{}">', url)
+    return format_html('<script src="{}"></script>', url)
+
+
+def include(name):
+    """The <link> or <script> for a vendor library — the local copy when there is one."""
+    asset = VENDOR_ASSETS[name]
+    if is_vendored(name):
+        return _tag(asset.kind, static(asset.path))
+    return _tag(asset.cdn_kind, asset.cdn)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Vendoring
+# ─────────────────────────────────────────────────────────────────────────────
+
+DOWNLOAD_TIMEOUT = 60
+
+CSS_URL_RE = re.compile(r"""url\(\s*['"]?([^'")]+?)['"]?\s*\)""")
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def _download(client, url, path):
+    response = client.get(url)
+    response.raise_for_status()
+    _write(path, response.content)
+    return response.content
+
+
+def _vendor_css(client, asset):
+    """Download a stylesheet and every relative url() it references, keeping the layout."""
+    css_path = local_path(asset)
+    content = _download(client, asset.source, css_path)
+    # Nothing may be written outside the library's own directory
+    library_root = os.path.join(vendor_root(), *asset.path.split('/')[:3])
+    fetched = set()
+    for ref in CSS_URL_RE.findall(content.decode('utf-8', 'replace')):
+        relative = re.split(r'[?#]', ref.strip(), maxsplit=1)[0]
+        if not relative or relative.startswith(('data:', '/')) or urlsplit(relative).scheme:
+            continue
+        path = os.path.normpath(os.path.join(os.path.dirname(css_path), relative))
+        if path in fetched or not path.startswith(library_root + os.sep):
+            continue
+        _download(client, urljoin(asset.source, relative), path)
+        fetched.add(path)
+    return 1 + len(fetched)
+
+
+def _tailwind_platform():
+    machine = platform.machine().lower()
+    arch = 'arm64' if machine in ('arm64', 'aarch64') else 'x64'
+    system = platform.system()
+    if system == 'Darwin':
+        return f"macos-{arch}"
+    if system == 'Windows':
+        return f"windows-{arch}.exe"
+    return f"linux-{arch}"
+
+
+def _build_tailwind(client, asset):
+    """Compile the classes used in TAILWIND_CONTENT with the standalone Tailwind CLI."""
+    base_dir = str(settings.BASE_DIR)
+    with tempfile.TemporaryDirectory() as tmp:
+        cli = os.path.join(tmp, 'tailwindcss')
+        _download(client, TAILWIND_CLI_URL.format(platform=_tailwind_platform()), cli)
+        os.chmod(cli, 0o755)
+
+        config = os.path.join(tmp, 'tailwind.config.js')
+        content = [os.path.join(base_dir, pattern) for pattern in TAILWIND_CONTENT]
+        with open(config, 'w') as f:
+            f.write(f"module.exports = {{content: {json.dumps(content)}}};\n")
+
+        output = local_path(asset)
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        subprocess.run(
+            [cli, '--config', config, '--output', output, '--minify'],
+            cwd=base_dir, check=True, capture_output=True,
+        )
+    return 1
+
+
+def vendor(names=None, force=False):
+    """
+    Vendor the named libraries (default all) that aren't vendored yet, or
+    all of them with force. Returns {name: files written}.
+    """
+    names = list(names or VENDOR_ASSETS)
+    unknown = [name for name in names if name not in VENDOR_ASSETS]
+    if unknown:
+        raise ValueError(f"Unknown vendor asset(s): {', '.join(unknown)}")
+
+    written = {}
+    with httpx.Client(timeout=DOWNLOAD_TIMEOUT, follow_redirects=True) as client:
+        for name in names:
+            asset = VENDOR_ASSETS[name]
+            if not force and os.path.exists(local_path(asset)):
+                continue
+            if asset.source is None:
+                written[name] = _build_tailwind(client, asset)
+            elif asset.kind == 'css':
+                written[name] = _vendor_css(client, asset)
+            else:
+                _download(client, asset.source, local_path(asset))
+                written[name] = 1
+            logger.info(f"Vendored {name}: {written[name]} file(s) under {os.path.dirname(local_path(asset))}")
+
+    is_vendored.cache_clear()
+    return written
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Checking templates
+# ─────────────────────────────────────────────────────────────────────────────
+
+TEMPLATE_EXTENSIONS = ('.html', '.js', '.txt', '.xml')
+
+LITERAL_STATIC_RE = re.compile(r"""(?:src|href|content)\s*=\s*["']/static/([^"'?#]+)""")
+STATIC_TAG_RE = re.compile(r"""{%\s*static\s+["']([^"']+)["']""")
+TAG_RE = re.compile(r'<(script|link)\b([^>]*)>', re.IGNORECASE)
+EXTERNAL_URL_RE = re.compile(r"""(?:src|href)\s*=\s*["']((?:https?:)?//[^"']+)["']""", re.IGNORECASE)
+
+
+def template_dirs():
+    """This project's template directories — not those of installed packages."""
+    base_dir = str(settings.BASE_DIR)
+    dirs = [str(path) for path in settings.TEMPLATES[0].get('DIRS', [])]
+    dirs += [str(path) for path in get_app_template_dirs('templates')]
+    return [path for path in dict.fromkeys(dirs) if path.startswith(base_dir) and os.path.isdir(path)]
+
+
+def _external_problem(url):
+    host = urlsplit(url if '://' in url else f"https:{url}").hostname or ''
+    if host in EXTERNAL_ALLOWED_HOSTS:
+        return None
+    return f"{url} is loaded from another site; add it to VENDOR_ASSETS and use {{% vendor %}}"
+
+
+def check_file(path):
+    """[(line, message), ...] for assets in one template that won't get a hashed URL."""
+    with open(path, encoding='utf-8', errors='replace') as f:
+        text = f.read()
+
+    def line_of(pos):
+        return text.count('\n', 0, pos) + 1
+
+    problems = []
+    for match in LITERAL_STATIC_RE.finditer(text):
+        name = match.group(1)
+        problems.append((line_of(match.start()), f"/static/{name} is linked directly; use {{% static '{name}' %}}"))
+    for match in STATIC_TAG_RE.finditer(text):
+        name = match.group(1)
+        if not finders.find(name):
+            problems.append((line_of(match.start()), f"{{% static '{name}' %}}: no such static file"))
+    for match in TAG_RE.finditer(text):
+        tag, attrs = match.group(1).lower(), match.group(2)
+        if tag == 'link' and 'stylesheet' not in attrs.lower():
+            continue
+        url = EXTERNAL_URL_RE.search(attrs)
+        problem = url and _external_problem(url.group(1))
+        if problem:
+            problems.append((line_of(match.start()), problem))
+    return sorted(problems)
+
+
+def check():
+    """
+    [(path or None, line, message), ...] for every template asset that won't
+    be served under a hashed name, and every library still on its CDN fallback.
+    """
+    problems = []
+    for directory in template_dirs():
+        for root, _, files in os.walk(directory):
+            for filename in sorted(files):
+                if filename.endswith(TEMPLATE_EXTENSIONS):
+                    path = os.path.join(root, filename)
+                    problems.extend((path, line, message) for line, message in check_file(path))
+    for name in VENDOR_ASSETS:
+        if not is_vendored(name):
+            problems.append((None, None, f"{name} is not vendored yet; run manage.py vendor_static {name}"))
+    return problems
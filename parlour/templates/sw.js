@@ -1,62 +1,153 @@
-const CACHE_NAME = 'hokas-parlour-v1';
-const STATIC_ASSETS = [
-  '/',
-  '/cart/',
-  '/static/manifest.json',
-  '/static/favicon/favicon.png',
-];
-
-// Install — cache static assets
+// Generated by parlour.service_worker — edit the template, not a copy of it.
+const CONFIG = {{ config|safe }};
+
+const PREFIX = 'hokas-';
+const PRECACHE = `${PREFIX}precache-${CONFIG.version}`;
+const STATIC_CACHE = `${PREFIX}static-v2`;
+const IMAGE_CACHE = `${PREFIX}images-v2`;
+const CATALOG_CACHE = `${PREFIX}catalog-v2`;
+const CURRENT_CACHES = [PRECACHE, STATIC_CACHE, IMAGE_CACHE, CATALOG_CACHE];
+
+// When a runtime copy was stored — set by the worker, not the server
+const STORED_AT = 'x-sw-stored-at';
+
+// Static files named with a content hash, e.g. app.3f2a1c9b8d7e.css
+const HASHED_NAME = /\.[0-9a-f]{12}\.[a-z0-9]+$/i;
+
+// Install — precache the shell; the cache name changes whenever the shell does
 self.addEventListener('install', event => {
   event.waitUntil(
-    caches.open(CACHE_NAME).then(cache => cache.addAll(STATIC_ASSETS))
+    caches.open(PRECACHE)
+      .then(cache => cache.addAll(
+        CONFIG.precache.map(entry => new Request(entry.url, {cache: 'reload'}))
+      ))
+      .then(() => self.skipWaiting())
   );
-  self.skipWaiting();
 });
 
-// Activate — clean up old caches
+// Activate — drop caches from older workers, including the old all-in-one cache
 self.addEventListener('activate', event => {
   event.waitUntil(
-    caches.keys().then(keys =>
-      Promise.all(
-        keys.filter(key => key !== CACHE_NAME).map(key => caches.delete(key))
-      )
-    )
+    caches.keys()
+      .then(keys => Promise.all(
+        keys
+          .filter(key => (key.startsWith(PREFIX) || key === 'hokas-parlour-v1') && !CURRENT_CACHES.includes(key))
+          .map(key => caches.delete(key))
+      ))
+      .then(() => self.clients.claim())
   );
-  self.clients.claim();
 });
 
-// Fetch — network first, fallback to cache
+// ── Strategies ───────────────────────────────────────────────────────────────
+
+function cacheable(response) {
+  return response && response.ok && response.type === 'basic';
+}
+
+async function cacheFirst(request, cacheName) {
+  // Any cache will do — the precache holds the shell's copies
+  const cached = await caches.match(request);
+  if (cached) return cached;
+
+  const response = await fetch(request);
+  if (cacheName && cacheable(response)) {
+    const cache = await caches.open(cacheName);
+    await cache.put(request, response.clone());
+  }
+  return response;
+}
+
+async function stamp(response) {
+  // Copy with the time it was stored, so the age limit can be checked
+  const headers = new Headers(response.headers);
+  headers.set(STORED_AT, String(Date.now()));
+  const body = await response.blob();
+  return new Response(body, {status: response.status, statusText: response.statusText, headers});
+}
+
+function isFresh(response, maxAgeSeconds) {
+  const storedAt = Number(response.headers.get(STORED_AT) || 0);
+  return Date.now() - storedAt < maxAgeSeconds * 1000;
+}
+
+async function trim(cacheName, maxEntries) {
+  // Keys come back oldest first
+  const cache = await caches.open(cacheName);
+  const keys = await cache.keys();
+  await Promise.all(keys.slice(0, Math.max(0, keys.length - maxEntries)).map(key => cache.delete(key)));
+}
+
+async function staleWhileRevalidate(event, cacheName, [maxEntries, maxAgeSeconds]) {
+  const request = event.request;
+  const cache = await caches.open(cacheName);
+  const cached = await cache.match(request);
+
+  const refresh = fetch(request).then(async response => {
+    if (cacheable(response)) {
+      await cache.put(request, await stamp(response.clone()));
+      await trim(cacheName, maxEntries);
+    }
+    return response;
+  });
+
+  if (cached && isFresh(cached, maxAgeSeconds)) {
+    // Answer now; the refreshed copy is there next time
+    event.waitUntil(refresh.catch(() => {}));
+    return cached;
+  }
+  // Nothing usable cached — wait for the network, and fall back to a stale copy
+  return refresh.catch(() => cached || Response.error());
+}
+
+async function networkWithOfflinePage(request) {
+  try {
+    return await fetch(request);
+  } catch (err) {
+    return (await caches.match(CONFIG.offlineUrl)) || Response.error();
+  }
+}
+
+// ── Routing ──────────────────────────────────────────────────────────────────
+
+function isNetworkOnly(path) {
+  return CONFIG.networkOnly.some(prefix => path.startsWith(prefix));
+}
+
 self.addEventListener('fetch', event => {
-  // Skip non-GET and admin/webhook requests
-  if (
-    event.request.method !== 'GET' ||
-    event.request.url.includes('/admin/') ||
-    event.request.url.includes('/lipana-webhook/') ||
-    event.request.url.includes('/hoka/delivery/')
-  ) {
+  const request = event.request;
+  if (request.method !== 'GET') return;
+
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) return;
+
+  const path = url.pathname;
+
+  // Personal and staff pages: straight to the network, never cached
+  if (isNetworkOnly(path)) {
+    if (request.mode === 'navigate') {
+      event.respondWith(networkWithOfflinePage(request));
+    }
     return;
   }
 
-  event.respondWith(
-    fetch(event.request)
-      .then(response => {
-        // Cache a copy of the response
-        const responseClone = response.clone();
-        caches.open(CACHE_NAME).then(cache => {
-          cache.put(event.request, responseClone);
-        });
-        return response;
-      })
-      .catch(() => {
-        // Network failed — try cache
-        return caches.match(event.request).then(cached => {
-          if (cached) return cached;
-          // Fallback for HTML pages
-          if (event.request.headers.get('accept').includes('text/html')) {
-            return caches.match('/');
-          }
-        });
-      })
-  );
-});
\ No newline at end of file
+  if (path.startsWith(CONFIG.staticUrl)) {
+    // Only hashed names are kept: an unhashed file can change under its name
+    event.respondWith(cacheFirst(request, HASHED_NAME.test(path) ? STATIC_CACHE : null));
+    return;
+  }
+
+  if (path.startsWith(CONFIG.mediaUrl)) {
+    event.respondWith(staleWhileRevalidate(event, IMAGE_CACHE, CONFIG.imageLimits));
+    return;
+  }
+
+  if (path.startsWith(CONFIG.catalogUrl)) {
+    event.respondWith(staleWhileRevalidate(event, CATALOG_CACHE, CONFIG.catalogLimits));
+    return;
+  }
+
+  // Pages may be personalised (prices, cart count), so they are never cached
+  if (request.mode === 'navigate') {
+    event.respondWith(networkWithOfflinePage(request));
+  }
+});
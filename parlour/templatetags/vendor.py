@@ -0,0 +1,11 @@
+from django import template
+
+from parlour import static_assets
+
+register = template.Library()
+
+
+@register.simple_tag
+def vendor(name):
+    """{% vendor 'chart.js' %} — include a library from parlour.static_assets.VENDOR_ASSETS."""
+    return static_assets.include(name)
@@ -1,6 +1,5 @@
 from django.urls import path
-from . import views
-from django.views.decorators.cache import never_cache
+from . import api, service_worker, views
 from django.views.generic import TemplateView
 
 urlpatterns = [
@@ -48,6 +47,7 @@ urlpatterns = [
     path('orders/', views.orders_dashboard, name='orders_dashboard'),
     path('orders/<int:order_id>/', views.order_detail, name='order_detail'),
     path('orders/<int:order_id>/update-status/', views.update_order_status, name='update_order_status'),
+    path('orders/bulk-status/', views.bulk_update_order_status, name='bulk_update_order_status'),
 
     # Advertisement Management URLs
     path('ads/', views.ad_list, name='ad_list'),
@@ -61,25 +61,33 @@ urlpatterns = [
 
     path('wishlist/', views.wishlist_page, name='wishlist'),
     path('wishlist/toggle/<int:product_id>/', views.toggle_wishlist, name='toggle_wishlist'),
+    path('wishlist/status/', views.wishlist_status_bulk, name='wishlist_status_bulk'),
     path('wishlist/status/<int:product_id>/', views.wishlist_status, name='wishlist_status'),
 
 
 
     path('hoka/delivery/', views.delivery_dashboard, name='delivery_dashboard'),
+    path('hoka/delivery/manifest/', views.delivery_manifest_view, name='delivery_manifest'),
     path('hoka/delivery/<int:order_id>/', views.delivery_detail, name='delivery_detail'),
     path('hoka/delivery/stk-push/<int:order_id>/', views.delivery_stk_push, name='delivery_stk_push'),
     path('hoka/delivery/mark-delivered/<int:order_id>/', views.mark_delivered, name='mark_delivered'),
     path('hoka/delivery/payment-status/<int:order_id>/', views.delivery_payment_status, name='delivery_payment_status'),
-    path('sw.js', never_cache(TemplateView.as_view(
-        template_name='sw.js',
-        content_type='application/javascript'
-    )), name='sw'),
+    # Read-only catalog API for the PWA
+    path('api/v1/products/', api.products, name='api_products'),
+    path('api/v1/products/<int:product_id>/', api.product, name='api_product'),
+    path('api/v1/categories/', api.categories, name='api_categories'),
+    path('api/v1/ads/', api.ads, name='api_ads'),
+    path('api/v1/delivery/', api.delivery, name='api_delivery'),
+
+    path('sw.js', service_worker.service_worker, name='sw'),
+    path('offline/', TemplateView.as_view(template_name=service_worker.OFFLINE_TEMPLATE), name='offline'),
     path('clear-whatsapp-popup/', views.clear_whatsapp_popup, name='clear_whatsapp_popup'),
 
 
     # Product Management (Staff Only)
     path('manage-products/', views.manage_products, name='manage_products'),
     path('add-product/', views.add_product, name='add_product'),
+    path('import-products/', views.import_products, name='import_products'),
     path('edit-product/<int:product_id>/', views.edit_product, name='edit_product'),
     path('delete-product/<int:product_id>/', views.delete_product, name='delete_product'),
     path('delete-product-image/<int:image_id>/', views.delete_product_image, name='delete_product_image'),
@@ -10,7 +10,7 @@ from django.utils import timezone
 from django.db import models, transaction
 from django.db.models import F
 from .models import Product, Order, OrderItem, EmailOTP, StoreSettings, Advertisement, AdImpression, Category, Agent
-from .email_utils import send_order_confirmation_email
+from .email_utils import build_email, send_emails, send_order_confirmation_email
 import random
 import logging
 from django.contrib.admin.views.decorators import staff_member_required
@@ -19,12 +19,55 @@ from django.contrib.auth.decorators import login_required
 from django.db.models import Count, Q, Max
 from collections import defaultdict
 from .models import (
-    Product, Category, Order, OrderItem, OrderHistory,
+    Product, Category, Order, OrderItem,
     Advertisement, AdImage, AdImpression, MpesaPayment,
     Profile, EmailOTP, ProductView, UserPreference,
-    Agent, PromoUsage, Wishlist,
+    Agent, PromoUsage, Wishlist, Store,
+)
+from . import ad_index, customers, delivery_manifest, order_lifecycle, otp, phones, pricing, referrals, wishlists
+from .page_cache import (
+    cache_anonymous_page, device_class, invalidate as invalidate_page_cache,
+    TAG_PRODUCT, TAG_ADS, TAG_CATEGORY, TAG_SETTINGS,
 )
 
+logger = logging.getLogger(__name__)
+
+def record_ad_impressions(request, ad_ids):
+    """Log one impression per ad shown and bump their view counters."""
+    if not ad_ids:
+        return
+
+    session_key = request.session.session_key
+    if not session_key:
+        request.session.save()
+        session_key = request.session.session_key
+
+    try:
+        AdImpression.objects.bulk_create([
+            AdImpression(
+                advertisement_id=ad_id,
+                session_key=session_key,
+                ip_address=request.META.get('REMOTE_ADDR') or None,
+                user_agent=request.META.get('HTTP_USER_AGENT', '')[:255],
+            )
+            for ad_id in ad_ids
+        ])
+        Advertisement.objects.filter(id__in=ad_ids).update(views=F('views') + 1)
+    except Exception as e:
+        logger.error(f"Error recording impressions: {e}")
+
+
+def _replay_ad_impressions(request, meta):
+    record_ad_impressions(request, (meta or {}).get('ad_ids', []))
+
+
+HOME_FILTER_PARAMS = ('category', 'min_price', 'max_price', 'gender')
+
+
+@cache_anonymous_page(
+    TAG_PRODUCT, TAG_ADS, TAG_CATEGORY, TAG_SETTINGS,
+    vary_on_device=True, query_params=HOME_FILTER_PARAMS, on_hit=_replay_ad_impressions,
+)
 def home(request):
     from django.db.models import Sum
     import json
@@ -58,64 +101,10 @@ def home(request):
         total_sold=Sum('orderitem__quantity')
     ).order_by('-total_sold')[:8]
 
-    # ── User promo status ─────────────────────────────────────────
-    user_promo = None
-    if request.user.is_authenticated:
-        try:
-            user_promo = request.user.promousage
-        except Exception:
-            pass
-
-    # ── Active ads helper ─────────────────────────────────────────
-    now = timezone.now()
-
-    def get_active_ads(queryset):
-        queryset = queryset.filter(
-            models.Q(start_date__isnull=True) | models.Q(start_date__lte=now)
-        ).filter(
-            models.Q(end_date__isnull=True) | models.Q(end_date__gte=now)
-        )
-        user_agent = request.META.get('HTTP_USER_AGENT', '').lower()
-        is_mobile = any(x in user_agent for x in ['mobile', 'android', 'iphone', 'phone'])
-        is_tablet = any(x in user_agent for x in ['ipad', 'tablet'])
-
-        result = []
-        for ad in queryset:
-            if is_mobile and not ad.show_on_mobile:
-                continue
-            if is_tablet and not ad.show_on_tablet:
-                continue
-            if not is_mobile and not is_tablet and not ad.show_on_desktop:
-                continue
-            result.append(ad)
-        return result
-
-    # ── Session for impression tracking ──────────────────────────
-    session_key = request.session.session_key
-    if not session_key:
-        request.session.save()
-        session_key = request.session.session_key
-
-    def record_impressions(ads_list):
-        for ad in ads_list:
-            try:
-                AdImpression.objects.create(
-                    advertisement=ad,
-                    session_key=session_key,
-                    ip_address=request.META.get('REMOTE_ADDR', ''),
-                    user_agent=request.META.get('HTTP_USER_AGENT', '')[:255]
-                )
-                ad.increment_views()
-            except Exception as e:
-                print(f"Error recording impression: {e}")
-
-    # ── Main (hero) ads ───────────────────────────────────────────
-    main_ads_qs = Advertisement.objects.filter(
-        is_active=True,
-        ad_category='main',
-    ).order_by('order', '-created_at')
-    main_ads = get_active_ads(main_ads_qs)
-    record_impressions(main_ads)
+    # ── Main (hero) ads — from the in-memory ad index ─────────────
+    device = device_class(request)
+    main_ads = ad_index.get_ads('main', device=device)
+    shown_ad_ids = [ad.id for ad in main_ads]
 
     # ── Category sections with their own ads ──────────────────────
     category_sections = []
@@ -126,13 +115,8 @@ def home(request):
         if not cat_products.exists():
             continue
 
-        cat_ads_qs = Advertisement.objects.filter(
-            is_active=True,
-            product_category=cat,
-        ).exclude(ad_category='main').order_by('order', '-created_at')
-
-        cat_ads = get_active_ads(cat_ads_qs)
-        record_impressions(cat_ads)
+        cat_ads = ad_index.get_ads(ad_index.SECTION, cat.id, device)
+        shown_ad_ids.extend(ad.id for ad in cat_ads)
 
         category_sections.append({
             'category': cat,
@@ -179,9 +163,13 @@ def home(request):
         'slideshow_data': json.dumps(slideshow_data),
         'category_sections': category_sections,
         'top_selling': top_selling,
-        'user_promo': user_promo,
     }
-    return render(request, 'parlour/home.html', context)
+    record_ad_impressions(request, shown_ad_ids)
+
+    response = render(request, 'parlour/home.html', context)
+    # Cache hits replay the impressions for the ads baked into the page
+    response.page_cache_meta = {'ad_ids': shown_ad_ids}
+    return response
 
 
 # ── New: For You view ─────────────────────────────────────────────────────────
@@ -236,16 +224,12 @@ def for_you(request):
 
     # ── Signal 1: Promo strip ────────────────────────────────────────────────
     promo_products = []
-    remaining = 0
-    try:
-        promo = user.promousage
-        if promo.is_active and promo.promo_purchases_count < 5:
-            remaining = 5 - promo.promo_purchases_count
-            promo_products = list(Product.objects.filter(
-                discount_price__isnull=False
-            ).order_by('?')[:10])
-    except Exception:
-        pass
+    promo = pricing.promo_for_request(request)
+    remaining = promo.remaining or 0
+    if promo.active:
+        promo_products = list(Product.objects.filter(
+            discount_price__isnull=False
+        ).order_by('?')[:10])
 
     # ── Signal 2: Buy again ──────────────────────────────────────────────────
     bought_ids = list(
@@ -341,7 +325,8 @@ def for_you(request):
         # pass quiz context so "Update preferences" re-renders the form correctly
         **quiz_context,
     })
-    
+
+@cache_anonymous_page(TAG_PRODUCT, TAG_CATEGORY, TAG_SETTINGS)
 def product_detail(request, product_id):
     product = get_object_or_404(Product, id=product_id)
     sizes = [size.strip() for size in product.available_sizes.split(',')]
@@ -379,14 +364,7 @@ def product_detail(request, product_id):
             )
 
     # ── Pricing info ──────────────────────────────────────────────
-    user_promo = None
-    if request.user.is_authenticated:
-        try:
-            user_promo = request.user.promousage
-        except Exception:
-            pass
-
-    prices = product.get_display_prices(request.user)
+    prices = pricing.display_prices(product, pricing.promo_for_request(request))
 
     # ── Delivery info (respects auto-warehouse switching) ─────────
     delivery_info = product.get_delivery_info()
@@ -396,7 +374,6 @@ def product_detail(request, product_id):
         'sizes': sizes,
         'all_images': all_images,
         'recommended_products': recommended_products,
-        'user_promo': user_promo,
         'prices': prices,
         'delivery_info': delivery_info,
     }
@@ -412,6 +389,19 @@ from decimal import Decimal
 def is_staff_user(user):
     return user.is_staff
 
+
+def _add_product_images(product, files, start):
+    """Save uploaded files and insert their ProductImage rows in one statement."""
+    images = []
+    for idx, img_file in enumerate(files):
+        image = ProductImage(product=product, order=start + idx)
+        image.image.save(img_file.name, img_file, save=False)
+        images.append(image)
+    ProductImage.objects.bulk_create(images)
+    # bulk_create skips post_save, so refresh the cached storefront pages here
+    invalidate_page_cache(TAG_PRODUCT)
+
+
 @login_required
 @user_passes_test(is_staff_user)
 def manage_products(request):
@@ -467,12 +457,8 @@ def add_product(request):
 
             # Handle additional images
             additional_images = request.FILES.getlist('additional_images')
-            for idx, img_file in enumerate(additional_images):
-                ProductImage.objects.create(
-                    product=product,
-                    image=img_file,
-                    order=idx,
-                )
+            if additional_images:
+                _add_product_images(product, additional_images, start=0)
 
             messages.success(request, f'Product "{product.name}" added successfully!')
             return redirect('manage_products')
@@ -508,12 +494,9 @@ def edit_product(request, product_id):
             
             # Handle additional images
             additional_images = request.FILES.getlist('additional_images')
-            for idx, img_file in enumerate(additional_images):
-                ProductImage.objects.create(
-                    product=product,
-                    image=img_file,
-                    order=product.additional_images.count() + idx
-                )
+            if additional_images:
+                last = product.additional_images.aggregate(last=Max('order'))['last']
+                _add_product_images(product, additional_images, start=0 if last is None else last + 1)
             
             messages.success(request, f'Product "{product.name}" updated successfully!')
             return redirect('manage_products')
@@ -556,6 +539,44 @@ def delete_product_image(request, image_id):
     messages.success(request, 'Image deleted successfully!')
     return redirect('edit_product', product_id=product_id)
 
+
+@login_required
+@user_passes_test(is_staff_user)
+def import_products(request):
+    """Bulk create / update products from a CSV or JSON file plus an image ZIP."""
+    from .catalog_import import import_catalog
+
+    result = None
+    if request.method == 'POST':
+        catalog = request.FILES.get('catalog')
+        images_zip = request.FILES.get('images')
+        store_id = request.POST.get('store') or None
+        dry_run = request.POST.get('dry_run') == 'on'
+
+        if not catalog:
+            messages.error(request, 'Choose a CSV or JSON catalog file to import.')
+        else:
+            store = get_object_or_404(Store, pk=store_id) if store_id else None
+            try:
+                result = import_catalog(
+                    catalog.file, catalog.name,
+                    images_zip=images_zip, store=store, dry_run=dry_run,
+                )
+            except Exception as e:
+                logger.error(f"Catalog import failed: {e}", exc_info=True)
+                messages.error(request, f'Import failed: {e}')
+            else:
+                prefix = 'Dry run — ' if dry_run else ''
+                level = messages.success if result.ok else messages.warning
+                level(request, f'{prefix}{result.summary()}')
+
+    context = {
+        'stores': Store.objects.filter(status='approved').order_by('store_name'),
+        'result': result,
+        'errors': result.errors[:200] if result else [],
+    }
+    return render(request, 'parlour/import_products.html', context)
+
 def ad_click(request, ad_id):
     """Track ad clicks and redirect"""
     ad = get_object_or_404(Advertisement, id=ad_id)
@@ -579,24 +600,15 @@ def add_to_cart(request, product_id):
         quantity = int(request.POST.get('quantity', 1))
         size = request.POST.get('size', '')
 
-        # ── Get correct price for this user ──
-        price = product.get_price_for_user(request.user)
+        # ── Quote the price for this user ──
+        price_quote = pricing.quote(product, pricing.promo_for_request(request))
 
         cart = request.session.get('cart', {})
         cart_key = f"{product_id}_{size}"
 
         if cart_key in cart:
-            cart[cart_key]['quantity'] += quantity
-        else:
-            cart[cart_key] = {
-                'product_id': product_id,
-                'name': product.name,
-                'price': str(price),
-                'original_price': str(product.price),
-                'is_promo_price': price < product.price,
-                'quantity': quantity,
-                'size': size
-            }
+            quantity += cart[cart_key]['quantity']
+        cart[cart_key] = pricing.cart_item(product, quantity, size, price_quote)
 
         request.session['cart'] = cart
         messages.success(request, f'{product.name} added to cart!')
@@ -607,41 +619,41 @@ def add_to_cart(request, product_id):
 
 def cart(request):
     cart = request.session.get('cart', {})
-    cart_items = []
-    total = 0
+    promo = pricing.promo_for_request(request)
 
     # Get promo info for display
     promo_info = None
-    if request.user.is_authenticated:
-        try:
-            promo = request.user.promousage
-            if promo.is_active:
-                promo_info = {
-                    'remaining': promo.remaining_promo_purchases(),
-                    'count': promo.promo_purchases_count,
-                }
-        except Exception:
-            pass
-
-    for key, item in cart.items():
-        product = Product.objects.get(id=item['product_id'])
-        subtotal = float(item['price']) * item['quantity']
-        total += subtotal
-
-        cart_items.append({
-            'key': key,
-            'product': product,
-            'quantity': item['quantity'],
-            'size': item['size'],
-            'price': item['price'],
-            'original_price': item.get('original_price', item['price']),
-            'is_promo_price': item.get('is_promo_price', False),
-            'subtotal': subtotal
-        })
+    if promo.remaining is not None:
+        promo_info = {
+            'remaining': promo.remaining,
+            'count': promo.purchases,
+        }
+
+    # ── Re-price every line from the database ──
+    cart_quote = pricing.quote_cart(cart, promo)
+    if cart_quote.missing or cart_quote.changed or cart_quote.resplit:
+        request.session['cart'] = pricing.refresh_cart(cart, cart_quote)
+        if cart_quote.changed:
+            messages.info(request, 'Some prices in your cart have changed since you added them.')
+
+    cart_items = [
+        {
+            'key': line.key,
+            'product': line.product,
+            'quantity': line.quantity,
+            'size': line.size,
+            'price': line.quote.price,
+            'original_price': line.quote.list_price,
+            'is_promo_price': line.quote.is_promo,
+            'promo_quantity': line.promo_quantity,
+            'subtotal': line.subtotal,
+        }
+        for line in cart_quote.lines
+    ]
 
     context = {
         'cart_items': cart_items,
-        'total': total,
+        'total': cart_quote.total,
         'promo_info': promo_info,
     }
     return render(request, 'parlour/cart.html', context)
@@ -671,26 +683,24 @@ def checkout(request):
         delivery_address = request.POST.get('delivery_address')
         payment_method = request.POST.get('payment_method')
         
+        # ── Re-price the cart from the database (one query) ──
+        cart_quote = pricing.quote_cart(cart, pricing.promo_for_request(request))
+        if cart_quote.missing:
+            request.session['cart'] = pricing.refresh_cart(cart, cart_quote)
+            messages.error(request, 'Some items in your cart are no longer available.')
+            return redirect('cart')
+
         # Check stock availability
-        for key, item in cart.items():
-            product = Product.objects.get(id=item['product_id'])
-            if product.stock_quantity < item['quantity']:
-                messages.error(request, f'Sorry, only {product.stock_quantity} units of {product.name} available in stock.')
+        for line in cart_quote.lines:
+            if line.product.stock_quantity < line.quantity:
+                messages.error(request, f'Sorry, only {line.product.stock_quantity} units of {line.product.name} available in stock.')
                 return redirect('cart')
-        
-                # ── Calculate total using cart prices (already promo-adjusted) ──
-        order_total = sum(float(item['price']) * item['quantity'] for item in cart.values())
 
-        # ── Update promo counter if user has active promo ──
-        if request.user.is_authenticated:
-            try:
-                promo = request.user.promousage
-                if promo.is_active:
-                    # Count total products in this order
-                    total_products = sum(item['quantity'] for item in cart.values())
-                    promo.use_promo(total_products)
-            except Exception:
-                pass
+        cart = pricing.refresh_cart(cart, cart_quote)
+        request.session['cart'] = cart
+        order_total = float(cart_quote.total)
+
+        # Promo purchases are counted when the order is created (referrals.record_order)
 
         # Store order details in session for payment processing
         request.session['pending_order'] = {
@@ -699,6 +709,7 @@ def checkout(request):
             'email': email,
             'delivery_address': delivery_address,
             'payment_method': payment_method,
+            'user_id': request.user.pk,
             'cart': cart,
             'total': order_total
         }
@@ -726,21 +737,21 @@ def checkout(request):
             return redirect('process_cash_order')
     
     # GET request - prepare the form
-    cart_items = []
-    total = 0
-    
-    for key, item in cart.items():
-        product = Product.objects.get(id=item['product_id'])
-        subtotal = float(item['price']) * item['quantity']
-        total += subtotal
-        
-        cart_items.append({
-            'product': product,
-            'quantity': item['quantity'],
-            'size': item['size'],
-            'price': item['price'],
-            'subtotal': subtotal
-        })
+    cart_quote = pricing.quote_cart(cart, pricing.promo_for_request(request))
+    cart_items = [
+        {
+            'product': line.product,
+            'quantity': line.quantity,
+            'size': line.size,
+            'price': line.quote.price,
+            'original_price': line.quote.list_price,
+            'is_promo_price': line.quote.is_promo,
+            'promo_quantity': line.promo_quantity,
+            'subtotal': line.subtotal,
+        }
+        for line in cart_quote.lines
+    ]
+    total = cart_quote.total
     
     # Check if user is authenticated and has profile data
     profile_data = {
@@ -807,25 +818,30 @@ def process_cash_order(request):
         customer_name=pending_order['customer_name'],
         phone_number=pending_order['phone_number'],
         email=pending_order['email'],
-        delivery_address=pending_order['delivery_address']
+        delivery_address=pending_order['delivery_address'],
+        customer=customers.for_checkout(pending_order),
     )
     
     # Create order items and reduce stock
+    promo_budget = pricing.PromoBudget(pending_order.get('user_id'))
     for key, item in pending_order['cart'].items():
         product = get_object_or_404(Product, id=item['product_id'])
         
-        OrderItem.objects.create(
-            order=order,
-            product=product,
-            quantity=item['quantity'],
-            price=Decimal(str(item['price'])),  # ← use cart price (already promo-adjusted)
-            size=item['size']
-        )
+        for quantity, price in pricing.verified_prices(item, product, promo_budget):
+            OrderItem.objects.create(
+                order=order,
+                product=product,
+                quantity=quantity,
+                price=price,
+                size=item['size']
+            )
         
         # Safely reduce stock quantity to prevent race conditions
         if product.stock_type == 'ready':
             product.stock_quantity = F('stock_quantity') - item['quantity']
             product.save(update_fields=['stock_quantity'])
+
+    referrals.record_order(order, pending_order.get('user_id'))
     
     # Send confirmation email
     email_sent = send_order_confirmation_email(order)
@@ -919,122 +935,6 @@ from django import forms
 logger = logging.getLogger(__name__)
 
 
-def generate_otp():
-    """Generate a 6-digit OTP"""
-    return ''.join(random.choices(string.digits, k=6))
-
-
-def send_otp_email_to_address(email, username, otp):
-    """Send OTP email with error handling and logging"""
-    try:
-        subject = "Your OTP Verification Code - Qunimart"
-
-        html_message = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{
-                    font-family: 'Inter', Arial, sans-serif;
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    margin: 0;
-                    padding: 20px;
-                }}
-                .container {{
-                    max-width: 600px;
-                    margin: 0 auto;
-                    background: white;
-                    border-radius: 20px;
-                    padding: 40px;
-                    box-shadow: 0 20px 40px rgba(0,0,0,0.1);
-                }}
-                .header {{
-                    text-align: center;
-                    margin-bottom: 30px;
-                }}
-                .logo {{
-                    font-size: 32px;
-                    font-weight: 800;
-                    color: #333;
-                    font-family: 'Playfair Display', serif;
-                }}
-                .logo span {{
-                    color: #7b2eda;
-                }}
-                .otp-code {{
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: white;
-                    font-size: 48px;
-                    font-weight: bold;
-                    padding: 20px;
-                    text-align: center;
-                    border-radius: 16px;
-                    letter-spacing: 10px;
-                    margin: 30px 0;
-                    font-family: monospace;
-                }}
-                .footer {{
-                    text-align: center;
-                    margin-top: 30px;
-                    color: #666;
-                    font-size: 14px;
-                    border-top: 1px solid #eee;
-                    padding-top: 20px;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <div class="logo">HOKA'S<span>PARLOUR</span></div>
-                    <p style="color: #666; margin-top: 10px;">Welcome to Qunimart!</p>
-                </div>
-
-                <h2 style="text-align: center; color: #333;">Email Verification</h2>
-
-                <p style="color: #666; font-size: 16px; line-height: 1.6;">
-                    Hello <strong>{username}</strong>,<br><br>
-                    Thank you for signing up! Please use the OTP code below to verify your email address:
-                </p>
-
-                <div class="otp-code">
-                    {otp}
-                </div>
-
-                <p style="color: #666; font-size: 16px; line-height: 1.6;">
-                    This code will expire in 10 minutes.<br>
-                    If you didn't request this, please ignore this email.
-                </p>
-
-                <div class="footer">
-                    <p>© 2026 Qunimart. All rights reserved.</p>
-                    <p style="color: #999; font-size: 12px;">Rongai, Kajiado County, Kenya</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-
-        email_msg = EmailMessage(
-            subject=subject,
-            body=html_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[email],
-        )
-        email_msg.content_subtype = "html"
-        sent_count = email_msg.send(fail_silently=False)
-
-        logger.info(f"Email sent successfully to {email}. Result: {sent_count}")
-        return True
-
-    except Exception as e:
-        logger.error(f"Failed to send email to {email}: {str(e)}")
-        print(f"\n{'='*50}")
-        print(f"🔐 OTP for {email}: {otp}")
-        print(f"{'='*50}\n")
-        raise e
-
-
 def user_signup(request):
     if request.method == 'POST':
         form = UserCreationForm(request.POST)
@@ -1054,24 +954,22 @@ def user_signup(request):
                 messages.error(request, 'This username is already taken.')
                 return render(request, 'parlour/signup.html', {'form': form})
 
-            # Generate OTP
-            otp = generate_otp()
+            # Code goes to the OTP store; the email is sent in the background
+            try:
+                code = otp.issue(otp.PURPOSE_SIGNUP, email, ip=otp.client_ip(request))
+            except otp.OTPRateLimited as e:
+                messages.error(request, f'Too many codes requested. Please try again in {e.retry_minutes} minute(s).')
+                return render(request, 'parlour/signup.html', {'form': form})
 
             # Store signup data in session (no user created yet)
             request.session['pending_signup'] = {
                 'username': username,
                 'email': email,
                 'password': form.cleaned_data['password1'],
-                'otp': otp,
             }
 
-            # Send OTP email
-            try:
-                send_otp_email_to_address(email, username, otp)
-                messages.success(request, f'✅ An OTP has been sent to {email}. Please check your inbox (and spam folder).')
-            except Exception as e:
-                messages.warning(request, f'⚠️ Email sending failed. For development, your OTP is: {otp}')
-                logger.error(f"Email sending failed: {e}")
+            otp.send_email_code(email, username, code)
+            messages.success(request, f'✅ An OTP has been sent to {email}. Please check your inbox (and spam folder).')
 
             return redirect('verify_otp')
         else:
@@ -1096,20 +994,18 @@ def verify_otp(request):
 
         # Resend OTP
         if action == 'resend':
-            new_otp = generate_otp()
-            request.session['pending_signup']['otp'] = new_otp
-            request.session.modified = True
-
             try:
-                send_otp_email_to_address(pending['email'], pending['username'], new_otp)
+                code = otp.issue(otp.PURPOSE_SIGNUP, pending['email'], ip=otp.client_ip(request))
+            except otp.OTPRateLimited as e:
+                messages.error(request, f'Too many codes requested. Please try again in {e.retry_minutes} minute(s).')
+            else:
+                otp.send_email_code(pending['email'], pending['username'], code)
                 messages.success(request, f"✅ A new OTP has been sent to {pending['email']}")
-            except Exception as e:
-                messages.warning(request, f'⚠️ New OTP: {new_otp}')
 
             return redirect('verify_otp')
 
         # Verify OTP
-        if otp_input == pending.get('otp'):
+        if otp.verify(otp.PURPOSE_SIGNUP, pending['email'], otp_input):
             try:
                 # OTP correct — now create the user
                 user = User.objects.create_user(
@@ -1124,7 +1020,7 @@ def verify_otp(request):
                 del request.session['pending_signup']
 
                 # Log the user in
-                login(request, user)
+                login(request, user, backend='django.contrib.auth.backends.ModelBackend')
 
                 # ── Referral code handling ────────────────────────────
                 referral_code = request.session.pop('referral_code', None)
@@ -1166,6 +1062,8 @@ def verify_otp(request):
                 messages.error(request, 'An error occurred while creating your account. Please sign up again.')
                 del request.session['pending_signup']
                 return redirect('signup')
+        elif not otp.has_live_code(otp.PURPOSE_SIGNUP, pending['email']):
+            messages.error(request, '❌ This OTP has expired. Please request a new one.')
         else:
             messages.error(request, '❌ Invalid OTP. Please try again.')
 
@@ -1177,7 +1075,9 @@ def user_logout(request):
 
 
 
-from .lipana_utils import stk_push
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404
+from .lipana_utils import astk_push
 
 
 
@@ -1185,8 +1085,8 @@ from decimal import Decimal
 from django.http import JsonResponse
 from .models import MpesaPayment
 
-def mpesa_payment(request):
-    pending_order = request.session.get('pending_order')
+async def mpesa_payment(request):
+    pending_order = await request.session.aget('pending_order')
 
     if not pending_order:
         messages.error(request, 'No pending order found.')
@@ -1196,23 +1096,22 @@ def mpesa_payment(request):
     stk_error = None
 
     # Only block re-submission on GET, not POST
-    existing_checkout_id = request.session.get('checkout_request_id')
+    existing_checkout_id = await request.session.aget('checkout_request_id')
 
     if request.method == 'POST':
         # Always allow a fresh POST (user clicked Pay button)
         # Clear any old checkout_request_id first
-        if 'checkout_request_id' in request.session:
-            del request.session['checkout_request_id']
+        await request.session.apop('checkout_request_id', None)
 
         phone = pending_order['phone_number']
         amount = pending_order['total']
         temp_ref = f"TEMP{request.session.session_key[-6:]}"
-        result = stk_push(phone, amount, temp_ref)
+        result = await astk_push(phone, amount, temp_ref)
 
         if result['success']:
             checkout_request_id = result['checkout_request_id']
 
-            MpesaPayment.objects.create(
+            await MpesaPayment.objects.acreate(
                 checkout_request_id=checkout_request_id,
                 phone_number=phone,
                 amount=Decimal(str(amount)),
@@ -1221,7 +1120,7 @@ def mpesa_payment(request):
                 status='pending'
             )
 
-            request.session['checkout_request_id'] = checkout_request_id
+            await request.session.aset('checkout_request_id', checkout_request_id)
             
             # Redirect to the new processing page
             return redirect('payment_processing', checkout_id=checkout_request_id)
@@ -1234,29 +1133,80 @@ def mpesa_payment(request):
         'pending_order': pending_order,
         'stk_error': stk_error,
     }
-    return render(request, 'parlour/mpesa_payment.html', context)
+    return await sync_to_async(render)(request, 'parlour/mpesa_payment.html', context)
+
+def _create_paid_order(payment):
+    """Create the order a successful payment is for, from its order_details."""
+    order_data = payment.order_details
+
+    # Create the order
+    order = Order.objects.create(
+        customer_name=order_data['customer_name'],
+        phone_number=order_data['phone_number'],
+        email=order_data['email'],
+        delivery_address=order_data['delivery_address'],
+        customer=customers.for_checkout(order_data),
+        is_paid=True  # Mark order as paid
+    )
+
+    # Link payment to the new order
+    payment.order = order
+    payment.save(update_fields=['order'])
+
+    # Create order items and reduce stock
+    promo_budget = pricing.PromoBudget(order_data.get('user_id'))
+    for key, item in order_data['cart'].items():
+        try:
+            product = Product.objects.get(id=item['product_id'])
+            for quantity, price in pricing.verified_prices(item, product, promo_budget):
+                OrderItem.objects.create(
+                    order=order,
+                    product=product,
+                    quantity=quantity,
+                    price=price,
+                    size=item['size']
+                )
+            # Safely reduce stock for 'ready' items
+            if product.stock_type == 'ready':
+                product.stock_quantity = F('stock_quantity') - item['quantity']
+                product.save(update_fields=['stock_quantity'])
+        except Product.DoesNotExist:
+            # Log if a product in the cart doesn't exist anymore
+            logger.warning(f"Product with ID {item['product_id']} not found during order creation for Order #{order.id}.")
+            continue
+
+    referrals.record_order(order, order_data.get('user_id'))
+
+    # Send confirmation email
+    send_order_confirmation_email(order)
+    return order
+
 
-def check_payment_status(request):
+async def _clear_checkout_session(request):
+    await request.session.apop('pending_order', None)
+    await request.session.aset('cart', {})
+    await request.session.apop('checkout_request_id', None)
+
+
+async def check_payment_status(request):
     """
     API endpoint to check payment status.
     This view is now idempotent and resilient to session loss.
     """
-    checkout_request_id = request.session.get('checkout_request_id')
+    checkout_request_id = await request.session.aget('checkout_request_id')
     
     if not checkout_request_id:
         return JsonResponse({'status': 'error', 'message': 'No payment session found.'})
     
     try:
-        payment = MpesaPayment.objects.get(checkout_request_id=checkout_request_id)
+        payment = await MpesaPayment.objects.select_related('order').aget(checkout_request_id=checkout_request_id)
         
         # --- SUCCESS ---
         if payment.status == 'success':
             # If order is already created (by webhook or another poll), just return success
             if payment.order:
                 # Ensure session is cleaned up even if order was created by webhook
-                if 'pending_order' in request.session: del request.session['pending_order']
-                if 'cart' in request.session: request.session['cart'] = {}
-                if 'checkout_request_id' in request.session: del request.session['checkout_request_id']
+                await _clear_checkout_session(request)
                 
                 return JsonResponse({
                     'status': 'success',
@@ -1266,50 +1216,13 @@ def check_payment_status(request):
 
             # If order does not exist, create it now.
             # This is the primary order creation logic.
-            order_data = payment.order_details
-            if not order_data:
+            if not payment.order_details:
                 return JsonResponse({'status': 'error', 'message': 'Critical: Order details not found in payment record.'})
 
-            # Create the order
-            order = Order.objects.create(
-                customer_name=order_data['customer_name'],
-                phone_number=order_data['phone_number'],
-                email=order_data['email'],
-                delivery_address=order_data['delivery_address'],
-                is_paid=True  # Mark order as paid
-            )
-
-            # Link payment to the new order
-            payment.order = order
-            payment.save(update_fields=['order'])
-
-            # Create order items and reduce stock
-            for key, item in order_data['cart'].items():
-                try:
-                    product = Product.objects.get(id=item['product_id'])
-                    OrderItem.objects.create(
-                        order=order,
-                        product=product,
-                        quantity=item['quantity'],
-                        price=product.price,  # Use fresh price from DB
-                        size=item['size']
-                    )
-                    # Safely reduce stock for 'ready' items
-                    if product.stock_type == 'ready':
-                        product.stock_quantity = F('stock_quantity') - item['quantity']
-                        product.save(update_fields=['stock_quantity'])
-                except Product.DoesNotExist:
-                    # Log if a product in the cart doesn't exist anymore
-                    logger.warning(f"Product with ID {item['product_id']} not found during order creation for Order #{order.id}.")
-                    continue
-
-            # Send confirmation email
-            send_order_confirmation_email(order)
+            order = await sync_to_async(_create_paid_order)(payment)
             
             # Clear session data *after* successful processing
-            if 'pending_order' in request.session: del request.session['pending_order']
-            request.session['cart'] = {}
-            if 'checkout_request_id' in request.session: del request.session['checkout_request_id']
+            await _clear_checkout_session(request)
             
             return JsonResponse({
                 'status': 'success',
@@ -1354,8 +1267,7 @@ def mpesa_callback(request):
             result_desc = callback.get('ResultDesc')
             checkout_request_id = callback.get('CheckoutRequestID')
             
-            print(f"M-Pesa Callback - ResultCode: {result_code}, Desc: {result_desc}")
-            print(f"CheckoutRequestID: {checkout_request_id}")
+            logger.info(f"M-Pesa callback: ResultCode={result_code}, Desc={result_desc}, CheckoutRequestID={checkout_request_id}")
             
             # Find payment record
             try:
@@ -1382,24 +1294,24 @@ def mpesa_callback(request):
                                 trans_date_str, '%Y%m%d%H%M%S'
                             )
                     
-                    print(f"Payment successful - Receipt: {payment.mpesa_receipt_number}")
+                    logger.info(f"M-Pesa payment successful — receipt {payment.mpesa_receipt_number}")
                     
                 elif result_code == 1032:
                     # User cancelled
                     payment.status = 'cancelled'
-                    print(f"Payment cancelled by user")
+                    logger.info(f"M-Pesa payment cancelled by user: {checkout_request_id}")
                 else:
                     # Payment failed
                     payment.status = 'failed'
-                    print(f"Payment failed - {result_desc}")
+                    logger.warning(f"M-Pesa payment failed: {result_desc}")
                 
                 payment.save()
                 
             except MpesaPayment.DoesNotExist:
-                print(f"Payment record not found for: {checkout_request_id}")
+                logger.error(f"M-Pesa callback: payment record not found for {checkout_request_id}")
                 
         except Exception as e:
-            print(f"Callback error: {e}")
+            logger.error(f"M-Pesa callback error: {e}", exc_info=True)
     
     return JsonResponse({'ResultCode': 0, 'ResultDesc': 'Success'})
 
@@ -1437,6 +1349,7 @@ def confirm_mpesa_payment(request):
                 phone_number=order_data['phone_number'],
                 email=order_data['email'],
                 delivery_address=order_data['delivery_address'],
+                customer=customers.for_checkout(order_data),
                 is_paid=True  # Manually confirmed as paid
             )
 
@@ -1447,22 +1360,26 @@ def confirm_mpesa_payment(request):
             payment.save()
 
             # Create order items and reduce stock
+            promo_budget = pricing.PromoBudget(order_data.get('user_id'))
             for key, item in order_data['cart'].items():
                 try:
                     product = Product.objects.get(id=item['product_id'])
-                    OrderItem.objects.create(
-                        order=order,
-                        product=product,
-                        quantity=item['quantity'],
-                        price=product.price,  # Use fresh price
-                        size=item['size']
-                    )
+                    for quantity, price in pricing.verified_prices(item, product, promo_budget):
+                        OrderItem.objects.create(
+                            order=order,
+                            product=product,
+                            quantity=quantity,
+                            price=price,
+                            size=item['size']
+                        )
                     if product.stock_type == 'ready':
                         product.stock_quantity = F('stock_quantity') - item['quantity']
                         product.save(update_fields=['stock_quantity'])
                 except Product.DoesNotExist:
                     logger.warning(f"Product ID {item['product_id']} not found for manually confirmed Order #{order.id}.")
                     continue
+
+            referrals.record_order(order, order_data.get('user_id'))
             
             email_sent = send_order_confirmation_email(order)
             if email_sent:
@@ -1519,7 +1436,7 @@ def lipana_webhook(request):
 
     try:
         data = json.loads(request.body)
-        logger.info(f"Lipana webhook payload: {json.dumps(data)}")
+        logger.debug(f"Lipana webhook payload: {json.dumps(data)}")
 
         event = data.get('event')
         event_data = data.get('data', {})
@@ -1580,22 +1497,25 @@ def lipana_webhook(request):
                     phone_number=order_data['phone_number'],
                     email=order_data['email'],
                     delivery_address=order_data['delivery_address'],
+                    customer=customers.for_checkout(order_data),
                     is_paid=True
                 )
                 payment.order = order
                 payment.save(update_fields=['order'])
 
                 # Create OrderItems and reduce stock
+                promo_budget = pricing.PromoBudget(order_data.get('user_id'))
                 for key, item in order_data['cart'].items():
                     try:
                         product = Product.objects.get(id=item['product_id'])
-                        OrderItem.objects.create(
-                            order=order,
-                            product=product,
-                            quantity=item['quantity'],
-                            price=product.price,
-                            size=item['size']
-                        )
+                        for quantity, price in pricing.verified_prices(item, product, promo_budget):
+                            OrderItem.objects.create(
+                                order=order,
+                                product=product,
+                                quantity=quantity,
+                                price=price,
+                                size=item['size']
+                            )
                         if product.stock_type == 'ready':
                             product.stock_quantity = F('stock_quantity') - item['quantity']
                             product.save(update_fields=['stock_quantity'])
@@ -1603,6 +1523,8 @@ def lipana_webhook(request):
                         logger.warning(f"Product ID {item['product_id']} not found for Order #{order.id}.")
                         continue
 
+                referrals.record_order(order, order_data.get('user_id'))
+
                 send_order_confirmation_email(order)
                 logger.info(f"Webhook: Order #{order.id} created for {checkout_request_id}.")
 
@@ -1633,7 +1555,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import update_session_auth_hash
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from .models import Profile, Order, OrderHistory
+from .models import Profile, Order
 from .forms import UserUpdateForm, ProfileUpdateForm, ChangePasswordForm
 
 # Profile view - view profile
@@ -1644,16 +1566,12 @@ def profile(request):
     profile = user.profile
     
     # Get user's orders
-    orders = Order.objects.filter(email=user.email).order_by('-created_at')[:10]
-    
-    # Get order history
-    order_history = OrderHistory.objects.filter(user=user).select_related('order')[:5]
+    orders = customers.orders_for(user)[:10]
     
     context = {
         'user': user,
         'profile': profile,
         'orders': orders,
-        'order_history': order_history,
         'active_tab': 'profile'
     }
     return render(request, 'parlour/profile.html', context)
@@ -1725,12 +1643,7 @@ def order_history(request):
     """View full order history"""
     user = request.user
     
-    # Get orders by email or user association
-    orders = Order.objects.filter(email=user.email).order_by('-created_at')
-    
-    # Record that user viewed these orders
-    for order in orders:
-        OrderHistory.objects.get_or_create(user=user, order=order)
+    orders = customers.orders_for(user).prefetch_related('orderitem_set__product')
     
     context = {
         'orders': orders,
@@ -1801,176 +1714,31 @@ def contact(request):
             ip_address   = request.META.get('REMOTE_ADDR'),
         )
 
-        # ── Email to store owner (Notification) ───────────────────
-        admin_email_subject = f"New Contact: {contact_msg.get_subject_display()} - {full_name}"
-
-        admin_html_message = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{font-family: 'Inter', Arial, sans-serif;background: #f5f5f5;margin: 0;padding: 20px;}}
-                .container {{max-width: 600px;margin: 0 auto;background: white;border-radius: 12px;overflow: hidden;box-shadow: 0 4px 12px rgba(0,0,0,0.1);}}
-                .header {{background: linear-gradient(135deg, #dc3545 0%, #c82333 100%);color: white;padding: 30px;text-align: center;}}
-                .header h1 {{margin: 0;font-size: 24px;}}
-                .badge {{display: inline-block;background: rgba(255,255,255,0.2);padding: 5px 15px;border-radius: 20px;font-size: 12px;margin-top: 10px;}}
-                .content {{padding: 30px;}}
-                .info-grid {{display: grid;grid-template-columns: 1fr 1fr;gap: 15px;margin: 20px 0;}}
-                .info-item {{background: #f8f9fa;padding: 15px;border-radius: 8px;border-left: 3px solid #dc3545;}}
-                .info-item strong {{display: block;color: #666;font-size: 11px;text-transform: uppercase;margin-bottom: 5px;}}
-                .info-item span {{color: #333;font-size: 15px;}}
-                .message-box {{background: #fff3cd;border: 1px solid #ffc107;border-radius: 8px;padding: 20px;margin: 20px 0;}}
-                .message-box h3 {{color: #856404;margin: 0 0 15px 0;font-size: 16px;}}
-                .footer {{background: #f8f9fa;padding: 20px;text-align: center;color: #666;font-size: 13px;}}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🔔 New Contact Form Submission</h1>
-                    <div class="badge">Qunimart Website · Ref #{contact_msg.id}</div>
-                </div>
-                <div class="content">
-                    <h2 style="color: #333; margin-bottom: 20px;">Contact Details</h2>
-                    <div class="info-grid">
-                        <div class="info-item"><strong>Full Name</strong><span>{full_name}</span></div>
-                        <div class="info-item"><strong>Email</strong><span>{email}</span></div>
-                        <div class="info-item"><strong>Phone</strong><span>{phone if phone else 'Not provided'}</span></div>
-                        <div class="info-item"><strong>Subject</strong><span>{contact_msg.get_subject_display()}</span></div>
-                    </div>
-                    {f'''
-                    <div style="background: #e8f5e9; border-left: 3px solid #4caf50; padding: 12px 15px; border-radius: 4px; margin: 15px 0;">
-                        <strong style="color: #2e7d32; font-size: 13px;">Order Number:</strong>
-                        <span style="color: #1b5e20; font-size: 15px; margin-left: 10px;">#{order_number}</span>
-                    </div>
-                    ''' if order_number else ''}
-                    <div class="message-box">
-                        <h3>📩 Message</h3>
-                        <p style="color: #333; line-height: 1.6; margin: 0; white-space: pre-wrap;">{message}</p>
-                    </div>
-                    <div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin-top: 20px;">
-                        <p style="margin: 0; color: #666; font-size: 14px;">
-                            <strong>Quick Actions:</strong><br>
-                            Reply to: <a href="mailto:{email}" style="color: #dc3545;">{email}</a>
-                            {f'<br>Call: <a href="tel:{phone}" style="color: #dc3545;">{phone}</a>' if phone else ''}
-                        </p>
-                    </div>
-                </div>
-                <div class="footer">
-                    <p style="margin: 5px 0;">Qunimart Admin Panel</p>
-                    <p style="margin: 5px 0; color: #999;">This is an automated notification</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-
-        # ── Customer auto-reply ───────────────────────────────────
-        customer_html_message = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{font-family: 'Inter', Arial, sans-serif;background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);margin: 0;padding: 20px;}}
-                .container {{max-width: 600px;margin: 0 auto;background: white;border-radius: 16px;overflow: hidden;box-shadow: 0 20px 40px rgba(0,0,0,0.15);}}
-                .header {{background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);color: white;padding: 40px 30px;text-align: center;}}
-                .logo {{font-size: 32px;font-weight: 800;margin-bottom: 10px;}}
-                .logo span {{color: #ffd700;}}
-                .content {{padding: 40px 30px;}}
-                .success-box {{background: #d4edda;border: 1px solid #c3e6cb;border-left: 4px solid #28a745;padding: 20px;border-radius: 8px;margin: 20px 0;text-align: center;}}
-                .success-box h2 {{color: #155724;margin: 0 0 10px 0;font-size: 22px;}}
-                .info-box {{background: #f8f9fa;padding: 20px;border-radius: 8px;margin: 20px 0;}}
-                .info-box h3 {{color: #333;margin: 0 0 15px 0;font-size: 18px;}}
-                .detail-row {{display: flex;justify-content: space-between;padding: 10px 0;border-bottom: 1px solid #e0e0e0;}}
-                .detail-row:last-child {{border-bottom: none;}}
-                .detail-row strong {{color: #666;}}
-                .detail-row span {{color: #333;font-weight: 600;}}
-                .contact-box {{background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);color: white;padding: 25px;border-radius: 8px;margin: 20px 0;}}
-                .contact-box h3 {{margin: 0 0 15px 0;font-size: 18px;}}
-                .contact-box p {{margin: 8px 0;font-size: 15px;}}
-                .footer {{background: #f8f9fa;padding: 30px;text-align: center;border-top: 1px solid #eee;}}
-                .footer p {{color: #666;margin: 5px 0;font-size: 14px;}}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <div class="logo">HOKA'S<span>PARLOUR</span></div>
-                    <p style="margin: 10px 0 0 0; font-size: 16px;">Premium Fashion & Streetwear</p>
-                </div>
-                <div class="content">
-                    <div class="success-box">
-                        <h2>✓ Message Received!</h2>
-                        <p style="color: #155724; margin: 0;">Thank you for contacting us, {full_name}</p>
-                    </div>
-                    <p style="color: #666; line-height: 1.6; font-size: 16px;">
-                        Dear <strong>{full_name}</strong>,<br><br>
-                        Thank you for reaching out to Qunimart! We have successfully received your message and our team will review it shortly.
-                    </p>
-                    <div class="info-box">
-                        <h3>📋 Your Enquiry Details</h3>
-                        <div class="detail-row">
-                            <strong>Reference #:</strong>
-                            <span>{contact_msg.id}</span>
-                        </div>
-                        <div class="detail-row">
-                            <strong>Subject:</strong>
-                            <span>{contact_msg.get_subject_display()}</span>
-                        </div>
-                        <div class="detail-row">
-                            <strong>Order Ref:</strong>
-                            <span>{order_number if order_number else 'General Inquiry'}</span>
-                        </div>
-                        <div class="detail-row">
-                            <strong>Expected Response:</strong>
-                            <span>Within 24 hours</span>
-                        </div>
-                    </div>
-                    <div style="background: #fff3cd; border: 1px solid #ffc107; border-radius: 8px; padding: 20px; margin: 20px 0;">
-                        <p style="color: #856404; margin: 0; line-height: 1.6;">
-                            <strong>⏰ Response Time:</strong> Our team typically responds within 24 hours during business days.
-                            For urgent matters, please use the contact information below.
-                        </p>
-                    </div>
-                    <div class="contact-box">
-                        <h3>📞 Need Immediate Assistance?</h3>
-                        <p><strong>Email:</strong> hokasparlour@gmail.com</p>
-                        <p><strong>Business Hours:</strong> Monday - Saturday, 9AM - 6PM</p>
-                    </div>
-                    <p style="color: #666; text-align: center; font-size: 14px; margin-top: 30px;">
-                        We appreciate your patience and look forward to assisting you!
-                    </p>
-                </div>
-                <div class="footer">
-                    <p style="font-weight: 600; color: #333; font-size: 16px;">Qunimart</p>
-                    <p>Premium Fashion & Streetwear</p>
-                    <p style="color: #999; font-size: 12px; margin-top: 15px;">© 2026 Qunimart. All rights reserved.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        # ── Notification to the store owner + auto-reply to the customer ──
+        context = {
+            'contact_msg':  contact_msg,
+            'full_name':    full_name,
+            'email':        email,
+            'phone':        phone,
+            'order_number': order_number,
+            'message':      message,
+        }
 
         try:
-            # Send notification to admin
-            admin_email = EmailMessage(
-                subject=admin_email_subject,
-                body=admin_html_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=['hokasparlour@gmail.com'],
-            )
-            admin_email.content_subtype = "html"
-            admin_email.send(fail_silently=False)
-
-            # Send auto-reply to customer
-            customer_email = EmailMessage(
-                subject="Thank you for contacting Qunimart ✓",
-                body=customer_html_message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[email],
-            )
-            customer_email.content_subtype = "html"
-            customer_email.send(fail_silently=False)
+            # Both emails go out over one SMTP connection
+            send_emails([
+                build_email(
+                    'contact_admin', context,
+                    subject=f"New Contact: {contact_msg.get_subject_display()} - {full_name}",
+                    to=['hokasparlour@gmail.com'],
+                    reply_to=[email] if email else None,
+                ),
+                build_email(
+                    'contact_reply', context,
+                    subject="Thank you for contacting Qunimart ✓",
+                    to=[email],
+                ),
+            ])
 
             messages.success(request, '✓ Thank you! Your message has been sent. We will respond within 24 hours.')
             logger.info(f"Contact form submitted by {full_name} ({email}) — saved as #{contact_msg.id}")
@@ -1984,14 +1752,17 @@ def contact(request):
 
     return render(request, 'details/contact.html')
 
+@cache_anonymous_page()
 def about(request):
     """About Us page"""
     return render(request, 'about.html')
 
+@cache_anonymous_page()
 def terms(request):
     """Terms and Conditions page"""
     return render(request, 'details/t&c.html')
 
+@cache_anonymous_page()
 def privacy(request):
     """Privacy Policy page"""
     return render(request, 'details/p&p.html')
@@ -2001,10 +1772,12 @@ def welcome(request):
     """welcome page"""
     return render(request, 'details/welcome.html')
 
+@cache_anonymous_page()
 def returns(request):
     """returns page"""
     return render(request, 'details/returns.html')
 
+@cache_anonymous_page()
 def delivery(request):
     """delivery page"""
     return render(request, 'details/delivery.html')
@@ -2056,12 +1829,13 @@ def robots_txt(request):
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Count, Sum
+from django.db.models import Case, Count, ExpressionWrapper, Q, Sum, Value, When
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
 from django.utils import timezone
 from django.db import models
 from .models import Product, Advertisement, AdImage, AdImpression
+from . import ad_stats
 import json
 
 # ... (keep your existing home, product_detail, ad_click views)
@@ -2092,10 +1866,15 @@ def ad_list(request):
     if date_to:
         ads = ads.filter(created_at__date__lte=date_to)
     
-    # Annotate with stats
+    # Per-ad views / clicks are the counters on Advertisement itself
     ads = ads.annotate(
-        total_impressions=Count('adimpression'),
-        total_clicks=Sum('clicks')
+        ctr=Case(
+            When(views__gt=0, then=ExpressionWrapper(
+                F('clicks') * 100.0 / F('views'), output_field=models.FloatField()
+            )),
+            default=Value(0.0),
+            output_field=models.FloatField(),
+        )
     )
     
     # Pagination
@@ -2103,17 +1882,16 @@ def ad_list(request):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Get stats for the period
-    now = timezone.now()
-    thirty_days_ago = now - timezone.timedelta(days=30)
-    
-    recent_impressions = AdImpression.objects.filter(
-        viewed_at__gte=thirty_days_ago
-    ).count()
-    
-    recent_clicks = Advertisement.objects.filter(
-        updated_at__gte=thirty_days_ago
-    ).aggregate(total=Sum('clicks'))['total'] or 0
+    # Period stats come from the daily rollups (plus today's raw impressions)
+    recent = ad_stats.period_totals(days=30)
+    totals = Advertisement.objects.aggregate(
+        total_ads=Count('id'),
+        active_ads=Count('id', filter=Q(is_active=True)),
+        views=Sum('views'),
+        clicks=Sum('clicks'),
+    )
+    total_impressions = totals['views'] or 0
+    total_clicks = totals['clicks'] or 0
     
     context = {
         'page_obj': page_obj,
@@ -2122,12 +1900,13 @@ def ad_list(request):
         'date_from': date_from,
         'date_to': date_to,
         'ad_types': Advertisement.AD_TYPES,
-        'total_ads': Advertisement.objects.count(),
-        'active_ads': Advertisement.objects.filter(is_active=True).count(),
-        'recent_impressions': recent_impressions,
-        'recent_clicks': recent_clicks,
-        'total_impressions': AdImpression.objects.count(),
-        'total_clicks': Advertisement.objects.aggregate(total=Sum('clicks'))['total'] or 0,
+        'total_ads': totals['total_ads'],
+        'active_ads': totals['active_ads'],
+        'recent_impressions': recent['views'],
+        'recent_clicks': recent['clicks'],
+        'total_impressions': total_impressions,
+        'total_clicks': total_clicks,
+        'overall_ctr': (total_clicks / total_impressions * 100) if total_impressions else 0,
     }
     return render(request, 'parlour/admin/ad_list.html', context)
 
@@ -2335,69 +2114,21 @@ def ad_detail(request, ad_id):
     """View advertisement details and statistics"""
     ad = get_object_or_404(Advertisement, id=ad_id)
     
-    # Get impression statistics
-    impressions = AdImpression.objects.filter(advertisement=ad)
-    
-    # Group by date for chart
-    last_30_days = timezone.now() - timezone.timedelta(days=30)
-    
-    # Get daily stats - FIXED VERSION
-    daily_stats = []
-    
-    # Get all impressions in the last 30 days
-    recent_impressions = impressions.filter(viewed_at__gte=last_30_days)
-    
-    # Create a dictionary to aggregate by date
-    stats_dict = {}
-    
-    for impression in recent_impressions:
-        # Convert to date string for grouping
-        date_str = impression.viewed_at.date().strftime('%Y-%m-%d')
-        
-        if date_str not in stats_dict:
-            stats_dict[date_str] = {
-                'date': impression.viewed_at.date(),
-                'count': 0,
-                'clicks': 0
-            }
-        
-        stats_dict[date_str]['count'] += 1
-        if impression.clicked:
-            stats_dict[date_str]['clicks'] += 1
-    
-    # Convert dictionary to sorted list
-    daily_stats = sorted(stats_dict.values(), key=lambda x: x['date'])
-    
-    # Prepare chart data
-    dates = []
-    views_data = []
-    clicks_data = []
-    
-    # Fill in missing dates to have a continuous 30-day chart
-    for i in range(30):
-        date = (last_30_days + timezone.timedelta(days=i)).date()
-        date_str = date.strftime('%Y-%m-%d')
-        
-        dates.append(date.strftime('%Y-%m-%d'))
-        
-        if date_str in stats_dict:
-            views_data.append(stats_dict[date_str]['count'])
-            clicks_data.append(stats_dict[date_str]['clicks'])
-        else:
-            views_data.append(0)
-            clicks_data.append(0)
+    # Daily chart from the rollups; only uncompacted days touch raw impressions
+    today = timezone.localdate()
+    series = ad_stats.daily_series(today - timezone.timedelta(days=29), today, advertisement=ad)
     
     chart_data = {
-        'dates': dates,
-        'views': views_data,
-        'clicks': clicks_data
+        'dates': [day.strftime('%Y-%m-%d') for day in series],
+        'views': [stats['views'] for stats in series.values()],
+        'clicks': [stats['clicks'] for stats in series.values()],
     }
     
     # Get recent impressions
-    recent_impressions_list = impressions.order_by('-viewed_at')[:20]
+    recent_impressions_list = AdImpression.objects.filter(advertisement=ad).order_by('-viewed_at')[:20]
     
-    # Calculate click-through rate
-    total_impressions = impressions.count()
+    # Lifetime figures are the ad's own counters
+    total_impressions = ad.views
     click_through_rate = (ad.clicks / total_impressions * 100) if total_impressions > 0 else 0
     
     context = {
@@ -2406,6 +2137,7 @@ def ad_detail(request, ad_id):
         'total_impressions': total_impressions,
         'click_through_rate': click_through_rate,
         'chart_data': json.dumps(chart_data),
+        'device_stats': ad_stats.device_breakdown(days=30, advertisement=ad),
     }
     return render(request, 'parlour/admin/ad_detail.html', context)
 
@@ -2476,6 +2208,7 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q
+from django.views.decorators.http import require_POST
 from .models import Order
 
 
@@ -2535,20 +2268,40 @@ def update_order_status(request, order_id):
     order = get_object_or_404(Order, id=order_id)
 
     if request.method == 'POST':
-        new_status = request.POST.get('status')
-        valid_statuses = ['pending', 'processing', 'dispatched', 'delivered']
-
-        if new_status in valid_statuses:
-            order.order_status = new_status
-            order.save()
+        try:
+            order_lifecycle.transition(order, request.POST.get('status'))
             messages.success(request, f'Order #{order.id} updated to {order.get_order_status_display()}.')
-        else:
-            messages.error(request, 'Invalid status.')
+        except order_lifecycle.InvalidTransition as e:
+            messages.error(request, f'Order #{order.id}: {e}')
 
     # Redirect back to where they came from
     return redirect(request.META.get('HTTP_REFERER', 'orders_dashboard'))
 
 
+@staff_member_required
+@require_POST
+def bulk_update_order_status(request):
+    """Move every ticked order on the dashboard to one status in a single UPDATE."""
+    order_ids = [int(pk) for pk in request.POST.getlist('order_ids') if pk.isdigit()]
+    new_status = request.POST.get('status')
+
+    if not order_ids:
+        messages.error(request, 'Select at least one order.')
+    else:
+        try:
+            result = order_lifecycle.bulk_transition(order_ids, new_status)
+            label = order_lifecycle.STATUS_LABELS[new_status]
+            if result.moved:
+                messages.success(request, f'{len(result.moved)} order{"s" if len(result.moved) != 1 else ""} marked {label}.')
+            if result.skipped:
+                skipped = ', '.join(f'#{pk}' for pk in result.skipped[:10])
+                messages.warning(request, f"{len(result.skipped)} order(s) can't move to {label} and were left as they were: {skipped}")
+        except order_lifecycle.InvalidTransition as e:
+            messages.error(request, str(e))
+
+    return redirect(request.META.get('HTTP_REFERER', 'orders_dashboard'))
+
+
 @staff_member_required
 def order_detail(request, order_id):
     order = get_object_or_404(Order, id=order_id)
@@ -2584,10 +2337,32 @@ from django.views.decorators.http import require_POST
 
 @staff_member_required
 def delivery_dashboard(request):
-    orders = Order.objects.filter(
-        order_status__in=['pending', 'processing', 'dispatched']
-    ).prefetch_related('orderitem_set__product').order_by('-created_at')
-    return render(request, 'parlour/delivery_dashboard.html', {'orders': orders})
+    days = delivery_manifest.build()
+    orders = sorted(
+        (stop.order for day in days for stop in day.stops),
+        key=lambda order: order.created_at, reverse=True,
+    )
+    return render(request, 'parlour/delivery_dashboard.html', {'orders': orders, 'days': days})
+
+
+@staff_member_required
+def delivery_manifest_view(request):
+    """Printable run sheet for one delivery day: stops by area, pick lists, amounts to collect."""
+    from django.utils.dateparse import parse_date
+
+    days = delivery_manifest.build()
+    try:
+        date = parse_date(request.GET.get('day', ''))
+    except ValueError:
+        date = None
+    if date is None:
+        date = days[0].date if days else timezone.localdate()
+    return render(request, 'parlour/delivery_manifest.html', {
+        'day': delivery_manifest.find_day(days, date),
+        'days': days,
+        'store_settings': StoreSettings.get_settings(),
+        'generated_at': timezone.now(),
+    })
 
 
 @staff_member_required
@@ -2604,19 +2379,20 @@ def delivery_detail(request, order_id):
 
 @staff_member_required
 @require_POST
-def delivery_stk_push(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
+async def delivery_stk_push(request, order_id):
+    order = await aget_object_or_404(Order, id=order_id)
     if order.is_paid:
         messages.error(request, 'Order is already paid.')
         return redirect('delivery_detail', order_id=order_id)
 
-    result = stk_push(order.phone_number, order.get_total(), f"ORDER-{order.id}")
+    total = await sync_to_async(order.get_total)()
+    result = await astk_push(order.phone_number, total, f"ORDER-{order.id}")
     if result['success']:
         # Create a fresh MpesaPayment linked to this order
-        MpesaPayment.objects.create(
+        await MpesaPayment.objects.acreate(
             checkout_request_id=result['checkout_request_id'],
             phone_number=order.phone_number,
-            amount=order.get_total(),
+            amount=total,
             status='pending',
             order=order,                          # ← link to order directly
             order_details={},                     # empty since order already exists
@@ -2632,37 +2408,30 @@ def delivery_stk_push(request, order_id):
 def mark_delivered(request, order_id):
     order = get_object_or_404(Order, id=order_id)
 
-    def format_phone(phone):
-        phone = phone.strip().replace(" ", "").replace("-", "")
-        if phone.startswith('+254'):
-            return phone
-        elif phone.startswith('254'):
-            return '+' + phone
-        elif phone.startswith('07') or phone.startswith('01'):
-            return '+254' + phone[1:]
-        elif phone.startswith('7') or phone.startswith('1'):
-            return '+254' + phone
-        return phone
-
     if order.is_paid:
         provided_phone = request.POST.get('mpesa_phone', '').strip()
         if not provided_phone:
             messages.error(request, 'Please provide the M-Pesa phone number to confirm identity.')
             return redirect('delivery_detail', order_id=order_id)
 
-        if format_phone(provided_phone) != format_phone(order.phone_number):
+        if not phones.same_number(provided_phone, order.phone_number):
             messages.error(request, 'Phone number does not match. Please verify with the customer.')
             return redirect('delivery_detail', order_id=order_id)
 
-        order.order_status = 'delivered'
-        order.save(update_fields=['order_status'])
+        try:
+            order_lifecycle.transition(order, order_lifecycle.DELIVERED)
+        except order_lifecycle.InvalidTransition as e:
+            messages.error(request, str(e))
+            return redirect('delivery_detail', order_id=order_id)
         messages.success(request, f'✅ Order #{order.id} marked as delivered. Identity confirmed.')
 
     else:
         if request.POST.get('payment_method') == 'cash':
-            order.is_paid = True
-            order.order_status = 'delivered'
-            order.save(update_fields=['is_paid', 'order_status'])
+            try:
+                order_lifecycle.transition(order, order_lifecycle.DELIVERED, is_paid=True)
+            except order_lifecycle.InvalidTransition as e:
+                messages.error(request, str(e))
+                return redirect('delivery_detail', order_id=order_id)
             messages.success(request, f'✅ Order #{order.id} marked as delivered and paid (cash).')
         else:
             messages.error(request, 'Order is not paid. Send STK Push or confirm cash payment.')
@@ -2818,14 +2587,15 @@ def agent_dashboard(request):
         messages.warning(request, 'Your agent account is not approved yet.')
         return redirect('become_agent')
 
-    referrals = PromoUsage.objects.filter(agent=agent).select_related('user').order_by('-created_at')
+    stats = referrals.agent_stats(agent.pk)
 
     context = {
         'agent': agent,
-        'referrals': referrals,
-        'total_referrals': referrals.count(),
-        'active_referrals': referrals.filter(is_active=True).count(),
-        'completed_referrals': referrals.filter(is_active=False).count(),
+        'referrals': PromoUsage.objects.filter(agent=agent).select_related('user').order_by('-created_at'),
+        'total_referrals': stats['users'],
+        'active_referrals': stats['active'],
+        'completed_referrals': stats['completed'],
+        'promo_units': stats['units'],
     }
     return render(request, 'parlour/agent_dashboard.html', context)
 
@@ -2844,182 +2614,45 @@ def agent_referrals(request):
     return render(request, 'parlour/agent_referrals.html', {'agent': agent, 'referrals': referrals})
 
 
-# Add these to your views.py
-
-import json
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from django.shortcuts import get_object_or_404, render
-from .models import Wishlist, Product  # adjust import path as needed
-
-
-# ─── Helper: session wishlist key ───────────────────────────────────────────
-SESSION_KEY = 'wishlist'
-
-
-def _get_session_wishlist(request):
-    """Return the session wishlist as a list of product id strings."""
-    return request.session.get(SESSION_KEY, [])
-
-
-def _save_session_wishlist(request, wishlist):
-    request.session[SESSION_KEY] = wishlist
-    request.session.modified = True
-
-
 # ─── Toggle Wishlist (AJAX) ──────────────────────────────────────────────────
 @require_POST
 def toggle_wishlist(request, product_id):
     product = get_object_or_404(Product, id=product_id)
 
-    if request.user.is_authenticated:
-        # ── Database wishlist for logged-in users ──
-        obj, created = Wishlist.objects.get_or_create(user=request.user, product=product)
-        if not created:
-            obj.delete()
-            return JsonResponse({'status': 'removed', 'message': f'"{product.name}" removed from wishlist'})
+    if wishlists.toggle(request, product):
         return JsonResponse({'status': 'added', 'message': f'"{product.name}" added to wishlist'})
-
-    else:
-        # ── Session wishlist for guests ──
-        wishlist = _get_session_wishlist(request)
-        pid = str(product_id)
-        if pid in wishlist:
-            wishlist.remove(pid)
-            _save_session_wishlist(request, wishlist)
-            return JsonResponse({'status': 'removed', 'message': f'"{product.name}" removed from wishlist'})
-        else:
-            wishlist.append(pid)
-            _save_session_wishlist(request, wishlist)
-            return JsonResponse({'status': 'added', 'message': f'"{product.name}" added to wishlist'})
+    return JsonResponse({'status': 'removed', 'message': f'"{product.name}" removed from wishlist'})
 
 
 # ─── Check wishlist status (AJAX) ────────────────────────────────────────────
 def wishlist_status(request, product_id):
     """Returns whether this product is in the current user's wishlist."""
-    if request.user.is_authenticated:
-        in_wishlist = Wishlist.objects.filter(user=request.user, product_id=product_id).exists()
-    else:
-        wishlist = _get_session_wishlist(request)
-        in_wishlist = str(product_id) in wishlist
-
+    in_wishlist = product_id in wishlists.wishlisted_ids(request, [product_id])
     return JsonResponse({'in_wishlist': in_wishlist})
 
 
-# ─── Wishlist Page ────────────────────────────────────────────────────────────
-def wishlist_page(request):
-    """Renders the wishlist page, merging session wishlist into DB on login."""
-    if request.user.is_authenticated:
-        # Merge any session wishlist items into the database
-        session_wishlist = _get_session_wishlist(request)
-        if session_wishlist:
-            for pid in session_wishlist:
-                try:
-                    product = Product.objects.get(id=pid)
-                    Wishlist.objects.get_or_create(user=request.user, product=product)
-                except Product.DoesNotExist:
-                    pass
-            # Clear session wishlist after merging
-            _save_session_wishlist(request, [])
-
-        wishlist_items = Wishlist.objects.filter(user=request.user).select_related('product')
-        products = [item.product for item in wishlist_items]
-
-    else:
-        session_wishlist = _get_session_wishlist(request)
-        products = list(Product.objects.filter(id__in=session_wishlist))
-
-    return render(request, 'parlour/wishlist.html', {'products': products})
-
-
-
-# Add these to your views.py
-
-import json
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from django.shortcuts import get_object_or_404, render
-from .models import Wishlist, Product  # adjust import path as needed
-
-
-# ─── Helper: session wishlist key ───────────────────────────────────────────
-SESSION_KEY = 'wishlist'
-
-
-def _get_session_wishlist(request):
-    """Return the session wishlist as a list of product id strings."""
-    return request.session.get(SESSION_KEY, [])
-
-
-def _save_session_wishlist(request, wishlist):
-    request.session[SESSION_KEY] = wishlist
-    request.session.modified = True
-
-
-# ─── Toggle Wishlist (AJAX) ──────────────────────────────────────────────────
-@require_POST
-def toggle_wishlist(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-
-    if request.user.is_authenticated:
-        # ── Database wishlist for logged-in users ──
-        obj, created = Wishlist.objects.get_or_create(user=request.user, product=product)
-        if not created:
-            obj.delete()
-            return JsonResponse({'status': 'removed', 'message': f'"{product.name}" removed from wishlist'})
-        return JsonResponse({'status': 'added', 'message': f'"{product.name}" added to wishlist'})
-
-    else:
-        # ── Session wishlist for guests ──
-        wishlist = _get_session_wishlist(request)
-        pid = str(product_id)
-        if pid in wishlist:
-            wishlist.remove(pid)
-            _save_session_wishlist(request, wishlist)
-            return JsonResponse({'status': 'removed', 'message': f'"{product.name}" removed from wishlist'})
-        else:
-            wishlist.append(pid)
-            _save_session_wishlist(request, wishlist)
-            return JsonResponse({'status': 'added', 'message': f'"{product.name}" added to wishlist'})
-
-
-# ─── Check wishlist status (AJAX) ────────────────────────────────────────────
-def wishlist_status(request, product_id):
-    """Returns whether this product is in the current user's wishlist."""
-    if request.user.is_authenticated:
-        in_wishlist = Wishlist.objects.filter(user=request.user, product_id=product_id).exists()
-    else:
-        wishlist = _get_session_wishlist(request)
-        in_wishlist = str(product_id) in wishlist
-
-    return JsonResponse({'in_wishlist': in_wishlist})
+def wishlist_status_bulk(request):
+    """
+    Wishlist status for a grid of product cards in one request:
+    GET ?ids=1,2,3 → {"wishlisted": [2], "count": 3}. Answered with one query.
+    """
+    raw = ','.join(request.GET.getlist('ids')).split(',')
+    ids = wishlists.parse_ids(raw)[:wishlists.MAX_STATUS_IDS]
+    wishlisted = wishlists.wishlisted_ids(request, ids)
+    return JsonResponse({
+        'wishlisted': [pid for pid in ids if pid in wishlisted],
+        'count': len(ids),
+    })
 
 
 # ─── Wishlist Page ────────────────────────────────────────────────────────────
 def wishlist_page(request):
-    """Renders the wishlist page, merging session wishlist into DB on login."""
+    """Renders the wishlist page. Guest items are merged into the account at login."""
     if request.user.is_authenticated:
-        # Merge any session wishlist items into the database
-        session_wishlist = _get_session_wishlist(request)
-        if session_wishlist:
-            for pid in session_wishlist:
-                try:
-                    product = Product.objects.get(id=pid)
-                    Wishlist.objects.get_or_create(user=request.user, product=product)
-                except Product.DoesNotExist:
-                    pass
-            # Clear session wishlist after merging
-            _save_session_wishlist(request, [])
-
-        wishlist_items = Wishlist.objects.filter(user=request.user).select_related('product')
-        products = [item.product for item in wishlist_items]
-
-    else:
-        session_wishlist = _get_session_wishlist(request)
-        products = list(Product.objects.filter(id__in=session_wishlist))
-
-    return render(request, 'parlour/wishlist.html', {'products': products})    
+        # Lists left in a session from before the login-time merge existed
+        wishlists.merge_session(request, request.user)
 
+    return render(request, 'parlour/wishlist.html', {'products': wishlists.products(request)})
 
 
 import random
@@ -3027,7 +2660,7 @@ from django.utils import timezone
 from datetime import timedelta
 
 @login_required
-def whatsapp_connect(request):
+async def whatsapp_connect(request):
     """Step 1 — send OTP to the WhatsApp number the user provides."""
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'POST required'}, status=405)
@@ -3041,34 +2674,26 @@ def whatsapp_connect(request):
     if not phone.startswith('+'):
         phone = '+' + phone
 
-    otp = str(random.randint(100000, 999999))
+    try:
+        code = await sync_to_async(otp.issue)(otp.PURPOSE_WHATSAPP, phone, ip=otp.client_ip(request))
+    except otp.OTPRateLimited as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Too many codes requested. Try again in {e.retry_minutes} minute(s).'
+        }, status=429)
 
-    profile = request.user.profile
+    user = await request.auser()
+    profile, _ = await Profile.objects.aget_or_create(user=user)
     profile.whatsapp_number = phone
-    profile.whatsapp_otp = otp
-    profile.whatsapp_otp_created_at = timezone.now()
     profile.whatsapp_joined = False  # reset until verified
-    profile.save(update_fields=[
-        'whatsapp_number', 'whatsapp_otp',
-        'whatsapp_otp_created_at', 'whatsapp_joined'
-    ])
-
-    # Send OTP via your existing WhatsApp service
-    from whatsapphoka.service import send_whatsapp_message
-    message = (
-        f"Hi {request.user.first_name or request.user.username}! "
-        f"Your Qunimart verification code is: *{otp}*\n\n"
-        f"This code expires in 10 minutes. Do not share it with anyone."
-    )
-    result = send_whatsapp_message(phone, message)
+    await profile.asave(update_fields=['whatsapp_number', 'whatsapp_joined'])
 
-    if result.get('success'):
-        return JsonResponse({'success': True, 'message': 'OTP sent! Check your WhatsApp.'})
-    else:
+    if not await otp.asend_whatsapp_code(phone, user.first_name or user.username, code):
         return JsonResponse({
             'success': False,
-            'error': 'Could not send WhatsApp message. Check the number and try again.'
-        }, status=500)
+            'error': 'We could not send the code over WhatsApp right now. Please try again.'
+        }, status=502)
+    return JsonResponse({'success': True, 'message': 'OTP sent! Check your WhatsApp.'})
 
 
 @login_required
@@ -3080,24 +2705,15 @@ def whatsapp_verify(request):
     entered_otp = request.POST.get('otp', '').strip()
     profile = request.user.profile
 
-    if not profile.whatsapp_otp or not profile.whatsapp_otp_created_at:
-        return JsonResponse({'success': False, 'error': 'No OTP found. Please request a new one.'}, status=400)
-
-    # Check expiry — 10 minutes
-    expiry = profile.whatsapp_otp_created_at + timedelta(minutes=10)
-    if timezone.now() > expiry:
-        profile.whatsapp_otp = ''
-        profile.save(update_fields=['whatsapp_otp'])
-        return JsonResponse({'success': False, 'error': 'OTP expired. Please request a new one.'}, status=400)
+    if not profile.whatsapp_number or not otp.has_live_code(otp.PURPOSE_WHATSAPP, profile.whatsapp_number):
+        return JsonResponse({'success': False, 'error': 'No OTP found or it has expired. Please request a new one.'}, status=400)
 
-    if entered_otp != profile.whatsapp_otp:
+    if not otp.verify(otp.PURPOSE_WHATSAPP, profile.whatsapp_number, entered_otp):
         return JsonResponse({'success': False, 'error': 'Incorrect code. Please try again.'}, status=400)
 
     # All good — mark as verified
     profile.whatsapp_joined = True
-    profile.whatsapp_otp = ''  # clear OTP after use
-    profile.whatsapp_otp_created_at = None
-    profile.save(update_fields=['whatsapp_joined', 'whatsapp_otp', 'whatsapp_otp_created_at'])
+    profile.save(update_fields=['whatsapp_joined'])
 
     return JsonResponse({'success': True, 'message': 'WhatsApp connected successfully!'})
 
@@ -3109,14 +2725,13 @@ def whatsapp_disconnect(request):
         return JsonResponse({'success': False, 'error': 'POST required'}, status=405)
 
     profile = request.user.profile
+    # An unverified code for the old number must not outlive the disconnect
+    number = profile.whatsapp_number
+    if number:
+        otp.discard(otp.PURPOSE_WHATSAPP, number)
     profile.whatsapp_joined = False
     profile.whatsapp_number = ''
-    profile.whatsapp_otp = ''
-    profile.whatsapp_otp_created_at = None
-    profile.save(update_fields=[
-        'whatsapp_joined', 'whatsapp_number',
-        'whatsapp_otp', 'whatsapp_otp_created_at'
-    ])
+    profile.save(update_fields=['whatsapp_joined', 'whatsapp_number'])
     return JsonResponse({'success': True, 'message': 'WhatsApp disconnected.'})    
 
 
@@ -0,0 +1,97 @@
+"""
+Wishlists: Wishlist rows for signed-in users, a list of product ids in the
+session for guests. A guest's list is merged into their account when they
+log in (the user_logged_in receiver in parlour.signals) with one product
+lookup and one INSERT, and status for a whole grid of product cards is
+answered with one query.
+"""
+from .models import Product, Wishlist
+
+SESSION_KEY = 'wishlist'
+
+# Most product ids answered by one bulk status request
+MAX_STATUS_IDS = 200
+
+
+def session_ids(request):
+    """The guest wishlist as a list of product id strings."""
+    return list(request.session.get(SESSION_KEY, []))
+
+
+def _save_session_ids(request, ids):
+    request.session[SESSION_KEY] = ids
+    request.session.modified = True
+
+
+def parse_ids(values):
+    """Positive integer product ids from strings, order kept, duplicates and junk dropped."""
+    ids = []
+    for value in values:
+        value = str(value).strip()
+        if value.isdigit() and int(value) not in ids:
+            ids.append(int(value))
+    return ids
+
+
+def toggle(request, product):
+    """Add product to the current wishlist, or remove it if it's there. Returns True if added."""
+    if request.user.is_authenticated:
+        removed, _ = Wishlist.objects.filter(user=request.user, product=product).delete()
+        if removed:
+            return False
+        Wishlist.objects.get_or_create(user=request.user, product=product)
+        return True
+
+    ids = session_ids(request)
+    pid = str(product.id)
+    if pid in ids:
+        ids.remove(pid)
+        _save_session_ids(request, ids)
+        return False
+    ids.append(pid)
+    _save_session_ids(request, ids)
+    return True
+
+
+def wishlisted_ids(request, product_ids):
+    """The subset of product_ids (ints) on the current wishlist — at most one query."""
+    product_ids = list(product_ids)[:MAX_STATUS_IDS]
+    if not product_ids:
+        return set()
+    if request.user.is_authenticated:
+        return set(
+            Wishlist.objects.filter(user=request.user, product_id__in=product_ids)
+            .values_list('product_id', flat=True)
+        )
+    saved = set(parse_ids(session_ids(request)))
+    return {pid for pid in product_ids if pid in saved}
+
+
+def products(request):
+    """Products on the current wishlist, most recently added first."""
+    if request.user.is_authenticated:
+        return [
+            item.product
+            for item in Wishlist.objects.filter(user=request.user).select_related('product')
+        ]
+    ids = parse_ids(session_ids(request))
+    by_id = Product.objects.in_bulk(ids)
+    return [by_id[pid] for pid in reversed(ids) if pid in by_id]
+
+
+def merge_session(request, user):
+    """
+    Move the guest wishlist in request's session onto user's account and
+    clear it. Products since deleted are dropped; ones already on the
+    account are skipped by the INSERT. Returns the products merged.
+    """
+    ids = parse_ids(session_ids(request))
+    if not ids:
+        return 0
+    existing = list(Product.objects.filter(id__in=ids).values_list('id', flat=True))
+    Wishlist.objects.bulk_create(
+        [Wishlist(user=user, product_id=pid) for pid in existing],
+        ignore_conflicts=True,
+    )
+    _save_session_ids(request, [])
+    return len(existing)
@@ -1,3 +1,19 @@
 from django.contrib import admin
+from .models import StoreDailySales, StoreSale
 
-# Register your models here.
+
+@admin.register(StoreSale)
+class StoreSaleAdmin(admin.ModelAdmin):
+    list_display = ['order', 'store', 'order_created_at', 'order_status', 'is_paid', 'items_count', 'revenue']
+    list_filter = ['order_status', 'is_paid', 'store']
+    list_select_related = ['order', 'store']
+    raw_id_fields = ['order']
+    date_hierarchy = 'order_created_at'
+
+
+@admin.register(StoreDailySales)
+class StoreDailySalesAdmin(admin.ModelAdmin):
+    list_display = ['date', 'store', 'orders_count', 'items_sold', 'revenue']
+    list_filter = ['store']
+    list_select_related = ['store']
+    date_hierarchy = 'date'
@@ -0,0 +1,144 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from parlour import counters
+from parlour.models import OrderItem
+from .models import StoreDailySales, StoreSale
+
+MONEY = models.DecimalField(max_digits=12, decimal_places=2)
+
+BATCH_NAME = 'store ledger'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Per-transaction batch (parlour.counters)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _apply(ids, using='default'):
+    apply_items(ids['item'], using=using)
+
+
+def queue_order_item(item, using='default'):
+    """Record a new OrderItem against its store once the transaction commits."""
+    counters.queue(BATCH_NAME, _apply, using, item=item.pk)
+
+
+def sync_order_status(order, using='default'):
+    """Copy an order's status / paid flag onto its ledger rows."""
+    StoreSale.objects.using(using).filter(order_id=order.pk).update(
+        order_status=order.order_status,
+        is_paid=order.is_paid,
+    )
+
+
+def sync_bulk_status(order_ids, order_status, using='default'):
+    """Same, for orders moved together by parlour.order_lifecycle.bulk_transition()."""
+    StoreSale.objects.using(using).filter(order_id__in=order_ids).update(order_status=order_status)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Applying items
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _store_rows(items):
+    """Aggregate an OrderItem queryset to one row per (store, order)."""
+    return (
+        items.filter(product__store__isnull=False)
+        .values(
+            'order_id', 'product__store_id',
+            'order__created_at', 'order__order_status', 'order__is_paid',
+        )
+        .annotate(
+            qty=Sum('quantity'),
+            revenue=Sum(F('price') * F('quantity'), output_field=MONEY),
+        )
+    )
+
+
+def apply_items(item_ids, using='default'):
+    """
+    Add committed OrderItems to StoreSale and StoreDailySales with F()
+    upserts — one statement per (store, order) and per (store, day).
+    """
+    if not item_ids:
+        return
+
+    rows = _store_rows(OrderItem.objects.using(using).filter(pk__in=item_ids))
+
+    per_day = defaultdict(lambda: [0, 0, Decimal('0.00')])
+    with transaction.atomic(using=using):
+        for row in rows:
+            created = _upsert_store_sale(row, using)
+            day = per_day[(row['product__store_id'], timezone.localdate(row['order__created_at']))]
+            day[0] += 1 if created else 0
+            day[1] += row['qty']
+            day[2] += row['revenue']
+
+        for (store_id, date), (orders, qty, revenue) in per_day.items():
+            _upsert_daily(store_id, date, orders, qty, revenue, using)
+
+
+def _upsert_store_sale(row, using):
+    """Returns True when this is the store's first item in the order."""
+    return counters.upsert(
+        StoreSale,
+        lookup={'store_id': row['product__store_id'], 'order_id': row['order_id']},
+        increments={'items_count': row['qty'], 'revenue': row['revenue']},
+        create={
+            'order_created_at': row['order__created_at'],
+            'order_status': row['order__order_status'],
+            'is_paid': row['order__is_paid'],
+        },
+        using=using,
+    )
+
+
+def _upsert_daily(store_id, date, orders, qty, revenue, using):
+    counters.upsert(
+        StoreDailySales,
+        lookup={'store_id': store_id, 'date': date},
+        increments={'orders_count': orders, 'items_sold': qty, 'revenue': revenue},
+        using=using,
+    )
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Reconciliation — full rebuild from OrderItem
+# ─────────────────────────────────────────────────────────────────────────────
+
+def rebuild_store_ledger(batch_size=500):
+    """Recompute StoreSale and StoreDailySales from scratch. Returns (sales, days)."""
+    sales = []
+    days = defaultdict(lambda: [0, 0, Decimal('0.00')])
+
+    for row in _store_rows(OrderItem.objects.all()).iterator():
+        sales.append(StoreSale(
+            store_id=row['product__store_id'],
+            order_id=row['order_id'],
+            order_created_at=row['order__created_at'],
+            order_status=row['order__order_status'],
+            is_paid=row['order__is_paid'],
+            items_count=row['qty'],
+            revenue=row['revenue'],
+        ))
+        day = days[(row['product__store_id'], timezone.localdate(row['order__created_at']))]
+        day[0] += 1
+        day[1] += row['qty']
+        day[2] += row['revenue']
+
+    daily = [
+        StoreDailySales(store_id=store_id, date=date, orders_count=orders, items_sold=qty, revenue=revenue)
+        for (store_id, date), (orders, qty, revenue) in days.items()
+    ]
+
+    with transaction.atomic():
+        StoreSale.objects.all().delete()
+        StoreDailySales.objects.all().delete()
+        StoreSale.objects.bulk_create(sales, batch_size=batch_size)
+        StoreDailySales.objects.bulk_create(daily, batch_size=batch_size)
+
+    return len(sales), len(daily)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from seller.ledger import rebuild_store_ledger
+
+
+class Command(BaseCommand):
+    help = "Recompute StoreSale and StoreDailySales from OrderItem."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Rows per bulk_create statement (default 500).',
+        )
+
+    def handle(self, *args, **options):
+        sales, days = rebuild_store_ledger(batch_size=options['batch_size'])
+        self.stdout.write(f"Store sales: {sales} rows, daily rollups: {days} rows")
+        self.stdout.write(self.style.SUCCESS("Store ledger rebuilt."))
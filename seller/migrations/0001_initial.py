@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('parlour', '0036_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoreDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders_count', models.PositiveIntegerField(default=0)),
+                ('items_sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='parlour.store')),
+            ],
+            options={
+                'verbose_name_plural': 'Store daily sales',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('store', 'date'), name='unique_store_daily_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StoreSale',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_created_at', models.DateTimeField()),
+                ('order_status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('dispatched', 'Dispatched'), ('delivered', 'Delivered')], default='pending', max_length=20)),
+                ('is_paid', models.BooleanField(default=False)),
+                ('items_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='store_sales', to='parlour.order')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales', to='parlour.store')),
+            ],
+            options={
+                'ordering': ['-order_created_at'],
+                'indexes': [models.Index(fields=['store', '-order_created_at'], name='storesale_store_created'), models.Index(fields=['store', 'order_status', '-order_created_at'], name='storesale_store_status')],
+                'constraints': [models.UniqueConstraint(fields=('store', 'order'), name='unique_store_sale')],
+            },
+        ),
+    ]
@@ -1,3 +1,49 @@
 from django.db import models
+from parlour.models import Order, Store
 
-# Create your models here.
+
+class StoreSale(models.Model):
+    """
+    One row per (store, order): the store's share of an order, with the
+    order's date and status copied in so seller pages never join through
+    OrderItem → Product.
+    """
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='sales')
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='store_sales')
+    order_created_at = models.DateTimeField()
+    order_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, default='pending')
+    is_paid = models.BooleanField(default=False)
+    items_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.store} — Order #{self.order_id}"
+
+    class Meta:
+        ordering = ['-order_created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['store', 'order'], name='unique_store_sale'),
+        ]
+        indexes = [
+            models.Index(fields=['store', '-order_created_at'], name='storesale_store_created'),
+            models.Index(fields=['store', 'order_status', '-order_created_at'], name='storesale_store_status'),
+        ]
+
+
+class StoreDailySales(models.Model):
+    """Per-store totals for one (local) day, built from StoreSale."""
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='daily_sales')
+    date = models.DateField()
+    orders_count = models.PositiveIntegerField(default=0)
+    items_sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.store} — {self.date}"
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name_plural = 'Store daily sales'
+        constraints = [
+            models.UniqueConstraint(fields=['store', 'date'], name='unique_store_daily_sales'),
+        ]
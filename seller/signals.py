@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from parlour.models import Order, OrderItem
+from parlour.order_lifecycle import orders_transitioned
+from . import ledger
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Store ledger — new items on commit, status changes straight away
+# ─────────────────────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=OrderItem)
+def queue_store_sale(sender, instance, created, using, **kwargs):
+    if created:
+        ledger.queue_order_item(instance, using=using)
+
+
+@receiver(post_save, sender=Order)
+def sync_store_sale_status(sender, instance, created, using, **kwargs):
+    if not created:
+        ledger.sync_order_status(instance, using=using)
+
+
+@receiver(orders_transitioned)
+def sync_store_sale_bulk_status(sender, order_ids, to_status, using, **kwargs):
+    ledger.sync_bulk_status(order_ids, to_status, using=using)
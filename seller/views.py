@@ -9,6 +9,9 @@ from django.views.decorators.http import require_POST
 
 from parlour.models import Store, SellerApplication, Product, Order, OrderItem,Category
 from django.db.models import Q
+from datetime import timedelta
+
+from .models import StoreDailySales, StoreSale
 
 
 # ─────────────────────────────────────────────
@@ -90,22 +93,17 @@ def seller_dashboard(request):
     # Consider products with stock > 0 as "active"
     active_products = products.filter(stock_quantity__gt=0).count()  # Changed
 
-    # Orders that contain products from this store
-    try:
-        store_order_items = OrderItem.objects.filter(product__store=store)
-        total_orders = store_order_items.values('order').distinct().count()
-        total_revenue = store_order_items.filter(
-            order__status__in=['completed', 'delivered']
-        ).aggregate(rev=Sum('price'))['rev'] or 0
-        recent_orders = (
-            store_order_items
-            .select_related('order', 'order__user', 'product')
-            .order_by('-order__created_at')[:5]
-        )
-    except Exception:
-        total_orders = 0
-        total_revenue = 0
-        recent_orders = []
+    # Orders and revenue come from the store's own ledger rows
+    sales = StoreSale.objects.filter(store=store)
+    total_orders = sales.count()
+    total_revenue = sales.filter(order_status='delivered').aggregate(rev=Sum('revenue'))['rev'] or 0
+    recent_orders = sales.select_related('order')[:5]
+
+    month_start = timezone.localdate() - timedelta(days=29)
+    revenue_30d = (
+        StoreDailySales.objects.filter(store=store, date__gte=month_start)
+        .aggregate(rev=Sum('revenue'))['rev'] or 0
+    )
 
     # Low stock - using stock_quantity instead of stock
     low_stock = products.filter(stock_quantity__lte=5, stock_quantity__gt=0)  # Changed
@@ -116,6 +114,7 @@ def seller_dashboard(request):
         'active_products': active_products,
         'total_orders': total_orders,
         'total_revenue': total_revenue,
+        'revenue_30d': revenue_30d,
         'recent_orders': recent_orders,
         'low_stock': low_stock,
         'page_title': 'Dashboard',
@@ -295,24 +294,14 @@ def seller_product_toggle(request, pk):
 def seller_orders(request):
     store = request.store
 
-    try:
-        store_order_ids = (
-            OrderItem.objects
-            .filter(product__store=store)
-            .values_list('order_id', flat=True)
-            .distinct()
-        )
-        qs = Order.objects.filter(id__in=store_order_ids).order_by('-created_at')
-
-        status_filter = request.GET.get('status', '')
-        if status_filter:
-            qs = qs.filter(status=status_filter)
-
-        paginator = Paginator(qs, 20)
-        page_obj = paginator.get_page(request.GET.get('page'))
-    except Exception:
-        page_obj = []
-        status_filter = ''
+    qs = StoreSale.objects.filter(store=store).select_related('order')
+
+    status_filter = request.GET.get('status', '')
+    if status_filter:
+        qs = qs.filter(order_status=status_filter)
+
+    paginator = Paginator(qs, 20)
+    page_obj = paginator.get_page(request.GET.get('page'))
 
     context = {
         'store': store,
@@ -328,17 +317,14 @@ def seller_orders(request):
 def seller_order_detail(request, pk):
     store = request.store
 
-    try:
-        order_item_ids = OrderItem.objects.filter(product__store=store).values_list('order_id', flat=True)
-        order = get_object_or_404(Order, pk=pk, id__in=order_item_ids)
-        items = order.items.filter(product__store=store).select_related('product')
-    except Exception:
-        order = None
-        items = []
+    sale = get_object_or_404(StoreSale.objects.select_related('order'), store=store, order_id=pk)
+    order = sale.order
+    items = OrderItem.objects.filter(order=order, product__store=store).select_related('product')
 
     context = {
         'store': store,
         'order': order,
+        'sale': sale,
         'items': items,
         'page_title': f'Order #{pk}',
         'active_nav': 'orders',
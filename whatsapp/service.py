@@ -2,20 +2,13 @@
 import requests
 import logging
 from django.conf import settings
+from parlour.phones import normalize_phone
 
 logger = logging.getLogger(__name__)
 
 WHATSAPP_SERVICE_URL = getattr(settings, 'WHATSAPP_SERVICE_URL', 'http://localhost:3000')
 
 
-def normalize_phone(phone: str) -> str:
-    """Convert any Kenyan phone format to 2547XXXXXXXX"""
-    phone = phone.strip().replace("+", "").replace(" ", "").replace("-", "")
-    if phone.startswith("0"):
-        phone = "254" + phone[1:]
-    return phone
-
-
 def send_whatsapp_message(phone: str, message: str) -> dict:
     try:
         response = requests.post(
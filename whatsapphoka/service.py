@@ -1,18 +1,16 @@
 import requests
+import httpx
 import logging
 from django.conf import settings
+from parlour.phones import normalize_phone
+from parlour import http_client
 
 logger = logging.getLogger(__name__)
 
 WHATSAPP_SERVICE_URL = getattr(settings, 'WHATSAPP_SERVICE_URL', 'http://localhost:3000')
 
-
-def normalize_phone(phone: str) -> str:
-    """Convert any Kenyan phone format to 2547XXXXXXXX"""
-    phone = phone.strip().replace("+", "").replace(" ", "").replace("-", "")
-    if phone.startswith("0"):
-        phone = "254" + phone[1:]
-    return phone
+SEND_TIMEOUT = 10
+STATUS_TIMEOUT = 5
 
 
 def send_whatsapp_message(phone: str, message: str) -> dict:
@@ -20,7 +18,7 @@ def send_whatsapp_message(phone: str, message: str) -> dict:
         response = requests.post(
             f"{WHATSAPP_SERVICE_URL}/send-message",
             json={"phone": normalize_phone(phone), "message": message},
-            timeout=10
+            timeout=SEND_TIMEOUT
         )
         response.raise_for_status()
         return response.json()
@@ -30,3 +28,33 @@ def send_whatsapp_message(phone: str, message: str) -> dict:
     except Exception as e:
         logger.error(f"WhatsApp send failed: {e}")
         return {"success": False, "error": str(e)}
+
+
+async def asend_whatsapp_message(phone: str, message: str) -> dict:
+    """send_whatsapp_message() for async views, over parlour.http_client."""
+    try:
+        async with http_client.client() as client:
+            response = await client.post(
+                f"{WHATSAPP_SERVICE_URL}/send-message",
+                json={"phone": normalize_phone(phone), "message": message},
+                timeout=SEND_TIMEOUT
+            )
+        response.raise_for_status()
+        return response.json()
+    except httpx.ConnectError:
+        logger.error("WhatsApp service is not running")
+        return {"success": False, "error": "WhatsApp service unavailable"}
+    except Exception as e:
+        logger.error(f"WhatsApp send failed: {e}")
+        return {"success": False, "error": str(e)}
+
+
+async def aservice_status() -> dict:
+    """Whether the Node service is up, and whether its WhatsApp session is ready."""
+    try:
+        async with http_client.client() as client:
+            response = await client.get(f"{WHATSAPP_SERVICE_URL}/status", timeout=STATUS_TIMEOUT)
+        data = response.json()
+        return {'online': True, 'ready': data.get('ready', False)}
+    except Exception:
+        return {'online': False, 'ready': False}
@@ -3,8 +3,9 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.http import JsonResponse
 from django.contrib.auth.models import User
 from django.views.decorators.http import require_POST
-from parlour.models import Order
-from whatsapphoka.service import send_whatsapp_message
+from django.db.models import F
+from parlour.models import Customer
+from whatsapphoka.service import aservice_status, asend_whatsapp_message, send_whatsapp_message
 import json
 import logging
 
@@ -15,12 +16,12 @@ logger = logging.getLogger(__name__)
 def whatsapp_dashboard(request):
     """Main WhatsApp messaging dashboard for staff/admin."""
 
-    # Get all customers who have placed orders (have a phone number)
+    # One row per customer, however many spellings of their number the orders used
     customers = (
-        Order.objects
-        .values('customer_name', 'phone_number', 'email')
-        .distinct()
-        .order_by('customer_name')
+        Customer.objects
+        .exclude(phone='')
+        .values('email', customer_name=F('name'), phone_number=F('phone'))
+        .order_by('name')
     )
 
     # Quick stats
@@ -36,7 +37,7 @@ def whatsapp_dashboard(request):
 
 @staff_member_required
 @require_POST
-def send_single_message(request):
+async def send_single_message(request):
     """Send a WhatsApp message to a single customer."""
     try:
         data = json.loads(request.body)
@@ -47,10 +48,11 @@ def send_single_message(request):
         if not phone or not message:
             return JsonResponse({'success': False, 'error': 'Phone and message are required'}, status=400)
 
-        result = send_whatsapp_message(phone, message)
+        result = await asend_whatsapp_message(phone, message)
 
         if result.get('success'):
-            logger.info(f"Staff {request.user.username} sent WhatsApp to {phone}")
+            user = await request.auser()
+            logger.info(f"Staff {user.username} sent WhatsApp to {phone}")
             return JsonResponse({'success': True, 'message': f'Message sent to {customer_name}'})
         else:
             return JsonResponse({'success': False, 'error': result.get('error', 'Failed to send')}, status=500)
@@ -71,11 +73,11 @@ def send_bulk_message(request):
         if not message:
             return JsonResponse({'success': False, 'error': 'Message is required'}, status=400)
 
-        # Get unique phone numbers from all orders
+        # One message per customer with a phone number
         customers = (
-            Order.objects
-            .values('customer_name', 'phone_number')
-            .distinct()
+            Customer.objects
+            .exclude(phone='')
+            .values(customer_name=F('name'), phone_number=F('phone'))
         )
 
         sent = 0
@@ -90,7 +92,7 @@ def send_bulk_message(request):
                 continue
 
             # Personalize message with customer name
-            personalized = message.replace('{name}', name.split()[0])
+            personalized = message.replace('{name}', (name.split() or ['there'])[0])
 
             result = send_whatsapp_message(phone, personalized)
             if result.get('success'):
@@ -114,18 +116,6 @@ def send_bulk_message(request):
 
 
 @staff_member_required
-def whatsapp_status(request):
+async def whatsapp_status(request):
     """Check if WhatsApp Node service is online."""
-    try:
-        import requests
-        from django.conf import settings
-        url = getattr(settings, 'WHATSAPP_SERVICE_URL', 'http://localhost:3000')
-        response = requests.get(f"{url}/status", timeout=5)
-        data = response.json()
-        return JsonResponse({'online': True, 'ready': data.get('ready', False)})
-    except Exception:
-        return JsonResponse({'online': False, 'ready': False})
-
-
-
-        
\ No newline at end of file
+    return JsonResponse(await aservice_status())